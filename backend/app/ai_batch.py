@@ -0,0 +1,184 @@
+"""
+Batch AI Plan Generation
+Regenerates workout plans for a whole client roster as a background job:
+profiles are loaded in one query, plans are generated through a bounded
+pipeline at batch priority, and the results are written as Workout rows
+in bulk. Jobs are tracked in memory and polled via /ai/jobs/{job_id}.
+"""
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from .ai_service import BATCH, WorkoutPlan, get_ai_service
+from .database import SessionLocal
+from .models import Client, Measurement, Workout
+
+# Plans generated concurrently per job (the AI scheduler still caps model calls globally)
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "4"))
+# Workout rows written per bulk insert
+AI_BATCH_WRITE_SIZE = int(os.getenv("AI_BATCH_WRITE_SIZE", "200"))
+MAX_TRACKED_JOBS = 100
+
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def _new_job(total: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "queued",
+        "total": total,
+        "completed": 0,
+        "fallbacks": 0,
+        "failed": 0,
+        "workouts_created": 0,
+        "params": params,
+        "results": {},
+        "error": None,
+        "created_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+    }
+    _jobs[job["job_id"]] = job
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        _jobs.popitem(last=False)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Progress snapshot of a batch job, or None if unknown/expired"""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    progress = (job["completed"] + job["failed"]) / job["total"] if job["total"] else 1.0
+    return {**job, "progress": round(progress, 3)}
+
+
+def load_client_profiles(db: Session, client_ids: List[int]) -> List[Tuple[Client, Optional[Measurement]]]:
+    """Clients with their latest measurement, in a single query"""
+    latest = db.query(
+        Measurement.client_id.label("client_id"),
+        func.max(Measurement.date).label("latest_date")
+    ).filter(Measurement.client_id.in_(client_ids))\
+        .group_by(Measurement.client_id)\
+        .subquery()
+
+    rows = db.query(Client, Measurement)\
+        .outerjoin(latest, latest.c.client_id == Client.id)\
+        .outerjoin(Measurement, and_(
+            Measurement.client_id == Client.id,
+            Measurement.date == latest.c.latest_date
+        ))\
+        .filter(Client.id.in_(client_ids))\
+        .order_by(Client.id, Measurement.id.desc())\
+        .all()
+
+    # Two measurements on the same timestamp would repeat a client; keep the newest row
+    seen = {}
+    for client, measurement in rows:
+        seen.setdefault(client.id, (client, measurement))
+    return list(seen.values())
+
+
+def plan_to_workouts(plan: WorkoutPlan, client_id: int, trainer_id: Optional[int]) -> List[Dict[str, Any]]:
+    """One Workout row mapping per plan day"""
+    now = datetime.utcnow()
+    rows = []
+    for day in plan.weeklyPlan:
+        lines = [f"Focus: {day.focus}"]
+        for exercise in day.exercises:
+            line = f"- {exercise.name}: {exercise.sets} x {exercise.reps}, rest {exercise.rest}"
+            if exercise.text:
+                line += f" ({exercise.text})"
+            lines.append(line)
+        rows.append({
+            "client_id": client_id,
+            "trainer_id": trainer_id,
+            "title": day.day,
+            "description": "\n".join(lines),
+            "notes": plan.nutritionAdvice,
+            "timestamp": now,
+            "created_at": now,
+        })
+    return rows
+
+
+def create_batch_job(db: Session, client_ids: List[int], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Register a job for the clients that exist; the caller schedules run_batch_job"""
+    existing = [cid for (cid,) in db.query(Client.id).filter(Client.id.in_(client_ids)).all()]
+    job = _new_job(len(existing), params)
+    job["client_ids"] = existing
+    job["missing_client_ids"] = sorted(set(client_ids) - set(existing))
+    return job
+
+
+async def run_batch_job(job_id: str):
+    """Generate and persist plans for every client in the job"""
+    job = _jobs.get(job_id)
+    if job is None:
+        return
+    job["status"] = "running"
+    params = job["params"]
+    ai_service = get_ai_service()
+    preferences = {
+        'location': params.get('location', 'gym'),
+        'space': params.get('space', 'moderate'),
+        'equipment': params.get('equipment', ['bodyweight', 'dumbbells'])
+    }
+    body_part = params.get('body_part')
+
+    db = SessionLocal()
+    try:
+        profiles = load_client_profiles(db, job["client_ids"])
+        pending_rows: List[Dict[str, Any]] = []
+        semaphore = asyncio.Semaphore(max(1, AI_BATCH_CONCURRENCY))
+
+        def flush(force: bool = False):
+            if pending_rows and (force or len(pending_rows) >= AI_BATCH_WRITE_SIZE):
+                db.bulk_insert_mappings(Workout, pending_rows)
+                db.commit()
+                job["workouts_created"] += len(pending_rows)
+                pending_rows.clear()
+
+        async def generate(client: Client, measurement: Optional[Measurement]):
+            user_profile = {
+                'name': client.name,
+                'age': 'N/A',
+                'gender': 'N/A',
+                'weight': measurement.weight if measurement else None,
+                'goal': 'general fitness',
+                'fitness_level': 'intermediate'
+            }
+            async with semaphore:
+                plan, generated_by = await ai_service.generate_workout_plan_with_source(
+                    user_profile, preferences, body_part,
+                    tenant=client.trainer_id, priority=BATCH
+                )
+            if generated_by != "AI" and ai_service.use_ai:
+                job["fallbacks"] += 1
+
+            if params.get('persist', True):
+                pending_rows.extend(plan_to_workouts(plan, client.id, client.trainer_id))
+                flush()
+            job["results"][client.id] = {"generated_by": generated_by, "days": len(plan.weeklyPlan)}
+            job["completed"] += 1
+
+        results = await asyncio.gather(*[generate(c, m) for c, m in profiles], return_exceptions=True)
+        for (client, _), result in zip(profiles, results):
+            if isinstance(result, Exception):
+                job["failed"] += 1
+                job["results"][client.id] = {"error": str(result)}
+        flush(force=True)
+        job["status"] = "completed"
+    except Exception as e:
+        db.rollback()
+        job["status"] = "failed"
+        job["error"] = str(e)
+        print(f"Batch plan job {job_id} failed: {e}")
+    finally:
+        db.close()
+        job["finished_at"] = datetime.utcnow().isoformat()
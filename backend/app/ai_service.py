@@ -6,11 +6,70 @@ meal planning, progress analysis, and motivational support.
 
 import os
 import json
+import time
 import random
-from typing import List, Dict, Any, Optional
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Hashable, Deque, Tuple
 from datetime import datetime, timedelta
 import anthropic
 from pydantic import BaseModel
+from .utils.cache import async_cached, AsyncCache
+
+AI_MODEL = os.getenv("AI_MODEL", "claude-3-5-sonnet-20241022")
+
+# Generated plans are reused for identical (normalised) requests
+AI_PLAN_CACHE_TTL = float(os.getenv("AI_PLAN_CACHE_TTL", "3600"))  # seconds
+AI_PLAN_CACHE_SIZE = int(os.getenv("AI_PLAN_CACHE_SIZE", "512"))
+
+# Admission control for model calls
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_QUEUE_TIMEOUT = float(os.getenv("AI_QUEUE_TIMEOUT", "15"))  # seconds an interactive request may wait
+AI_BATCH_QUEUE_TIMEOUT = float(os.getenv("AI_BATCH_QUEUE_TIMEOUT", "300"))  # seconds a batch request may wait
+
+# Request priorities (lower is served first)
+INTERACTIVE = 0
+BATCH = 1
+
+
+def _norm(value: Any) -> str:
+    return str(value).strip().lower() if value is not None else ""
+
+
+def workout_plan_cache_key(
+    user_profile: Dict[str, Any],
+    preferences: Dict[str, Any],
+    body_part: Optional[str] = None
+) -> Hashable:
+    """
+    Cache key for a workout plan: only the fields that reach the prompt,
+    normalised so case, whitespace and equipment order don't split the cache
+    """
+    return (
+        "workout",
+        _norm(user_profile.get('age', 'N/A')),
+        _norm(user_profile.get('gender', 'N/A')),
+        _norm(user_profile.get('goal', 'general fitness')),
+        _norm(user_profile.get('fitness_level', 'intermediate')),
+        _norm(preferences.get('location', 'gym')),
+        _norm(preferences.get('space', 'moderate')),
+        tuple(sorted({_norm(e) for e in preferences.get('equipment', ['bodyweight', 'dumbbells'])})),
+        _norm(body_part),
+    )
+
+
+def meal_plan_cache_key(user_profile: Dict[str, Any]) -> Hashable:
+    """Cache key for a meal plan; weight is rounded to the nearest kg"""
+    weight = user_profile.get('weight')
+    return (
+        "meal",
+        _norm(user_profile.get('age', 'N/A')),
+        _norm(user_profile.get('gender', 'N/A')),
+        round(weight) if isinstance(weight, (int, float)) else None,
+        _norm(user_profile.get('goal', 'general fitness')),
+    )
 
 
 class WorkoutExercise(BaseModel):
@@ -54,6 +113,125 @@ class Supplement(BaseModel):
     benefit: str
 
 
+class AIQueueTimeout(Exception):
+    """Raised when a request waits longer than its queue deadline for a model slot"""
+
+
+class AIRequestScheduler:
+    """
+    Admission control for model calls
+
+    At most `max_concurrency` calls run at once. Waiting requests are served
+    interactive before batch, and within a priority round-robin across
+    tenants (trainers), so one trainer's burst cannot starve everyone else.
+    A request that waits past its deadline is shed with AIQueueTimeout so the
+    caller can fall back to the rule-based generators.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = AI_MAX_CONCURRENCY,
+        timeouts: Optional[Dict[int, float]] = None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeouts = timeouts or {INTERACTIVE: AI_QUEUE_TIMEOUT, BATCH: AI_BATCH_QUEUE_TIMEOUT}
+        self._active = 0
+        # priority -> tenant -> waiters; tenant order is the round-robin order
+        self._queues: Dict[int, "OrderedDict[Hashable, Deque[asyncio.Future]]"] = {}
+        self._waits: Deque[float] = deque(maxlen=500)
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+    
+    def _waiting(self) -> int:
+        return sum(len(q) for queues in self._queues.values() for q in queues.values())
+    
+    def _enqueue(self, tenant: Hashable, priority: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(priority, OrderedDict()).setdefault(tenant, deque()).append(future)
+        return future
+    
+    def _dequeue(self, tenant: Hashable, priority: int, future: asyncio.Future):
+        queues = self._queues.get(priority, {})
+        waiters = queues.get(tenant)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del queues[tenant]
+    
+    def _release(self):
+        """Hand the freed slot to the next waiter, or return it to the pool"""
+        for priority in sorted(self._queues):
+            queues = self._queues[priority]
+            if not queues:
+                continue
+            tenant, waiters = next(iter(queues.items()))
+            future = waiters.popleft()
+            if waiters:
+                queues.move_to_end(tenant)
+            else:
+                del queues[tenant]
+            future.set_result(None)  # slot transferred; _active unchanged
+            return
+        self._active -= 1
+    
+    @asynccontextmanager
+    async def slot(self, tenant: Hashable = None, priority: int = INTERACTIVE):
+        """Hold one model slot for the duration of the block"""
+        started = time.monotonic()
+        if self._active < self.max_concurrency and not self._waiting():
+            self._active += 1
+        else:
+            self.queued += 1
+            future = self._enqueue(tenant, priority)
+            try:
+                # asyncio.wait doesn't cancel the future, so there is no
+                # window where a slot is handed over and then lost
+                await asyncio.wait({future}, timeout=self.timeouts.get(priority, AI_QUEUE_TIMEOUT))
+            except BaseException:
+                if future.done():
+                    self._release()
+                else:
+                    self._dequeue(tenant, priority, future)
+                raise
+            if not future.done():
+                self._dequeue(tenant, priority, future)
+                self.shed += 1
+                raise AIQueueTimeout(f"AI queue deadline exceeded after {time.monotonic() - started:.1f}s")
+        
+        self.admitted += 1
+        self._waits.append(time.monotonic() - started)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        
+        def percentile(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+        
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queue_depth": {
+                "interactive": sum(len(q) for q in self._queues.get(INTERACTIVE, {}).values()),
+                "batch": sum(len(q) for q in self._queues.get(BATCH, {}).values()),
+            },
+            "tenants_waiting": len({t for queues in self._queues.values() for t in queues}),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "wait_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
+
+
+# (tenant, priority) of the request being served; read where the model is called
+# so cache hits never wait for a slot
+_request_context: ContextVar[Tuple[Hashable, int]] = ContextVar("ai_request_context", default=(None, INTERACTIVE))
+
+
 class ProgressReport(BaseModel):
     summary: str
     workoutProgress: Dict[str, Any]
@@ -70,36 +248,164 @@ class AIFitnessService:
     def __init__(self):
         self.api_key = os.getenv("ANTHROPIC_API_KEY", "")
         self.use_ai = bool(self.api_key)
+        self.scheduler = AIRequestScheduler()
         
         if self.use_ai:
             try:
-                self.client = anthropic.Anthropic(api_key=self.api_key)
+                self.client = anthropic.AsyncAnthropic(api_key=self.api_key)
             except Exception as e:
                 print(f"Failed to initialize Anthropic client: {e}")
                 self.use_ai = False
     
+    @staticmethod
+    def _extract_json(response_text: str) -> Dict[str, Any]:
+        """Parse the JSON object in a model reply (optionally fenced in ```json)"""
+        if "```json" in response_text:
+            json_start = response_text.find("```json") + 7
+            json_end = response_text.find("```", json_start)
+            json_str = response_text[json_start:json_end].strip()
+        else:
+            json_str = response_text.strip()
+        
+        return json.loads(json_str)
+    
+    async def _complete_json(self, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        """Send a prompt to Claude and parse the JSON in its reply"""
+        tenant, priority = _request_context.get()
+        async with self.scheduler.slot(tenant, priority):
+            message = await self.client.messages.create(
+                model=AI_MODEL,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            )
+        return self._extract_json(message.content[0].text)
+    
+    async def _stream_plan(
+        self,
+        cache: AsyncCache,
+        key: Hashable,
+        prompt: str,
+        max_tokens: int,
+        plan_model: type,
+        fallback: Callable[[], BaseModel],
+        tenant: Hashable = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a plan as events: `token` for each text delta while the JSON is
+        generated, then one `plan` event with the validated result.
+        Cached plans are returned immediately; failures emit `error` and fall
+        back to the rule-based plan.
+        """
+        found, cached = cache.peek(key)
+        if found:
+            yield {"event": "plan", "data": {"plan": cached.dict(), "generated_by": "AI", "cached": True}}
+            return
+        
+        if not self.use_ai:
+            yield {"event": "plan", "data": {"plan": fallback().dict(), "generated_by": "Rule-based", "cached": False}}
+            return
+        
+        chunks: List[str] = []
+        try:
+            async with self.scheduler.slot(tenant, INTERACTIVE):
+                async with self.client.messages.stream(
+                    model=AI_MODEL,
+                    max_tokens=max_tokens,
+                    messages=[{"role": "user", "content": prompt}]
+                ) as stream:
+                    async for text in stream.text_stream:
+                        chunks.append(text)
+                        yield {"event": "token", "data": {"text": text}}
+            plan = plan_model(**self._extract_json("".join(chunks)))
+        except Exception as e:
+            print(f"AI streaming failed: {e}, falling back to rule-based")
+            yield {"event": "error", "data": {"detail": str(e)}}
+            plan, generated_by = fallback(), "Rule-based"
+        else:
+            cache.put(key, plan)
+            generated_by = "AI"
+        
+        yield {"event": "plan", "data": {"plan": plan.dict(), "generated_by": generated_by, "cached": False}}
+    
     async def generate_workout_plan(
         self, 
         user_profile: Dict[str, Any],
         preferences: Dict[str, Any],
-        body_part: Optional[str] = None
+        body_part: Optional[str] = None,
+        tenant: Hashable = None,
+        priority: int = INTERACTIVE
     ) -> WorkoutPlan:
-        """Generate a personalized workout plan"""
+        """
+        Generate a personalized workout plan
         
-        if self.use_ai:
-            return await self._ai_generate_workout(user_profile, preferences, body_part)
-        else:
-            return self._rule_based_workout(user_profile, preferences, body_part)
+        `tenant` (the trainer id) and `priority` control queueing for a model
+        slot; requests shed by the scheduler get the rule-based plan.
+        """
+        plan, _ = await self.generate_workout_plan_with_source(user_profile, preferences, body_part, tenant, priority)
+        return plan
     
+    async def generate_workout_plan_with_source(
+        self,
+        user_profile: Dict[str, Any],
+        preferences: Dict[str, Any],
+        body_part: Optional[str] = None,
+        tenant: Hashable = None,
+        priority: int = INTERACTIVE
+    ) -> Tuple[WorkoutPlan, str]:
+        """Like generate_workout_plan, also returning "AI" or "Rule-based" for the plan actually produced"""
+        
+        if not self.use_ai:
+            return self._rule_based_workout(user_profile, preferences, body_part), "Rule-based"
+        
+        token = _request_context.set((tenant, priority))
+        try:
+            return await self._ai_generate_workout(user_profile, preferences, body_part), "AI"
+        except AIQueueTimeout as e:
+            print(f"AI queue busy ({e}), falling back to rule-based")
+        except Exception as e:
+            print(f"AI generation failed: {e}, falling back to rule-based")
+        finally:
+            _request_context.reset(token)
+        return self._rule_based_workout(user_profile, preferences, body_part), "Rule-based"
+    
+    def stream_workout_plan(
+        self,
+        user_profile: Dict[str, Any],
+        preferences: Dict[str, Any],
+        body_part: Optional[str] = None,
+        tenant: Hashable = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Generate a workout plan as a stream of token/plan events"""
+        return self._stream_plan(
+            AIFitnessService._ai_generate_workout.cache,
+            workout_plan_cache_key(user_profile, preferences, body_part),
+            self._workout_prompt(user_profile, preferences, body_part),
+            2048,
+            WorkoutPlan,
+            lambda: self._rule_based_workout(user_profile, preferences, body_part),
+            tenant
+        )
+    
+    @async_cached(ttl=AI_PLAN_CACHE_TTL, maxsize=AI_PLAN_CACHE_SIZE, key=workout_plan_cache_key, name="ai.workout_plans")
     async def _ai_generate_workout(
         self,
         user_profile: Dict[str, Any],
         preferences: Dict[str, Any],
         body_part: Optional[str]
     ) -> WorkoutPlan:
-        """Use Claude AI to generate workout"""
+        """Use Claude AI to generate workout (raises on failure so errors are never cached)"""
+        data = await self._complete_json(self._workout_prompt(user_profile, preferences, body_part), max_tokens=2048)
+        return WorkoutPlan(**data)
+    
+    def _workout_prompt(
+        self,
+        user_profile: Dict[str, Any],
+        preferences: Dict[str, Any],
+        body_part: Optional[str]
+    ) -> str:
+        """Build the workout generation prompt"""
         
-        prompt = f"""Generate a personalized workout plan for:
+        return f"""Generate a personalized workout plan for:
         
 **Client Profile:**
 - Age: {user_profile.get('age', 'N/A')}
@@ -132,30 +438,6 @@ Format your response as JSON matching this structure:
   ],
   "nutritionAdvice": "General nutrition guidance"
 }}"""
-
-        try:
-            message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=2048,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            response_text = message.content[0].text
-            
-            # Extract JSON from response
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_str = response_text[json_start:json_end].strip()
-            else:
-                json_str = response_text.strip()
-            
-            data = json.loads(json_str)
-            return WorkoutPlan(**data)
-            
-        except Exception as e:
-            print(f"AI generation failed: {e}, falling back to rule-based")
-            return self._rule_based_workout(user_profile, preferences, body_part)
     
     def _rule_based_workout(
         self,
@@ -247,18 +529,60 @@ Format your response as JSON matching this structure:
             nutritionAdvice="Focus on lean proteins (chicken, fish, tofu), complex carbohydrates (brown rice, quinoa, sweet potatoes), and plenty of vegetables. Stay hydrated with at least 2-3 liters of water daily. Consider post-workout protein within 30-60 minutes of training."
         )
     
-    async def generate_meal_plan(self, user_profile: Dict[str, Any]) -> MealPlanResponse:
-        """Generate a personalized meal plan"""
+    async def generate_meal_plan(
+        self,
+        user_profile: Dict[str, Any],
+        tenant: Hashable = None,
+        priority: int = INTERACTIVE
+    ) -> MealPlanResponse:
+        """Generate a personalized meal plan (queueing as in generate_workout_plan)"""
+        plan, _ = await self.generate_meal_plan_with_source(user_profile, tenant, priority)
+        return plan
+    
+    async def generate_meal_plan_with_source(
+        self,
+        user_profile: Dict[str, Any],
+        tenant: Hashable = None,
+        priority: int = INTERACTIVE
+    ) -> Tuple[MealPlanResponse, str]:
+        """Like generate_meal_plan, also returning "AI" or "Rule-based" for the plan actually produced"""
         
-        if self.use_ai:
-            return await self._ai_generate_meal_plan(user_profile)
-        else:
-            return self._rule_based_meal_plan(user_profile)
+        if not self.use_ai:
+            return self._rule_based_meal_plan(user_profile), "Rule-based"
+        
+        token = _request_context.set((tenant, priority))
+        try:
+            return await self._ai_generate_meal_plan(user_profile), "AI"
+        except AIQueueTimeout as e:
+            print(f"AI queue busy ({e}), falling back to rule-based")
+        except Exception as e:
+            print(f"AI meal plan failed: {e}, falling back to rule-based")
+        finally:
+            _request_context.reset(token)
+        return self._rule_based_meal_plan(user_profile), "Rule-based"
     
+    def stream_meal_plan(self, user_profile: Dict[str, Any], tenant: Hashable = None) -> AsyncIterator[Dict[str, Any]]:
+        """Generate a meal plan as a stream of token/plan events"""
+        return self._stream_plan(
+            AIFitnessService._ai_generate_meal_plan.cache,
+            meal_plan_cache_key(user_profile),
+            self._meal_plan_prompt(user_profile),
+            1024,
+            MealPlanResponse,
+            lambda: self._rule_based_meal_plan(user_profile),
+            tenant
+        )
+    
+    @async_cached(ttl=AI_PLAN_CACHE_TTL, maxsize=AI_PLAN_CACHE_SIZE, key=meal_plan_cache_key, name="ai.meal_plans")
     async def _ai_generate_meal_plan(self, user_profile: Dict[str, Any]) -> MealPlanResponse:
-        """Use Claude AI to generate meal plan"""
+        """Use Claude AI to generate meal plan (raises on failure so errors are never cached)"""
+        data = await self._complete_json(self._meal_plan_prompt(user_profile), max_tokens=1024)
+        return MealPlanResponse(**data)
+    
+    def _meal_plan_prompt(self, user_profile: Dict[str, Any]) -> str:
+        """Build the meal plan generation prompt"""
         
-        prompt = f"""Generate a personalized daily meal plan for:
+        return f"""Generate a personalized daily meal plan for:
         
 - Age: {user_profile.get('age', 'N/A')}
 - Gender: {user_profile.get('gender', 'N/A')}
@@ -278,29 +602,6 @@ Format as JSON:
   "dinner": "Meal description",
   "snacks": ["Snack 1", "Snack 2"]
 }}"""
-
-        try:
-            message = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            response_text = message.content[0].text
-            
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_str = response_text[json_start:json_end].strip()
-            else:
-                json_str = response_text.strip()
-            
-            data = json.loads(json_str)
-            return MealPlanResponse(**data)
-            
-        except Exception as e:
-            print(f"AI meal plan failed: {e}, falling back to rule-based")
-            return self._rule_based_meal_plan(user_profile)
     
     def _rule_based_meal_plan(self, user_profile: Dict[str, Any]) -> MealPlanResponse:
         """Rule-based meal plan generation"""
@@ -404,6 +705,16 @@ Format as JSON:
         measurement_history: List[Dict[str, Any]]
     ) -> ProgressReport:
         """Generate a comprehensive progress report"""
+        report, _ = await self.generate_progress_report_with_source(user_profile, workout_history, measurement_history)
+        return report
+    
+    async def generate_progress_report_with_source(
+        self,
+        user_profile: Dict[str, Any],
+        workout_history: List[Dict[str, Any]],
+        measurement_history: List[Dict[str, Any]]
+    ) -> Tuple[ProgressReport, str]:
+        """Like generate_progress_report, also returning its source (always "Rule-based": it is computed from the history)"""
         
         total_workouts = len(workout_history)
         
@@ -452,7 +763,7 @@ Format as JSON:
                 "bodyFatPercentageChange": bf_change
             },
             recommendations=recommendations
-        )
+        ), "Rule-based"
 
 
 # Singleton instance
@@ -0,0 +1,183 @@
+"""
+Avatar Rendering Cache
+Avatars depend only on (name, weight, size, format), so rendered images are
+memoised in a bounded in-memory LRU backed by an on-disk tier that survives
+restarts. The disk tier is bounded too: hits bump a file's mtime, and once it
+holds more than AVATAR_DISK_CACHE_SIZE files the least recently used go. Weight is rounded to the kilogram before rendering, which keeps
+the output fully determined by the cache key and lets callers answer
+conditional requests from the key alone, without rendering.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from .avatar_gen import generate_avatar_png
+
+AVATAR_CACHE_SIZE = int(os.getenv("AVATAR_CACHE_SIZE", "256"))  # in-memory entries
+AVATAR_CACHE_DIR = os.getenv("AVATAR_CACHE_DIR", ".cache/avatars")
+AVATAR_DISK_CACHE_SIZE = int(os.getenv("AVATAR_DISK_CACHE_SIZE", "4096"))  # files in AVATAR_CACHE_DIR
+AVATAR_BASE_SIZE = 512  # generate_avatar_png draws for this canvas
+AVATAR_MIN_SIZE, AVATAR_MAX_SIZE = 32, 1024
+# Bump when the drawing changes so cached files and client ETags are invalidated
+AVATAR_VERSION = 1
+
+AVATAR_FORMATS = {"png": ("PNG", "image/png"), "webp": ("WEBP", "image/webp")}
+
+
+def _key(name: str, weight: Optional[float], size: int, fmt: str) -> Tuple[str, Optional[int], int, str]:
+    return (name or "Client", round(weight) if weight is not None else None, size, fmt)
+
+
+class AvatarCache:
+    """LRU of rendered avatars with a disk tier and hit/miss counters"""
+
+    def __init__(
+        self,
+        maxsize: int = AVATAR_CACHE_SIZE,
+        directory: Optional[str] = AVATAR_CACHE_DIR,
+        disk_maxsize: int = AVATAR_DISK_CACHE_SIZE
+    ):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.disk_maxsize = disk_maxsize
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count: Optional[int] = None  # files on disk, counted on first write
+        self.hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def etag(name: str, weight: Optional[float] = None, size: int = AVATAR_BASE_SIZE, fmt: str = "png") -> str:
+        """Strong ETag for an avatar, derived from its inputs"""
+        key = _key(name, weight, size, fmt)
+        return hashlib.sha256(f"v{AVATAR_VERSION}:{key!r}".encode()).hexdigest()[:32]
+
+    def _render(self, key) -> bytes:
+        name, weight, size, fmt = key
+        png = generate_avatar_png(name, weight)
+        if size == AVATAR_BASE_SIZE and fmt == "png":
+            return png
+        with Image.open(BytesIO(png)) as image:
+            if size != AVATAR_BASE_SIZE:
+                image = image.resize((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            pil_format = AVATAR_FORMATS[fmt][0]
+            image.save(buffer, pil_format, **({"quality": 90, "method": 4} if pil_format == "WEBP" else {"optimize": True}))
+        return buffer.getvalue()
+
+    def _disk_path(self, etag: str, fmt: str) -> Optional[str]:
+        return os.path.join(self.directory, f"{etag}.{fmt}") if self.directory else None
+
+    def _disk_files(self):
+        """(mtime, path) of every cached avatar file, oldest first"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".part"):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass  # evicted by another thread
+        return sorted(files)
+
+    def _added_to_disk(self):
+        """Count a newly written file, evicting the least recently used files past disk_maxsize"""
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = len(self._disk_files())
+            else:
+                self._disk_count += 1
+            if self._disk_count <= self.disk_maxsize:
+                return
+            files = self._disk_files()
+            for _, path in files[:max(len(files) - self.disk_maxsize, 0)]:
+                try:
+                    os.remove(path)
+                    self.disk_evictions += 1
+                except FileNotFoundError:
+                    pass
+            self._disk_count = min(len(files), self.disk_maxsize)
+
+    def get(
+        self,
+        name: str,
+        weight: Optional[float] = None,
+        size: int = AVATAR_BASE_SIZE,
+        fmt: str = "png"
+    ) -> Tuple[bytes, str, str]:
+        """Return (image bytes, etag, media type), rendering only on a full miss"""
+        size = max(AVATAR_MIN_SIZE, min(AVATAR_MAX_SIZE, int(size)))
+        if fmt not in AVATAR_FORMATS:
+            raise ValueError(f"Unsupported avatar format: {fmt}")
+        key = _key(name, weight, size, fmt)
+        etag = self.etag(name, weight, size, fmt)
+        media_type = AVATAR_FORMATS[fmt][1]
+
+        with self._lock:
+            data = self._data.get(etag)
+            if data is not None:
+                self._data.move_to_end(etag)
+                self.hits += 1
+                return data, etag, media_type
+
+        path = self._disk_path(etag, fmt)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # recently used: evicted last
+            self.disk_hits += 1
+        else:
+            data = self._render(key)
+            self.renders += 1
+            if path:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.part"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._added_to_disk()
+
+        with self._lock:
+            self._data[etag] = data
+            self._data.move_to_end(etag)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return data, etag, media_type
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.renders
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "renders": self.renders,
+            "disk_maxsize": self.disk_maxsize,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+_avatar_cache: Optional[AvatarCache] = None
+
+def get_avatar_cache() -> AvatarCache:
+    """Get or create the avatar cache singleton"""
+    global _avatar_cache
+    if _avatar_cache is None:
+        _avatar_cache = AvatarCache()
+    return _avatar_cache
+
+
+def render_avatar_png(name: str, weight: Optional[float] = None) -> bytes:
+    """Cached drop-in for generate_avatar_png at the default size (PDF/email embeds)"""
+    return get_avatar_cache().get(name, weight)[0]
@@ -0,0 +1,323 @@
+"""
+Exercise Progress Series
+Charts of one exercise over a client's history. Years of training are
+hundreds of sessions, so the series is aggregated in SQL into buckets over
+an optional [start, end) window of completed workouts:
+
+    session   one point per workout
+    week      Monday-based weeks
+    month     calendar months
+
+Each point carries sessions, sets, total reps, max and mean weight, volume
+(reps × weight) and best estimated 1RM (personal_records.py). With
+`points`, the bucketed series is further reduced to that many points with
+Largest-Triangle-Three-Buckets on the chosen metric, which keeps the peaks
+and dips a chart needs instead of averaging them away.
+
+Responses are cached per (client, exercise, window, bucket, points,
+metric) in a per-process LRU. Any committed change to a client's workouts,
+setgroups or sets drops that client's entries; bulk query.update()/delete()
+on those tables clears the cache, and writers that bypass the ORM unit of
+work call mark_client_changed(). PROGRESS_SERIES_CACHE_TTL bounds
+staleness across worker processes.
+"""
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Set
+
+from sqlalchemy import event, func, literal_column, select
+from sqlalchemy.orm import Session
+
+from .models import Setgroup, Workout, WorkoutSet
+from .personal_records import e1rm_expression
+from .utils.cache import VersionedLRU
+from .utils.dialects import dialect_name
+from .workout_totals import key_values
+
+PROGRESS_SERIES_CACHE_TTL = int(os.getenv("PROGRESS_SERIES_CACHE_TTL", "300"))
+PROGRESS_SERIES_CACHE_SIZE = int(os.getenv("PROGRESS_SERIES_CACHE_SIZE", "1024"))
+# Upper bound on the `points` a caller may ask LTTB for
+PROGRESS_SERIES_MAX_POINTS = int(os.getenv("PROGRESS_SERIES_MAX_POINTS", "1000"))
+
+BUCKETS = ("session", "week", "month")
+SERIES_METRICS = ("max_weight", "mean_weight", "volume", "total_reps", "best_e1rm")
+
+
+def _bucket_columns(bucket: str, bind):
+    """
+    (group by expression, bucket start expression); week and month group by
+    the start, so it is spelled with literals that compare equal in GROUP BY
+    """
+    if bucket == "session":
+        return Workout.id, func.min(Workout.completed_at)
+    completed = Workout.completed_at
+    name = dialect_name(bind)
+    if name == "postgresql":
+        start = func.date_trunc(literal_column(f"'{bucket}'"), completed)  # ISO weeks start on Monday
+    elif name in ("mysql", "mariadb"):
+        back = func.weekday(completed) if bucket == "week" else func.dayofmonth(completed) - literal_column("1")
+        start = func.subdate(func.date(completed), back)
+    elif bucket == "week":
+        # SQLite: next Sunday (or today if Sunday), back to its Monday
+        start = func.date(completed, "weekday 0", "-6 days")
+    else:
+        start = func.strftime("%Y-%m-01", completed)
+    return None, start
+
+
+def _as_datetime(value: Any) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def points_query(
+    bind,
+    client_id: int,
+    exercise_id: int,
+    bucket: str = "week",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Grouped query of the window's points for the bind's dialect"""
+    group, bucket_start = _bucket_columns(bucket, bind)
+    bucket_start = bucket_start.label("bucket_start")
+    weight = func.nullif(WorkoutSet.weight, 0)
+    stmt = (
+        select(
+            bucket_start,
+            func.count(func.distinct(Workout.id)).label("sessions"),
+            func.count(WorkoutSet.id).label("sets"),
+            func.coalesce(func.sum(WorkoutSet.reps), 0).label("total_reps"),
+            func.max(weight).label("max_weight"),
+            func.avg(weight).label("mean_weight"),
+            func.coalesce(func.sum(WorkoutSet.reps * WorkoutSet.weight), 0.0).label("volume"),
+            func.max(e1rm_expression(WorkoutSet.weight, WorkoutSet.reps)).label("best_e1rm"),
+        )
+        .select_from(WorkoutSet)
+        .join(Setgroup, Setgroup.id == WorkoutSet.setgroup_id)
+        .join(Workout, Workout.id == Setgroup.workout_id)
+        .where(
+            Workout.client_id == client_id,
+            Setgroup.exercise_id == exercise_id,
+            Workout.completed_at.isnot(None),
+        )
+        .group_by(bucket_start if group is None else group)
+        .order_by(bucket_start)
+    )
+    if start is not None:
+        stmt = stmt.where(Workout.completed_at >= start)
+    if end is not None:
+        stmt = stmt.where(Workout.completed_at < end)
+    return stmt
+
+
+def bucketed_points(
+    db: Session,
+    client_id: int,
+    exercise_id: int,
+    bucket: str = "week",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """Aggregated points for the window, oldest first, from one grouped query"""
+    return [
+        {
+            "t": _as_datetime(row.bucket_start).isoformat(),
+            "sessions": row.sessions,
+            "sets": row.sets,
+            "total_reps": row.total_reps,
+            "max_weight": row.max_weight,
+            "mean_weight": round(row.mean_weight, 2) if row.mean_weight is not None else None,
+            "volume": round(row.volume, 2),
+            "best_e1rm": round(row.best_e1rm, 2) if row.best_e1rm is not None else None,
+        }
+        for row in db.execute(points_query(db, client_id, exercise_id, bucket, start, end))
+    ]
+
+
+def lttb(points: Sequence[Any], threshold: int, x: Callable[[Any], float], y: Callable[[Any], float]) -> List[Any]:
+    """Largest-Triangle-Three-Buckets: `threshold` points keeping the visual shape, first and last always kept"""
+    n = len(points)
+    if threshold >= n:
+        return list(points)
+    if threshold < 3:
+        return [points[0], points[-1]][:max(threshold, 0)]
+
+    xs = [x(p) for p in points]
+    ys = [y(p) for p in points]
+    every = (n - 2) / (threshold - 2)
+    sampled = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the triangle's third corner
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        a = max(
+            range(int(i * every) + 1, int((i + 1) * every) + 1),
+            key=lambda j: abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay)),
+        )
+        sampled.append(points[a])
+    sampled.append(points[-1])
+    return sampled
+
+
+def get_series(
+    db: Session,
+    client_id: int,
+    exercise_id: int,
+    bucket: str = "week",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: Optional[int] = None,
+    metric: str = "max_weight"
+) -> Dict[str, Any]:
+    """Bucketed (and optionally LTTB-downsampled) progress series for one exercise"""
+    series = bucketed_points(db, client_id, exercise_id, bucket, start, end)
+    total = len(series)
+    if points is not None and points < total:
+        series = lttb(
+            series,
+            points,
+            x=lambda p: datetime.fromisoformat(p["t"]).timestamp(),
+            y=lambda p: p[metric] or 0,
+        )
+    return {
+        "client_id": client_id,
+        "exercise_id": exercise_id,
+        "bucket": bucket,
+        "metric": metric,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "total_points": total,
+        "downsampled": len(series) < total,
+        "points": series,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+class SeriesCache(VersionedLRU):
+    """LRU of progress series with per-client invalidation and hit/miss counters"""
+
+    def __init__(self, ttl: float = PROGRESS_SERIES_CACHE_TTL, maxsize: int = PROGRESS_SERIES_CACHE_SIZE):
+        super().__init__(ttl, maxsize)
+
+    invalidate_client = VersionedLRU.invalidate_owner
+
+
+_series_cache: Optional[SeriesCache] = None
+
+def get_series_cache() -> SeriesCache:
+    """Get or create the progress series cache singleton"""
+    global _series_cache
+    if _series_cache is None:
+        _series_cache = SeriesCache()
+    return _series_cache
+
+
+def cached_series(
+    db: Session,
+    client_id: int,
+    exercise_id: int,
+    bucket: str = "week",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: Optional[int] = None,
+    metric: str = "max_weight"
+) -> Dict[str, Any]:
+    """get_series() through the cache"""
+    cache = get_series_cache()
+    key = (client_id, exercise_id, start, end, bucket, points, metric)
+    series = cache.get(key)
+    if series is None:
+        version = cache.version()
+        series = get_series(db, client_id, exercise_id, bucket, start, end, points, metric)
+        cache.put(key, client_id, series, version)
+    return series
+
+
+# ---------------------------------------------------------------------------
+# Invalidation from session events
+# ---------------------------------------------------------------------------
+
+_DIRTY_KEY = "exercise_series_dirty"
+_ALL = "*"
+
+
+class _Changed(NamedTuple):
+    client_ids: Set[Any]  # may hold _ALL
+    workout_ids: Set[int]
+    setgroup_ids: Set[int]
+
+
+def _changed(session: Session) -> _Changed:
+    if _DIRTY_KEY not in session.info:
+        session.info[_DIRTY_KEY] = _Changed(set(), set(), set())
+    return session.info[_DIRTY_KEY]
+
+
+def mark_client_changed(session: Session, client_id: int):
+    """Drop the client's cached series when `session` commits (for Core writes the hooks cannot see)"""
+    _changed(session).client_ids.add(client_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_series(session: Session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Workout):
+            _changed(session).client_ids.update(key_values(obj, "client_id"))
+        elif isinstance(obj, Setgroup):
+            _changed(session).workout_ids.update(key_values(obj, "workout_id"))
+        elif isinstance(obj, WorkoutSet):
+            _changed(session).setgroup_ids.update(key_values(obj, "setgroup_id"))
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _resolve_changed_series(session: Session, flush_context):
+    """Map changed setgroups and workouts to their clients while the session can still query"""
+    changed: Optional[_Changed] = session.info.get(_DIRTY_KEY)
+    if changed is None or not (changed.workout_ids or changed.setgroup_ids):
+        return
+    stmt = select(Workout.client_id).distinct()
+    if changed.setgroup_ids:
+        changed.client_ids.update(session.connection().execute(
+            stmt.join(Setgroup, Setgroup.workout_id == Workout.id).where(Setgroup.id.in_(changed.setgroup_ids))
+        ).scalars())
+    if changed.workout_ids:
+        changed.client_ids.update(session.connection().execute(
+            stmt.where(Workout.id.in_(changed.workout_ids))
+        ).scalars())
+    changed.workout_ids.clear()
+    changed.setgroup_ids.clear()
+
+
+def _collect_bulk_change(update_context):
+    if update_context.mapper.class_ in (Workout, Setgroup, WorkoutSet):
+        _changed(update_context.session).client_ids.add(_ALL)
+
+
+event.listen(Session, "after_bulk_update", _collect_bulk_change)
+event.listen(Session, "after_bulk_delete", _collect_bulk_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_series(session: Session):
+    changed: Optional[_Changed] = session.info.pop(_DIRTY_KEY, None)
+    if not changed or not changed.client_ids or _series_cache is None:
+        return
+    if _ALL in changed.client_ids:
+        _series_cache.clear()
+    else:
+        for client_id in changed.client_ids:
+            _series_cache.invalidate_client(client_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_series(session: Session):
+    session.info.pop(_DIRTY_KEY, None)
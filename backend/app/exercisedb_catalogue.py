@@ -0,0 +1,473 @@
+"""
+ExerciseDB Catalogue Mirror
+Mirrors the full ExerciseDB catalogue into local tables and serves lookups
+from in-memory inverted indexes (muscle, equipment, body part) with fuzzy
+name search, so filter requests never leave the process.
+
+Run a sync manually with:
+    python -m backend.app.exercisedb_catalogue [--full]
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .database import SessionLocal
+from .models import ExerciseDBExercise, ExerciseDBSyncState
+
+# Mirror is considered stale (and refreshed in the background) after this many hours
+SYNC_INTERVAL_HOURS = float(os.getenv("EXERCISEDB_SYNC_INTERVAL_HOURS", "24"))
+SYNC_PAGE_SIZE = 100  # API max per page
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _normalise(value: str) -> str:
+    return (value or "").strip().lower()
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(_normalise(text))
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(a: str, b: str) -> float:
+    """Trigram (Jaccard) similarity between two tokens, 1.0 = identical"""
+    if a == b:
+        return 1.0
+    ta, tb = _trigrams(a), _trigrams(b)
+    return len(ta & tb) / len(ta | tb)
+
+
+def _sort_value(record: Dict[str, Any], field: str) -> str:
+    """Sort key for a record field; list fields sort by their first entry"""
+    value = record.get(field)
+    if isinstance(value, list):
+        value = value[0] if value else ""
+    return _normalise(str(value or ""))
+
+
+def exercise_id_of(record: Dict[str, Any]) -> Optional[str]:
+    """ExerciseDB V1 uses `exerciseId`; older datasets use `id`"""
+    value = record.get("exerciseId") or record.get("id")
+    return str(value) if value is not None else None
+
+
+def content_hash(record: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ExerciseCatalogue:
+    """
+    In-memory view of the mirrored catalogue
+
+    Holds every exercise record plus inverted indexes from normalised muscle,
+    equipment and body-part names (and name/facet tokens for fuzzy search) to
+    exercise ids. Indexes are updated per record, so an incremental sync only
+    touches the exercises that actually changed.
+    """
+
+    FACETS = {
+        "muscles": "targetMuscles",
+        "secondary_muscles": "secondaryMuscles",
+        "equipment": "equipments",
+        "body_parts": "bodyParts",
+    }
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.exercises: Dict[str, Dict[str, Any]] = {}
+        self._index: Dict[str, Dict[str, Set[str]]] = {facet: defaultdict(set) for facet in self.FACETS}
+        # Display spelling for each normalised facet value (for metadata endpoints)
+        self._labels: Dict[str, Dict[str, str]] = {facet: {} for facet in self.FACETS}
+        self._token_index: Dict[str, Set[str]] = defaultdict(set)
+        self._trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self._sorted_by_name: Optional[List[str]] = None
+        self.last_synced_at: Optional[datetime] = None
+
+    # ---------- loading / maintenance ----------
+
+    def ensure_loaded(self):
+        """Load the mirror from the database on first use"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            db = SessionLocal()
+            try:
+                rows = db.query(ExerciseDBExercise.data).all()
+                state = db.query(ExerciseDBSyncState).first()
+                self.last_synced_at = state.last_sync_completed_at if state else None
+            finally:
+                db.close()
+            for (data,) in rows:
+                self._add(data)
+            self._sorted_by_name = None
+            self._loaded = True
+
+    def reload(self):
+        """Drop the in-memory indexes and reload them from the database"""
+        with self._lock:
+            self.__init__()
+            self.ensure_loaded()
+
+    def is_ready(self) -> bool:
+        self.ensure_loaded()
+        return bool(self.exercises)
+
+    def is_stale(self) -> bool:
+        if self.last_synced_at is None:
+            return True
+        return datetime.utcnow() - self.last_synced_at > timedelta(hours=SYNC_INTERVAL_HOURS)
+
+    def upsert(self, record: Dict[str, Any]):
+        with self._lock:
+            exercise_id = exercise_id_of(record)
+            if exercise_id in self.exercises:
+                self._remove(exercise_id)
+            self._add(record)
+            self._sorted_by_name = None
+
+    def remove(self, exercise_id: str):
+        with self._lock:
+            self._remove(exercise_id)
+            self._sorted_by_name = None
+
+    def _add(self, record: Dict[str, Any]):
+        exercise_id = exercise_id_of(record)
+        if exercise_id is None:
+            return
+        self.exercises[exercise_id] = record
+        doc_tokens = set(_tokens(record.get("name", "")))
+        for facet, field in self.FACETS.items():
+            for value in record.get(field) or []:
+                key = _normalise(value)
+                self._index[facet][key].add(exercise_id)
+                self._labels[facet].setdefault(key, value)
+                doc_tokens.update(_tokens(value))
+        self._doc_tokens[exercise_id] = doc_tokens
+        for token in doc_tokens:
+            self._token_index[token].add(exercise_id)
+            for gram in _trigrams(token):
+                self._trigram_index[gram].add(token)
+
+    def _remove(self, exercise_id: str):
+        record = self.exercises.pop(exercise_id, None)
+        if record is None:
+            return
+        for facet, field in self.FACETS.items():
+            for value in record.get(field) or []:
+                key = _normalise(value)
+                postings = self._index[facet].get(key)
+                if postings is not None:
+                    postings.discard(exercise_id)
+                    if not postings:
+                        del self._index[facet][key]
+                        self._labels[facet].pop(key, None)
+        for token in self._doc_tokens.pop(exercise_id, set()):
+            postings = self._token_index.get(token)
+            if postings is not None:
+                postings.discard(exercise_id)
+                if not postings:
+                    del self._token_index[token]
+                    for gram in _trigrams(token):
+                        self._trigram_index[gram].discard(token)
+
+    # ---------- queries ----------
+
+    def facet_values(self, facet: str) -> List[str]:
+        self.ensure_loaded()
+        return sorted(self._labels[facet].values(), key=str.lower)
+
+    def get(self, exercise_id: str) -> Optional[Dict[str, Any]]:
+        self.ensure_loaded()
+        return self.exercises.get(exercise_id)
+
+    def _ids_for(self, facet: str, values: Iterable[str]) -> Set[str]:
+        """Union of postings for the given facet values (OR within a facet)"""
+        ids: Set[str] = set()
+        for value in values:
+            ids |= self._index[facet].get(_normalise(value), set())
+        return ids
+
+    def _fuzzy_scores(self, query: str, threshold: float) -> Dict[str, float]:
+        """
+        Score exercises against a free-text query.
+        Each query token is matched to its most similar indexed token; an
+        exercise's score is the mean of its best per-token similarities.
+        """
+        query_tokens = _tokens(query)
+        if not query_tokens:
+            return {}
+        min_score = 1.0 - threshold
+        totals: Dict[str, float] = defaultdict(float)
+        for q in query_tokens:
+            # Candidate vocabulary tokens sharing at least one trigram (or prefix-matching)
+            candidates: Set[str] = set()
+            for gram in _trigrams(q):
+                candidates |= self._trigram_index.get(gram, set())
+            best_per_doc: Dict[str, float] = {}
+            for token in candidates:
+                score = 1.0 if token.startswith(q) else _similarity(q, token)
+                if score < min_score:
+                    continue
+                for exercise_id in self._token_index.get(token, ()):
+                    if score > best_per_doc.get(exercise_id, 0.0):
+                        best_per_doc[exercise_id] = score
+            for exercise_id, score in best_per_doc.items():
+                totals[exercise_id] += score
+        n = len(query_tokens)
+        return {eid: total / n for eid, total in totals.items() if total / n >= min_score}
+
+    def _name_order(self) -> List[str]:
+        if self._sorted_by_name is None:
+            self._sorted_by_name = sorted(
+                self.exercises, key=lambda eid: _normalise(self.exercises[eid].get("name", ""))
+            )
+        return self._sorted_by_name
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: int = 20,
+        search: Optional[str] = None,
+        muscles: Optional[List[str]] = None,
+        equipment: Optional[List[str]] = None,
+        body_parts: Optional[List[str]] = None,
+        include_secondary: bool = False,
+        sort_by: str = "name",
+        sort_order: str = "asc",
+        threshold: float = 0.3,
+    ) -> Dict[str, Any]:
+        """
+        Filter the catalogue (OR within a facet, AND across facets)
+
+        Returns the same envelope as the ExerciseDB API:
+        {"success", "metadata": {...pagination}, "data": [...]}
+        """
+        self.ensure_loaded()
+        with self._lock:
+            candidate_sets: List[Set[str]] = []
+            if muscles:
+                ids = self._ids_for("muscles", muscles)
+                if include_secondary:
+                    ids |= self._ids_for("secondary_muscles", muscles)
+                candidate_sets.append(ids)
+            if equipment:
+                candidate_sets.append(self._ids_for("equipment", equipment))
+            if body_parts:
+                candidate_sets.append(self._ids_for("body_parts", body_parts))
+
+            scores: Optional[Dict[str, float]] = None
+            if search:
+                scores = self._fuzzy_scores(search, threshold)
+                candidate_sets.append(set(scores))
+
+            if candidate_sets:
+                candidate_sets.sort(key=len)
+                matched = set.intersection(*candidate_sets)
+            else:
+                matched = None  # everything
+
+            descending = sort_order.lower() == "desc"
+            if scores is not None and sort_by == "relevance":
+                ordered = sorted(matched, key=lambda eid: (-scores[eid], _normalise(self.exercises[eid].get("name", ""))))
+            elif sort_by in ("name", "relevance"):
+                ordered = [eid for eid in self._name_order() if matched is None or eid in matched]
+                if descending:
+                    ordered.reverse()
+            else:
+                field = self.FACETS.get(sort_by, sort_by)
+                ordered = sorted(
+                    self.exercises if matched is None else matched,
+                    key=lambda eid: _sort_value(self.exercises[eid], field),
+                    reverse=descending,
+                )
+
+            total = len(ordered)
+            page = [self.exercises[eid] for eid in ordered[offset:offset + limit]]
+
+        total_pages = (total + limit - 1) // limit if limit else 0
+        current_page = offset // limit + 1 if limit else 1
+        return {
+            "success": True,
+            "metadata": {
+                "totalExercises": total,
+                "totalPages": total_pages,
+                "currentPage": current_page,
+                "previousPage": current_page - 1 if current_page > 1 else None,
+                "nextPage": current_page + 1 if current_page < total_pages else None,
+                "source": "local",
+            },
+            "data": page,
+        }
+
+
+# Singleton instance
+_catalogue: Optional[ExerciseCatalogue] = None
+
+
+def get_exercise_catalogue() -> ExerciseCatalogue:
+    """Get the singleton catalogue instance"""
+    global _catalogue
+    if _catalogue is None:
+        _catalogue = ExerciseCatalogue()
+    return _catalogue
+
+
+# ==================== SYNC JOB ====================
+
+_sync_lock = asyncio.Lock()
+
+
+async def sync_exercisedb_catalogue(full: bool = False) -> Dict[str, Any]:
+    """
+    Mirror the ExerciseDB catalogue into the local tables
+
+    Pages through the upstream `/exercises` listing and upserts only records
+    whose content hash changed. A full sync also deletes local exercises that
+    no longer exist upstream. The in-memory indexes are patched per record,
+    once the page (or the deletions) it belongs to has been committed.
+    """
+    from .exercisedb_service import get_exercisedb_service
+
+    if _sync_lock.locked():
+        return {"status": "already_running"}
+
+    async with _sync_lock:
+        service = get_exercisedb_service()
+        catalogue = get_exercise_catalogue()
+        catalogue.ensure_loaded()
+
+        db = SessionLocal()
+        try:
+            state = db.query(ExerciseDBSyncState).first()
+            if not state:
+                state = ExerciseDBSyncState()
+                db.add(state)
+            state.last_sync_started_at = datetime.utcnow()
+            state.last_error = None
+            db.commit()
+
+            known_hashes = dict(db.query(ExerciseDBExercise.id, ExerciseDBExercise.content_hash).all())
+            seen: Set[str] = set()
+            inserted = updated = deleted = 0
+
+            try:
+                offset = 0
+                while True:
+                    page = await service.fetch_upstream_page(offset=offset, limit=SYNC_PAGE_SIZE)
+                    records = page.get("data", []) if isinstance(page, dict) else page
+                    if not records:
+                        break
+
+                    now = datetime.utcnow()
+                    new_rows, changed_rows, changed_records = [], [], []
+                    for record in records:
+                        exercise_id = exercise_id_of(record)
+                        if exercise_id is None or exercise_id in seen:
+                            continue
+                        seen.add(exercise_id)
+                        digest = content_hash(record)
+                        if known_hashes.get(exercise_id) == digest:
+                            continue
+                        row = {
+                            "id": exercise_id,
+                            "name": record.get("name", ""),
+                            "gif_url": record.get("gifUrl"),
+                            "body_parts": record.get("bodyParts"),
+                            "equipments": record.get("equipments"),
+                            "target_muscles": record.get("targetMuscles"),
+                            "secondary_muscles": record.get("secondaryMuscles"),
+                            "data": record,
+                            "content_hash": digest,
+                            "synced_at": now,
+                        }
+                        (changed_rows if exercise_id in known_hashes else new_rows).append(row)
+                        changed_records.append(record)
+
+                    if new_rows:
+                        db.bulk_insert_mappings(ExerciseDBExercise, new_rows)
+                    if changed_rows:
+                        db.bulk_update_mappings(ExerciseDBExercise, changed_rows)
+                    db.commit()
+                    for record in changed_records:
+                        known_hashes[exercise_id_of(record)] = content_hash(record)
+                        catalogue.upsert(record)
+                    inserted += len(new_rows)
+                    updated += len(changed_rows)
+
+                    offset += len(records)
+                    total = (page.get("metadata") or {}).get("totalExercises") if isinstance(page, dict) else None
+                    if len(records) < SYNC_PAGE_SIZE or (total is not None and offset >= total):
+                        break
+
+                removed = [eid for eid in known_hashes if eid not in seen] if full else []
+                if removed:
+                    db.query(ExerciseDBExercise).filter(ExerciseDBExercise.id.in_(removed)).delete(synchronize_session=False)
+                    deleted = len(removed)
+            except Exception as e:
+                db.rollback()
+                state = db.query(ExerciseDBSyncState).first()
+                state.last_error = str(e)
+                db.commit()
+                raise
+
+            state.last_sync_completed_at = datetime.utcnow()
+            state.total_exercises = db.query(ExerciseDBExercise).count()
+            state.inserted, state.updated, state.deleted = inserted, updated, deleted
+            db.commit()
+            for exercise_id in removed:
+                catalogue.remove(exercise_id)
+            catalogue.last_synced_at = state.last_sync_completed_at
+
+            return {
+                "status": "completed",
+                "total_exercises": state.total_exercises,
+                "inserted": inserted,
+                "updated": updated,
+                "deleted": deleted,
+            }
+        finally:
+            db.close()
+
+
+def get_sync_status() -> Dict[str, Any]:
+    """Current state of the mirror for the status endpoint"""
+    db = SessionLocal()
+    try:
+        state = db.query(ExerciseDBSyncState).first()
+        return {
+            "running": _sync_lock.locked(),
+            "mirrored_exercises": db.query(ExerciseDBExercise).count(),
+            "last_sync_started_at": state.last_sync_started_at.isoformat() if state and state.last_sync_started_at else None,
+            "last_sync_completed_at": state.last_sync_completed_at.isoformat() if state and state.last_sync_completed_at else None,
+            "inserted": state.inserted if state else 0,
+            "updated": state.updated if state else 0,
+            "deleted": state.deleted if state else 0,
+            "last_error": state.last_error if state else None,
+        }
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .models import Base
+    from .database import engine
+
+    Base.metadata.create_all(bind=engine)
+    print(asyncio.run(sync_exercisedb_catalogue(full="--full" in sys.argv)))
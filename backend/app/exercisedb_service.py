@@ -2,16 +2,30 @@
 ExerciseDB API Integration Service
 Fetches exercise data from ExerciseDB via RapidAPI
 Premium API with 5,000+ exercises (V2 dataset)
+
+Once the catalogue has been mirrored locally (see exercisedb_catalogue.py),
+listing, search, filter and metadata lookups are answered from in-memory
+indexes and RapidAPI is only used by the sync job.
 """
+import asyncio
 import httpx
 import os
 from typing import List, Dict, Optional
-from functools import lru_cache
+from .exercisedb_catalogue import get_exercise_catalogue, sync_exercisedb_catalogue
+from .utils.cache import async_cached
+from .utils.singleflight import SingleFlight, request_key
 
 # RapidAPI ExerciseDB V1 endpoint
 EXERCISEDB_BASE_URL = "https://exercisedb-api1.p.rapidapi.com/api/v1"
 RAPIDAPI_KEY = os.getenv("EXERCISEDB_RAPIDAPI_KEY", "01a44cbd89msh864c4e87aba2d22p10f83cjsn2bea18eb05ec")
 
+# Upstream response caching (seconds) while the local mirror is not populated
+EXERCISEDB_CACHE_TTL = float(os.getenv("EXERCISEDB_CACHE_TTL", "600"))
+EXERCISEDB_METADATA_CACHE_TTL = float(os.getenv("EXERCISEDB_METADATA_CACHE_TTL", "86400"))
+
+# Identical concurrent upstream requests share one HTTP call
+_upstream_flights = SingleFlight("exercisedb")
+
 class ExerciseDBService:
     """Service for fetching exercise data from ExerciseDB API via RapidAPI"""
     
@@ -22,6 +36,49 @@ class ExerciseDBService:
             "x-rapidapi-key": RAPIDAPI_KEY,
             "x-rapidapi-host": "exercisedb-api1.p.rapidapi.com"
         }
+        self.catalogue = get_exercise_catalogue()
+        self._refresh_task: Optional[asyncio.Task] = None
+    
+    def _local_catalogue(self):
+        """
+        Return the local catalogue if it has been mirrored, else None.
+        Kicks off a background incremental refresh when the mirror is stale.
+        """
+        if not self.catalogue.is_ready():
+            return None
+        if self.catalogue.is_stale() and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._background_refresh())
+        return self.catalogue
+    
+    async def _background_refresh(self):
+        try:
+            await sync_exercisedb_catalogue(full=False)
+        except Exception as e:
+            print(f"ExerciseDB background refresh failed: {e}")
+    
+    async def _http_get(self, path: str, params: Optional[Dict] = None):
+        """
+        GET against the ExerciseDB API.
+        Concurrent identical requests are coalesced into one upstream call.
+        """
+        url = f"{self.base_url}{path}"
+        
+        async def fetch():
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                response = await client.get(url, params=params, headers=self.headers)
+                response.raise_for_status()
+                return response.json()
+        
+        return await _upstream_flights.do(request_key("GET", url, params), fetch)
+    
+    async def fetch_upstream_page(self, offset: int = 0, limit: int = 100) -> Dict:
+        """Fetch one raw page of the upstream catalogue (used by the sync job)"""
+        return await self._http_get("/exercises", {"offset": offset, "limit": min(limit, 100)})
+    
+    @async_cached(ttl=EXERCISEDB_CACHE_TTL, maxsize=512, name="exercisedb.upstream")
+    async def _get_json(self, path: str, params: Optional[Dict] = None) -> Dict:
+        """Cached GET against the ExerciseDB API (keyed on path + params)"""
+        return await self._http_get(path, params)
     
     async def get_exercises(
         self,
@@ -40,22 +97,19 @@ class ExerciseDBService:
         Returns:
             Dict with success, metadata (pagination), and data (exercises list)
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            params = {
-                "offset": offset,
-                "limit": min(limit, 100)  # API max is 100
-            }
-            
-            if search:
-                params["search"] = search
-            
-            response = await client.get(
-                f"{self.base_url}/exercises",
-                params=params,
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()
+        catalogue = self._local_catalogue()
+        if catalogue:
+            return catalogue.query(offset=offset, limit=limit, search=search)
+        
+        params = {
+            "offset": offset,
+            "limit": min(limit, 100)  # API max is 100
+        }
+        
+        if search:
+            params["search"] = search
+        
+        return await self._get_json("/exercises", params)
     
     async def search_exercises(
         self,
@@ -76,20 +130,23 @@ class ExerciseDBService:
         Returns:
             Dict with success, metadata, and data
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            params = {
-                "search": query,
-                "offset": offset,
-                "limit": min(limit, 100)
-            }
-            
-            response = await client.get(
-                f"{self.base_url}/exercises/search",
-                params=params,
-                headers=self.headers
+        catalogue = self._local_catalogue()
+        if catalogue:
+            return catalogue.query(
+                offset=offset,
+                limit=limit,
+                search=query,
+                sort_by="relevance",
+                threshold=threshold
             )
-            response.raise_for_status()
-            return response.json()
+        
+        params = {
+            "search": query,
+            "offset": offset,
+            "limit": min(limit, 100)
+        }
+        
+        return await self._get_json("/exercises/search", params)
     
     async def filter_exercises(
         self,
@@ -100,7 +157,8 @@ class ExerciseDBService:
         equipment: Optional[List[str]] = None,
         body_parts: Optional[List[str]] = None,
         sort_by: str = "name",
-        sort_order: str = "asc"
+        sort_order: str = "asc",
+        include_secondary: bool = False
     ) -> Dict:
         """
         Advanced filtering of exercises by multiple criteria
@@ -115,38 +173,46 @@ class ExerciseDBService:
             body_parts: List of body parts to filter by
             sort_by: Field to sort by
             sort_order: asc or desc
+            include_secondary: Also match muscles listed as secondary targets (local mirror only)
             
         Returns:
             Dict with success, metadata, and data
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            params = {
-                "offset": offset,
-                "limit": min(limit, 100)
-            }
-            
-            # Use search if provided, otherwise get all exercises
-            if search:
-                params["search"] = search
-                endpoint = f"{self.base_url}/exercises/search"
-            else:
-                endpoint = f"{self.base_url}/exercises"
-            
-            # Add filters as query params
-            if muscles:
-                params["targetMuscles"] = ",".join(muscles)
-            if equipment:
-                params["equipments"] = ",".join(equipment)
-            if body_parts:
-                params["bodyParts"] = ",".join(body_parts)
-            
-            response = await client.get(
-                endpoint,
-                params=params,
-                headers=self.headers
+        catalogue = self._local_catalogue()
+        if catalogue:
+            return catalogue.query(
+                offset=offset,
+                limit=limit,
+                search=search,
+                muscles=muscles,
+                equipment=equipment,
+                body_parts=body_parts,
+                include_secondary=include_secondary,
+                sort_by=sort_by,
+                sort_order=sort_order
             )
-            response.raise_for_status()
-            return response.json()
+        
+        params = {
+            "offset": offset,
+            "limit": min(limit, 100)
+        }
+        
+        # Use search if provided, otherwise get all exercises
+        if search:
+            params["search"] = search
+            endpoint = "/exercises/search"
+        else:
+            endpoint = "/exercises"
+        
+        # Add filters as query params
+        if muscles:
+            params["targetMuscles"] = ",".join(muscles)
+        if equipment:
+            params["equipments"] = ",".join(equipment)
+        if body_parts:
+            params["bodyParts"] = ",".join(body_parts)
+        
+        return await self._get_json(endpoint, params)
     
     async def get_exercise_by_id(self, exercise_id: str) -> Dict:
         """
@@ -158,13 +224,13 @@ class ExerciseDBService:
         Returns:
             Dict with success and data (exercise object)
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(
-                f"{self.base_url}/exercises/{exercise_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            return response.json()
+        catalogue = self._local_catalogue()
+        if catalogue:
+            exercise = catalogue.get(exercise_id)
+            if exercise is not None:
+                return {"success": True, "data": exercise}
+        
+        return await self._get_json(f"/exercises/{exercise_id}")
     
     async def get_exercises_by_muscle(
         self,
@@ -189,7 +255,8 @@ class ExerciseDBService:
         return await self.filter_exercises(
             offset=offset,
             limit=limit,
-            muscles=[muscle_name]
+            muscles=[muscle_name],
+            include_secondary=include_secondary
         )
     
     async def get_exercises_by_equipment(
@@ -240,71 +307,74 @@ class ExerciseDBService:
             body_parts=[body_part_name]
         )
     
-    @lru_cache(maxsize=1)
     async def get_all_body_parts(self) -> List[str]:
         """
         Get list of all available body parts
-        Cached since this rarely changes
+        Served from the local mirror when available
         
         Returns:
             List of body part names
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(
-                f"{self.base_url}/bodyparts",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            result = response.json()
-            # V1 API returns array of objects with bodyPart field
-            if isinstance(result, dict) and "data" in result:
-                return [bp.get("bodyPart", bp) for bp in result.get("data", [])]
-            # Or might return direct array
-            return [bp.get("bodyPart", bp) if isinstance(bp, dict) else bp for bp in result]
+        catalogue = self._local_catalogue()
+        if catalogue:
+            return catalogue.facet_values("body_parts")
+        return await self._upstream_body_parts()
+    
+    @async_cached(ttl=EXERCISEDB_METADATA_CACHE_TTL, maxsize=1, name="exercisedb.bodyparts")
+    async def _upstream_body_parts(self) -> List[str]:
+        """Fetch the bodyparts list from ExerciseDB (cached; rarely changes)"""
+        result = await self._http_get("/bodyparts")
+        # V1 API returns array of objects with bodyPart field
+        if isinstance(result, dict) and "data" in result:
+            return [bp.get("bodyPart", bp) for bp in result.get("data", [])]
+        # Or might return direct array
+        return [bp.get("bodyPart", bp) if isinstance(bp, dict) else bp for bp in result]
     
-    @lru_cache(maxsize=1)
     async def get_all_equipment(self) -> List[str]:
         """
         Get list of all available equipment types
-        Cached since this rarely changes
+        Served from the local mirror when available
         
         Returns:
             List of equipment names
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(
-                f"{self.base_url}/equipments",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            result = response.json()
-            # V1 API returns array of objects with equipment field
-            if isinstance(result, dict) and "data" in result:
-                return [eq.get("equipment", eq) for eq in result.get("data", [])]
-            # Or might return direct array
-            return [eq.get("equipment", eq) if isinstance(eq, dict) else eq for eq in result]
+        catalogue = self._local_catalogue()
+        if catalogue:
+            return catalogue.facet_values("equipment")
+        return await self._upstream_equipment()
+    
+    @async_cached(ttl=EXERCISEDB_METADATA_CACHE_TTL, maxsize=1, name="exercisedb.equipments")
+    async def _upstream_equipment(self) -> List[str]:
+        """Fetch the equipments list from ExerciseDB (cached; rarely changes)"""
+        result = await self._http_get("/equipments")
+        # V1 API returns array of objects with equipment field
+        if isinstance(result, dict) and "data" in result:
+            return [eq.get("equipment", eq) for eq in result.get("data", [])]
+        # Or might return direct array
+        return [eq.get("equipment", eq) if isinstance(eq, dict) else eq for eq in result]
     
-    @lru_cache(maxsize=1)
     async def get_all_muscles(self) -> List[str]:
         """
         Get list of all available muscle names
-        Cached since this rarely changes
+        Served from the local mirror when available
         
         Returns:
             List of muscle names
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.get(
-                f"{self.base_url}/muscles",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            result = response.json()
-            # V1 API returns array of objects with muscle field
-            if isinstance(result, dict) and "data" in result:
-                return [muscle.get("muscle", muscle) for muscle in result.get("data", [])]
-            # Or might return direct array
-            return [muscle.get("muscle", muscle) if isinstance(muscle, dict) else muscle for muscle in result]
+        catalogue = self._local_catalogue()
+        if catalogue:
+            return sorted(set(catalogue.facet_values("muscles")) | set(catalogue.facet_values("secondary_muscles")), key=str.lower)
+        return await self._upstream_muscles()
+    
+    @async_cached(ttl=EXERCISEDB_METADATA_CACHE_TTL, maxsize=1, name="exercisedb.muscles")
+    async def _upstream_muscles(self) -> List[str]:
+        """Fetch the muscles list from ExerciseDB (cached; rarely changes)"""
+        result = await self._http_get("/muscles")
+        # V1 API returns array of objects with muscle field
+        if isinstance(result, dict) and "data" in result:
+            return [muscle.get("muscle", muscle) for muscle in result.get("data", [])]
+        # Or might return direct array
+        return [muscle.get("muscle", muscle) if isinstance(muscle, dict) else muscle for muscle in result]
 
 
 # Singleton instance
@@ -0,0 +1,123 @@
+"""
+Progress Photo Pipeline
+Turns an uploaded photo into resized, EXIF-free variants so listings, shared
+profiles and reports never ship multi-megabyte phone originals:
+
+    thumb   240px longest edge
+    medium  960px
+    full    2048px
+
+Each size is written as WebP and JPEG into the content-addressed media
+store (media_store.py); callers register the URLs with acquire(). Resizing is
+CPU-bound, so it runs in a process pool instead of the event loop.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+from .media_store import BLOB_DIR, BLOB_URL, blob_relpath, write_blob_bytes
+
+# size name -> longest edge in pixels
+PHOTO_VARIANTS = {"thumb": 240, "medium": 960, "full": 2048}
+PHOTO_FORMATS = {"webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg")}
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Get or create the shared image process pool"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, IMAGE_PROCESS_WORKERS))
+    return _pool
+
+
+def render_variants(source_path: str, directory: str = BLOB_DIR, url_prefix: str = BLOB_URL) -> Dict[str, Dict[str, Any]]:
+    """
+    Write every size/format variant of an image (runs in a worker process)
+
+    Orientation from EXIF is applied to the pixels, then all metadata
+    (EXIF, GPS, XMP) is dropped. Images are never upscaled.
+    Returns {size: {"webp": url, "jpeg": url, "width": w, "height": h}}.
+    """
+    with Image.open(source_path) as original:
+        original.load()
+        image = ImageOps.exif_transpose(original)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for size, edge in PHOTO_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        entry: Dict[str, Any] = {"width": resized.width, "height": resized.height}
+        for fmt, (pil_format, ext) in PHOTO_FORMATS.items():
+            frame = resized.convert("RGB") if pil_format == "JPEG" else resized
+            buffer = io.BytesIO()
+            if pil_format == "JPEG":
+                frame.save(buffer, pil_format, quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                frame.save(buffer, pil_format, quality=WEBP_QUALITY, method=4)
+            sha256 = write_blob_bytes(buffer.getvalue(), ext, directory)
+            entry[fmt] = f"{url_prefix}/{blob_relpath(sha256, ext)}"
+        variants[size] = entry
+    return variants
+
+
+async def process_photo(source_path: str, directory: str = BLOB_DIR, url_prefix: str = BLOB_URL) -> Dict[str, Dict[str, Any]]:
+    """Render the variants of one photo in the process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_pool(), render_variants, source_path, directory, url_prefix)
+
+
+def photo_urls(photos: Optional[List[str]], variants: Optional[List[Dict[str, Any]]], size: str, fmt: str = "jpeg") -> List[str]:
+    """
+    URLs of one size/format for a measurement's photos
+
+    Photos stored before the pipeline existed have no variants and fall back
+    to their original URL.
+    """
+    photos = photos or []
+    variants = variants or []
+    urls = []
+    for index, original in enumerate(photos):
+        entry = variants[index].get(size) if index < len(variants) and variants[index] else None
+        urls.append(entry.get(fmt, original) if entry else original)
+    return urls
+
+
+def variant_urls(variants: Optional[Dict[str, Dict[str, Any]]]) -> List[str]:
+    """Every stored file of one photo's variants, as registered with acquire() (none for legacy photos)"""
+    return [entry[fmt] for entry in (variants or {}).values() for fmt in PHOTO_FORMATS if entry.get(fmt)]
+
+
+def reorder_photos(
+    photos: Optional[List[str]],
+    variants: Optional[List[Optional[Dict[str, Any]]]],
+    wanted: List[str]
+):
+    """
+    (photos, variants, dropped variants) for a measurement keeping only `wanted`, in that order
+
+    `wanted` may name a photo by any of its variant URLs. Raises ValueError
+    for URLs that are not among the measurement's photos: new photos are
+    uploaded, never linked.
+    """
+    photos = photos or []
+    variants = variants or []
+    entries = {url: variants[i] if i < len(variants) else None for i, url in enumerate(photos)}
+    aliases = {alias: url for url, entry in entries.items() for alias in (url, *variant_urls(entry))}
+    unknown = [url for url in wanted if url not in aliases]
+    if unknown:
+        raise ValueError(f"Unknown photo URL(s): {', '.join(unknown)}")
+    kept = list(dict.fromkeys(aliases[url] for url in wanted))
+    dropped = [entry for url, entry in entries.items() if url not in kept]
+    return kept, [entries[url] for url in kept], dropped
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Response, Request, Query
 from pydantic import BaseModel, EmailStr
 from .models import Client, Workout, Achievement, WeightEntry, ShareToken, Trainer, Meal, MealItem, Measurement
 from datetime import datetime, timedelta
@@ -8,7 +8,10 @@ from .pdf_gen import generate_workout_pdf
 import os
 from email.message import EmailMessage
 import smtplib
-from .avatar_gen import generate_avatar_png
+from .avatar_service import get_avatar_cache, render_avatar_png
+from . import profile_snapshots
+from .image_pipeline import variant_urls
+from .media_store import release
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./backend_data.db")
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
@@ -122,14 +125,14 @@ def send_email(client_id: int, payload: EmailPayload):
         if payload.attach_avatar:
             weight_entry = db.query(WeightEntry).filter(WeightEntry.client_id == client_id).order_by(WeightEntry.recorded_at.desc()).first()
             latest_weight = weight_entry.weight if weight_entry else None
-            avatar_bytes = generate_avatar_png(client.name, latest_weight)
+            avatar_bytes = render_avatar_png(client.name, latest_weight)
         pdf_bytes = generate_workout_pdf(client.name, workouts, [], avatar_png=avatar_bytes)
         attachments.append(("plan.pdf", pdf_bytes, "application/pdf"))
 
     if payload.attach_avatar and not payload.attach_pdf:
         weight_entry = db.query(WeightEntry).filter(WeightEntry.client_id == client_id).order_by(WeightEntry.recorded_at.desc()).first()
         latest_weight = weight_entry.weight if weight_entry else None
-        avatar_bytes = generate_avatar_png(client.name, latest_weight)
+        avatar_bytes = render_avatar_png(client.name, latest_weight)
         attachments.append(("avatar.png", avatar_bytes, "image/png"))
 
     try:
@@ -160,7 +163,7 @@ def client_pdf(client_id: int, embed_avatar: bool | None = False):
     if embed_avatar:
         weight_entry = db.query(WeightEntry).filter(WeightEntry.client_id == client_id).order_by(WeightEntry.recorded_at.desc()).first()
         latest_weight = weight_entry.weight if weight_entry else None
-        avatar_bytes = generate_avatar_png(client.name, latest_weight)
+        avatar_bytes = render_avatar_png(client.name, latest_weight)
 
     pdf_bytes = generate_workout_pdf(client.name, workouts, [], avatar_png=avatar_bytes)
     db.close()
@@ -186,7 +189,12 @@ def add_weight(client_id: int, payload: dict):
 
 
 @router.get("/clients/{client_id}/avatar")
-def get_avatar(client_id: int):
+def get_avatar(
+    client_id: int,
+    request: Request,
+    size: int = Query(512, ge=32, le=1024),
+    format: str = Query("png", pattern="^(png|webp)$")
+):
     db = SessionLocal()
     client = db.query(Client).filter(Client.id == client_id).first()
     if not client:
@@ -194,9 +202,16 @@ def get_avatar(client_id: int):
         raise HTTPException(status_code=404, detail="Client not found")
     weight_entry = db.query(WeightEntry).filter(WeightEntry.client_id == client_id).order_by(WeightEntry.recorded_at.desc()).first()
     latest_weight = weight_entry.weight if weight_entry else None
-    png = generate_avatar_png(client.name, latest_weight)
     db.close()
-    return Response(content=png, media_type="image/png")
+
+    # The ETag comes from the inputs, so a revalidation never renders
+    cache = get_avatar_cache()
+    etag = f'"{cache.etag(client.name, latest_weight, size, format)}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    image, _, media_type = cache.get(client.name, latest_weight, size, format)
+    return Response(content=image, media_type=media_type, headers=headers)
 
 
 @router.post("/clients/{client_id}/share")
@@ -222,6 +237,7 @@ def share_profile(client_id: int, request: ShareRequest):
 
     worker_url = os.getenv("WORKER_URL", "http://localhost:5173")
     share_url = f"{worker_url}/profile/{token}"
+    static_url = profile_snapshots.export_snapshot(db, token) if profile_snapshots.PROFILE_SNAPSHOTS else None
 
     try:
         SMTP_HOST = os.getenv("SMTP_HOST")
@@ -257,7 +273,7 @@ This link expires on {expires_at.strftime('%B %d, %Y')}.
     finally:
         db.close()
 
-    return {"share_url": share_url, "token": token, "expires_at": expires_at.isoformat(), "email_sent": True}
+    return {"share_url": share_url, "token": token, "expires_at": expires_at.isoformat(), "email_sent": True, "snapshot_url": static_url}
 
 
 # --- Minimal legacy helpers for workouts & achievements (no auth) ---
@@ -540,6 +556,11 @@ def delete_client(client_id: int):
     
     # Delete all related records (cascade should handle this, but being explicit)
     db.query(WeightEntry).filter(WeightEntry.client_id == client_id).delete()
+    # Photo files are shared blobs: drop this client's references so gc_sweep can collect them
+    for (variants,) in db.query(Measurement.photo_variants).filter(Measurement.client_id == client_id):
+        for entry in variants or []:
+            for url in variant_urls(entry):
+                release(db, url)
     db.query(Measurement).filter(Measurement.client_id == client_id).delete()
     db.query(Achievement).filter(Achievement.client_id == client_id).delete()
     db.query(ShareToken).filter(ShareToken.client_id == client_id).delete()
@@ -1,6 +1,6 @@
+import asyncio
 import os
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from .models import Base
@@ -28,6 +28,19 @@ from .routes.usda_router import router as usda_router
 from .routes.settings_router import router as settings_router
 # Include legacy desktop-friendly routes (no-auth helpers)
 from .legacy_desktop import router as legacy_router
+from .utils.cache import cache_stats
+from .utils.singleflight import singleflight_stats
+from .utils.media import MediaFiles
+from .avatar_service import get_avatar_cache
+from .public_profile import get_profile_cache
+from .exercise_series import get_series_cache
+from .utils.auth import principal_cache
+from .shealth_ingest import run_normaliser
+from .profile_snapshots import sweep_snapshots_periodically
+from . import workout_totals  # noqa: F401  keeps stored workout/setgroup totals in sync
+from . import personal_records  # noqa: F401  keeps personal records in sync
+from .video_processing import get_video_processing_queue
+from .schema_upgrade import upgrade_schema
 
 load_dotenv()
 
@@ -38,8 +51,9 @@ WEBRTC_ICE_SERVERS = os.getenv("WEBRTC_ICE_SERVERS", "[]")
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Ensure tables are created
+# Ensure tables are created, and tables from older releases have every column
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 app = FastAPI(
     title="FitTrack Pro - Free Forever Edition",
@@ -85,10 +99,36 @@ app.include_router(dashboard_router, tags=["dashboard"])
 app.include_router(usda_router, tags=["usda-nutrition"])
 app.include_router(settings_router, tags=["settings"])
 
-# Serve uploaded files (progress photos, thumbnails, workout videos)
+# Serve uploaded files (progress photos, thumbnails, workout videos) with
+# range requests, ETags and long-lived caching for content-addressed files
 uploads_dir = os.path.join(os.getcwd(), "uploads")
 os.makedirs(uploads_dir, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+app.mount("/uploads", MediaFiles(directory=uploads_dir), name="uploads")
+
+
+@app.on_event("startup")
+async def resume_video_processing():
+    """Pick up videos whose processing was interrupted by a restart"""
+    try:
+        get_video_processing_queue().resume_pending()
+    except Exception as e:
+        print(f"Could not resume video processing: {e}")
+
+
+@app.on_event("startup")
+async def resume_shealth_normalisation():
+    """Normalise S-Health payloads left unprocessed (including ones stored before normalisation existed)"""
+    asyncio.get_running_loop().run_in_executor(None, run_normaliser)
+
+
+_background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_snapshot_sweeper():
+    """Remove static profile bundles once their share link has expired"""
+    task = asyncio.create_task(sweep_snapshots_periodically())
+    _background_tasks.add(task)  # the loop only keeps a weak reference
 
 # WebSocket connection manager
 class ConnectionManager:
@@ -140,3 +180,16 @@ async def health():
             "teams": True
         }
     }
+
+
+@app.get("/health/caches")
+async def health_caches():
+    """Hit/miss counters for the in-process caches and request coalescing"""
+    return {
+        "caches": cache_stats(),
+        "coalescing": singleflight_stats(),
+        "avatars": get_avatar_cache().stats(),
+        "public_profiles": get_profile_cache().stats(),
+        "exercise_series": get_series_cache().stats(),
+        "auth_principals": principal_cache.stats(),
+    }
@@ -0,0 +1,202 @@
+"""
+Content-Addressed Media Store
+Every uploaded file (progress photo variants, workout videos, logos) lives
+once on disk under its SHA-256, in one shared layout:
+
+    uploads/blobs/<aa>/<bb>/<sha256><ext>   ->   /uploads/blobs/<aa>/<bb>/<sha256><ext>
+
+Re-uploading the same bytes reuses the existing file. A MediaBlob row per
+file counts the records referencing it; `acquire`/`release` are called in
+the same transaction as the record that gains or drops the URL, and
+`gc_sweep` deletes blobs that stayed unreferenced past a grace period
+(plus files a crashed upload left without a row). Reusing an existing file
+bumps its mtime, so a blob re-uploaded while its row is being collected
+keeps its file for another grace period.
+
+Run a sweep manually with:
+    python -m backend.app.media_store --gc
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from .models import MediaBlob
+from .utils.dialects import upsert
+from .utils.uploads import StoredFile
+
+BLOB_DIR = "uploads/blobs"
+BLOB_URL = "/uploads/blobs"
+# Unreferenced blobs (and row-less files) younger than this survive a sweep,
+# so in-flight uploads are never collected
+MEDIA_GC_GRACE_SECONDS = int(os.getenv("MEDIA_GC_GRACE_SECONDS", "3600"))
+
+_BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+
+
+def blob_relpath(sha256: str, ext: str = "") -> str:
+    """Shared on-disk layout relative to BLOB_DIR: aa/bb/<sha256><ext>"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}"
+
+
+def blob_path(sha256: str, ext: str = "", root: str = BLOB_DIR) -> str:
+    return os.path.join(root, *blob_relpath(sha256, ext).split("/"))
+
+
+def blob_url(sha256: str, ext: str = "") -> str:
+    return f"{BLOB_URL}/{blob_relpath(sha256, ext)}"
+
+
+def parse_blob_url(url: Optional[str]):
+    """(sha256, ext) for a blob URL, or None for anything else (legacy paths, external URLs)"""
+    if not url or not url.startswith(BLOB_URL + "/"):
+        return None
+    match = _BLOB_NAME_RE.match(url.rsplit("/", 1)[-1])
+    return (match.group(1), match.group(2) or "") if match else None
+
+
+def _touch(path: str) -> bool:
+    """Bump an existing blob's mtime so the sweep treats it as freshly uploaded; False if it is gone"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def write_blob_bytes(data: bytes, ext: str, root: str = BLOB_DIR) -> str:
+    """Write bytes into the blob layout (no DB access; safe in worker processes); returns the sha256"""
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = blob_path(sha256, ext, root)
+    if not _touch(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return sha256
+
+
+def adopt_file(stored: StoredFile) -> str:
+    """Move a freshly streamed upload into the blob layout (dropping it if the blob exists); returns its URL"""
+    ext = os.path.splitext(stored.filename)[1].lower()
+    path = blob_path(stored.sha256, ext)
+    if _touch(path):
+        os.remove(stored.path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(stored.path, path)
+    return blob_url(stored.sha256, ext)
+
+
+def acquire(db: Session, url: Optional[str]):
+    """Count one more reference to a blob URL (no-op for non-blob URLs); commit with the referencing row"""
+    parsed = parse_blob_url(url)
+    if not parsed:
+        return
+    sha256, ext = parsed
+    path = blob_path(sha256, ext)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    # Atomic upsert: concurrent uploads of the same bytes both count
+    stmt = upsert(db, MediaBlob.__table__, ["sha256"], lambda excluded: [
+        ("refcount", MediaBlob.refcount + 1),
+        ("released_at", None),
+    ])
+    db.execute(stmt.values(
+        sha256=sha256,
+        ext=ext,
+        size=size,
+        content_type=mimetypes.guess_type(path)[0],
+        refcount=1,
+        created_at=datetime.utcnow(),
+    ))
+
+
+def release(db: Session, url: Optional[str]):
+    """Drop one reference to a blob URL; unreferenced blobs are deleted by gc_sweep"""
+    parsed = parse_blob_url(url)
+    if not parsed:
+        return
+    db.query(MediaBlob).filter(MediaBlob.sha256 == parsed[0]).update({
+        MediaBlob.refcount: MediaBlob.refcount - 1,
+        MediaBlob.released_at: datetime.utcnow(),
+    }, synchronize_session=False)
+
+
+def gc_sweep(db: Session, grace_seconds: int = MEDIA_GC_GRACE_SECONDS) -> Dict[str, Any]:
+    """Delete unreferenced blobs and orphaned files older than the grace period"""
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    deleted_blobs = 0
+    freed_bytes = 0
+
+    oldest_allowed = time.time() - grace_seconds
+
+    expired = db.query(MediaBlob.sha256, MediaBlob.ext).filter(
+        MediaBlob.refcount <= 0,
+        MediaBlob.released_at < cutoff
+    ).all()
+    collected = []
+    for sha256, ext in expired:
+        # Re-checked in the DELETE: an acquire since the SELECT keeps the row
+        result = db.execute(delete(MediaBlob).where(
+            MediaBlob.sha256 == sha256,
+            MediaBlob.refcount <= 0,
+            MediaBlob.released_at < cutoff
+        ))
+        if result.rowcount == 1:
+            collected.append(blob_path(sha256, ext))
+    db.commit()
+    for path in collected:
+        deleted_blobs += 1
+        # A file re-adopted since the grace period began belongs to a new upload
+        if os.path.exists(path) and os.path.getmtime(path) < oldest_allowed:
+            freed_bytes += os.path.getsize(path)
+            os.remove(path)
+
+    # Files with no row at all: a crash between writing and committing
+    known = {sha for (sha,) in db.query(MediaBlob.sha256).all()}
+    orphans = 0
+    if os.path.isdir(BLOB_DIR):
+        for dirpath, _, filenames in os.walk(BLOB_DIR):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                match = _BLOB_NAME_RE.match(name)
+                if match and match.group(1) in known:
+                    continue
+                if os.path.getmtime(path) < oldest_allowed:
+                    freed_bytes += os.path.getsize(path)
+                    os.remove(path)
+                    orphans += 1
+
+    return {"deleted_blobs": deleted_blobs, "orphaned_files": orphans, "freed_bytes": freed_bytes}
+
+
+def store_stats(db: Session) -> Dict[str, Any]:
+    """Blob counts and bytes, for monitoring deduplication"""
+    blobs = db.query(MediaBlob).all()
+    return {
+        "blobs": len(blobs),
+        "bytes": sum(b.size or 0 for b in blobs),
+        "references": sum(max(b.refcount, 0) for b in blobs),
+        "unreferenced": sum(1 for b in blobs if b.refcount <= 0),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .database import SessionLocal, engine
+    from .models import Base
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print(gc_sweep(db) if "--gc" in sys.argv else store_stats(db))
+    finally:
+        db.close()
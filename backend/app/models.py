@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, JSON, Table
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, JSON, Table, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
@@ -74,6 +74,7 @@ class Measurement(Base):
     body_fat = Column(Float)  # percentage
     notes = Column(Text)
     photos = Column(JSON)  # Array of photo URLs
+    photo_variants = Column(JSON)  # Per photo: {thumb|medium|full: {webp, jpeg, width, height}}
     client = relationship("Client", back_populates="measurements")
 
     def average_arm_size(self):
@@ -130,6 +131,10 @@ class Workout(Base):
     notes = Column(Text, nullable=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)  # When workout was logged
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Totals over all sets (volume = reps × weight), maintained by workout_totals.py
+    total_volume = Column(Float, nullable=False, default=0, server_default="0")
+    set_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_reps = Column(Integer, nullable=False, default=0, server_default="0")
     # Relationships
     client = relationship("Client", back_populates="workouts")
     trainer = relationship("Trainer", backref="created_workouts")
@@ -138,14 +143,6 @@ class Workout(Base):
     @property
     def completed(self):
         return self.completed_at is not None
-    
-    @property
-    def total_volume(self):
-        """Calculate total volume (sets × reps × weight) for the workout"""
-        total = 0
-        for setgroup in self.setgroups:
-            total += setgroup.total_volume
-        return total
 
     def __str__(self):
         return f"Workout {self.id} - {self.title} by {self.client.name if self.client else 'Unknown'}"
@@ -161,15 +158,14 @@ class Setgroup(Base):
     notes = Column(Text, nullable=True)  # Specific notes for this exercise
     rest_seconds = Column(Integer, nullable=True)  # Rest time between sets
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Totals over this exercise's sets, maintained by workout_totals.py
+    total_volume = Column(Float, nullable=False, default=0, server_default="0")
+    set_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_reps = Column(Integer, nullable=False, default=0, server_default="0")
     # Relationships
     workout = relationship("Workout", back_populates="setgroups")
     exercise = relationship("Exercise", back_populates="setgroups")
     sets = relationship("WorkoutSet", back_populates="setgroup", cascade="all, delete-orphan", order_by="WorkoutSet.set_number")
-    
-    @property
-    def total_volume(self):
-        """Calculate volume for this exercise"""
-        return sum(s.volume for s in self.sets if s.volume)
 
     def __str__(self):
         return f"{self.exercise.name} Sets"
@@ -216,6 +212,35 @@ class WorkoutSet(Base):
             "volume": self.volume
         }
 
+
+class PersonalRecord(Base):
+    """Best lifts per client and exercise over completed workouts (personal_records.py)"""
+    __tablename__ = "personal_records"
+    client_id = Column(Integer, ForeignKey("clients.id"), primary_key=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), primary_key=True)
+    best_weight = Column(Float, nullable=False)  # heaviest set, kg
+    best_weight_reps = Column(Integer, nullable=False)  # most reps done at that weight
+    best_weight_at = Column(DateTime, nullable=False)
+    best_e1rm = Column(Float)  # estimated one-rep max
+    best_e1rm_weight = Column(Float)
+    best_e1rm_reps = Column(Integer)
+    best_e1rm_at = Column(DateTime)
+    first_e1rm = Column(Float)  # best e1RM on the first recorded day, the baseline for improvement
+    first_e1rm_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    exercise = relationship("Exercise")
+
+
+class RepMaxRecord(Base):
+    """Heaviest weight lifted for a given number of reps (1RM, 5RM, ...) per client and exercise"""
+    __tablename__ = "rep_max_records"
+    client_id = Column(Integer, ForeignKey("clients.id"), primary_key=True)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), primary_key=True)
+    reps = Column(Integer, primary_key=True)
+    weight = Column(Float, nullable=False)
+    achieved_at = Column(DateTime, nullable=False)
+
+
 class MealPlan(Base):
     __tablename__ = "meal_plans"
     id = Column(Integer, primary_key=True)
@@ -335,6 +360,33 @@ class VideoCall(Base):
     client = relationship("Client", back_populates="video_calls")
     trainer = relationship("Trainer", backref="video_calls")
 
+class ExerciseDBExercise(Base):
+    """Local mirror of one ExerciseDB (RapidAPI) catalogue entry"""
+    __tablename__ = "exercisedb_exercises"
+    id = Column(String, primary_key=True)  # ExerciseDB exerciseId
+    name = Column(String, nullable=False, index=True)
+    gif_url = Column(String, nullable=True)
+    body_parts = Column(JSON, nullable=True)  # ["chest"]
+    equipments = Column(JSON, nullable=True)  # ["barbell"]
+    target_muscles = Column(JSON, nullable=True)  # ["pectoralis major"]
+    secondary_muscles = Column(JSON, nullable=True)
+    data = Column(JSON, nullable=False)  # full upstream record, served as-is
+    content_hash = Column(String(64), nullable=False)  # sha256 of the upstream record
+    synced_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class ExerciseDBSyncState(Base):
+    """Bookkeeping for the ExerciseDB catalogue sync job (single row)"""
+    __tablename__ = "exercisedb_sync_state"
+    id = Column(Integer, primary_key=True)
+    last_sync_started_at = Column(DateTime, nullable=True)
+    last_sync_completed_at = Column(DateTime, nullable=True)
+    total_exercises = Column(Integer, default=0)
+    inserted = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    deleted = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+
 class WorkoutCategory(Base):
     __tablename__ = "workout_categories"
     id = Column(Integer, primary_key=True)
@@ -354,6 +406,17 @@ class WorkoutVideo(Base):
     thumbnail_url = Column(String)
     duration = Column(Float)  # in seconds
     difficulty = Column(String)  # beginner, intermediate, advanced, expert
+    # Filled in by the background processing pipeline (video_processing.py)
+    status = Column(String, default="pending", index=True)  # pending, processing, ready, failed
+    processing_error = Column(Text, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    video_codec = Column(String, nullable=True)
+    audio_codec = Column(String, nullable=True)
+    bitrate = Column(Integer, nullable=True)  # bits per second
+    preview_url = Column(String, nullable=True)  # animated WebP preview strip
+    hls_url = Column(String, nullable=True)  # HLS master playlist
+    processed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     views = Column(Integer, default=0)
@@ -392,6 +455,88 @@ class SHealthData(Base):
     trainer_id = Column(Integer, ForeignKey("trainers.id"), nullable=True)
     received_at = Column(DateTime, default=datetime.datetime.utcnow)
     payload = Column(JSON)
+    processed_at = Column(DateTime, index=True)  # set by the normaliser (shealth_ingest.py)
+    samples = Column(Integer)  # typed samples extracted from the payload
+    error = Column(String)
+
+
+class StepSample(Base):
+    """Step count over an interval, normalised from S-Health payloads"""
+    __tablename__ = "step_samples"
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    sample_key = Column(String(64), nullable=False)  # idempotency key: re-sent samples are ignored
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime)
+    count = Column(Integer, nullable=False)
+    source_id = Column(Integer, ForeignKey("shealth_data.id"))
+    __table_args__ = (
+        UniqueConstraint("client_id", "sample_key"),
+        Index("ix_step_samples_client_time", "client_id", "start_time"),
+    )
+
+
+class HeartRateSample(Base):
+    """Heart rate reading (bpm), normalised from S-Health payloads"""
+    __tablename__ = "heart_rate_samples"
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    sample_key = Column(String(64), nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime)
+    bpm = Column(Float, nullable=False)
+    min_bpm = Column(Float)
+    max_bpm = Column(Float)
+    source_id = Column(Integer, ForeignKey("shealth_data.id"))
+    __table_args__ = (
+        UniqueConstraint("client_id", "sample_key"),
+        Index("ix_heart_rate_samples_client_time", "client_id", "start_time"),
+    )
+
+
+class SleepSample(Base):
+    """Sleep session or stage, normalised from S-Health payloads"""
+    __tablename__ = "sleep_samples"
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    sample_key = Column(String(64), nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+    stage = Column(String)  # awake, light, deep, rem; None for a whole session
+    source_id = Column(Integer, ForeignKey("shealth_data.id"))
+    __table_args__ = (
+        UniqueConstraint("client_id", "sample_key"),
+        Index("ix_sleep_samples_client_time", "client_id", "start_time"),
+    )
+
+
+class WeightSample(Base):
+    """Body weight (kg) from a connected scale, normalised from S-Health payloads"""
+    __tablename__ = "weight_samples"
+    id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    sample_key = Column(String(64), nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    weight = Column(Float, nullable=False)
+    body_fat = Column(Float)
+    source_id = Column(Integer, ForeignKey("shealth_data.id"))
+    __table_args__ = (
+        UniqueConstraint("client_id", "sample_key"),
+        Index("ix_weight_samples_client_time", "client_id", "start_time"),
+    )
+
+
+class WearableRollup(Base):
+    """Pre-aggregated wearable samples per client, metric and time bucket (wearable_series.py)"""
+    __tablename__ = "wearable_rollups"
+    client_id = Column(Integer, ForeignKey("clients.id"), primary_key=True)
+    metric = Column(String, primary_key=True)  # steps, heart_rate, sleep, weight
+    resolution = Column(String, primary_key=True)  # minute, hour, day
+    bucket_start = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+    minimum = Column(Float)
+    maximum = Column(Float)
 
 
 class ShareToken(Base):
@@ -412,3 +557,15 @@ class ShareToken(Base):
         return secrets.token_urlsafe(32)
 
 
+
+
+class MediaBlob(Base):
+    """Content-addressed uploaded file, shared by every record that references it"""
+    __tablename__ = "media_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    ext = Column(String, nullable=False, default="")  # e.g. ".jpg"; part of the file name
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=True)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    released_at = Column(DateTime, nullable=True)  # when refcount last dropped to 0 (GC grace period)
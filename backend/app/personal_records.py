@@ -0,0 +1,419 @@
+"""
+Personal Records
+Keeps per (client, exercise) records over the sets of completed workouts,
+so PR screens, progress headers and "most improved" are primary-key
+lookups instead of rescans of every setgroup:
+
+    PersonalRecord   best weight (and most reps at it), best estimated
+                     one-rep max, and the first day's e1RM as a baseline
+    RepMaxRecord     heaviest weight for each rep count up to REP_MAX_LIMIT
+
+The e1RM uses Epley, w × (1 + r/30), or Brzycki, w × 36 / (37 - r), chosen
+with E1RM_FORMULA; a single is its own 1RM and sets above E1RM_MAX_REPS are
+too far from a max to estimate one.
+
+Records follow the session: new sets, heavier edits and newly completed
+workouts are folded into the existing rows; anything that can lower a
+record (deleting or reducing a set, un-completing or deleting a workout)
+recomputes just the affected (client, exercise) pairs. Writers that bypass
+the ORM unit of work call fold_workouts() themselves.
+
+Rebuild everything (e.g. after changing the formula) with:
+    python -m backend.app.personal_records --rebuild
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, event, func, inspect, or_, select, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, contains_eager
+
+from .models import Exercise, PersonalRecord, RepMaxRecord, Setgroup, Workout, WorkoutSet
+from .utils.dialects import upsert
+
+E1RM_FORMULA = os.getenv("E1RM_FORMULA", "epley")  # epley or brzycki
+E1RM_MAX_REPS = int(os.getenv("E1RM_MAX_REPS", "12"))
+REP_MAX_LIMIT = int(os.getenv("REP_MAX_LIMIT", "20"))
+
+Pair = Tuple[int, int]  # (client_id, exercise_id)
+
+
+def estimate_1rm(weight: Optional[float], reps: Optional[int], formula: str = E1RM_FORMULA) -> Optional[float]:
+    """Estimated one-rep max for a set, or None when it cannot be estimated"""
+    if not weight or not reps or reps < 1 or reps > E1RM_MAX_REPS:
+        return None
+    if reps == 1:
+        return float(weight)
+    if formula == "brzycki":
+        return round(weight * 36 / (37 - reps), 2)
+    return round(weight * (1 + reps / 30), 2)
+
+
+def e1rm_expression(weight, reps, formula: str = E1RM_FORMULA):
+    """estimate_1rm() as an unrounded SQL expression, NULL where it cannot be estimated"""
+    estimate = weight * 36.0 / (37 - reps) if formula == "brzycki" else weight * (1 + reps / 30.0)
+    return case(
+        (and_(weight > 0, reps == 1), weight),
+        (and_(weight > 0, reps > 1, reps <= E1RM_MAX_REPS), estimate),
+        else_=None,
+    )
+
+
+class Lift(NamedTuple):
+    client_id: int
+    exercise_id: int
+    weight: float
+    reps: int
+    at: datetime
+
+
+def _lifts_query():
+    """Weighted sets of completed workouts"""
+    return (
+        select(Workout.client_id, Setgroup.exercise_id, WorkoutSet.weight, WorkoutSet.reps, Workout.completed_at)
+        .select_from(WorkoutSet)
+        .join(Setgroup, Setgroup.id == WorkoutSet.setgroup_id)
+        .join(Workout, Workout.id == Setgroup.workout_id)
+        .where(Workout.completed_at.isnot(None), WorkoutSet.weight > 0, WorkoutSet.reps > 0)
+    )
+
+
+def _pairs_query():
+    return (
+        select(Workout.client_id, Setgroup.exercise_id)
+        .select_from(Setgroup)
+        .join(Workout, Workout.id == Setgroup.workout_id)
+        .distinct()
+    )
+
+
+def _merge(record: Dict[str, Any], rep_maxes: Dict[int, Tuple[float, datetime]], lift: Lift):
+    """Fold one set into a record dict and its rep maxes"""
+    weight, reps, at = float(lift.weight), int(lift.reps), lift.at
+    if record.get("best_weight") is None or weight > record["best_weight"] or (
+        weight == record["best_weight"] and reps > record["best_weight_reps"]
+    ):
+        record.update(best_weight=weight, best_weight_reps=reps, best_weight_at=at)
+
+    e1rm = estimate_1rm(weight, reps)
+    if e1rm is not None:
+        if record.get("best_e1rm") is None or e1rm > record["best_e1rm"]:
+            record.update(best_e1rm=e1rm, best_e1rm_weight=weight, best_e1rm_reps=reps, best_e1rm_at=at)
+        first_at = record.get("first_e1rm_at")
+        if first_at is None or at.date() < first_at.date():
+            record.update(first_e1rm=e1rm, first_e1rm_at=at)
+        elif at.date() == first_at.date() and e1rm > record["first_e1rm"]:
+            record["first_e1rm"] = e1rm
+
+    if reps <= REP_MAX_LIMIT:
+        current = rep_maxes.get(reps)
+        if current is None or weight > current[0]:
+            rep_maxes[reps] = (weight, at)
+
+
+def _record_update(excluded):
+    """
+    Conflict clause that only ever raises a record
+
+    Two writers can fold from the same stale read, so each field group is
+    kept unless the incoming row beats the stored one (compared under the
+    row lock). Comparison columns come last in their group for MySQL.
+    """
+    current = PersonalRecord.__table__.c
+
+    def keep_unless(condition, *columns):
+        return [(c, case((condition, excluded[c]), else_=current[c])) for c in columns]
+
+    heavier = or_(
+        excluded.best_weight > current.best_weight,
+        and_(excluded.best_weight == current.best_weight, excluded.best_weight_reps > current.best_weight_reps),
+    )
+    stronger = excluded.best_e1rm > func.coalesce(current.best_e1rm, -1)
+    earlier = or_(current.first_e1rm_at.is_(None), func.date(excluded.first_e1rm_at) < func.date(current.first_e1rm_at))
+    same_day_better = and_(
+        func.date(excluded.first_e1rm_at) == func.date(current.first_e1rm_at),
+        excluded.first_e1rm > current.first_e1rm,
+    )
+    return [
+        *keep_unless(heavier, "best_weight_at", "best_weight_reps", "best_weight"),
+        *keep_unless(stronger, "best_e1rm_weight", "best_e1rm_reps", "best_e1rm_at", "best_e1rm"),
+        *keep_unless(or_(earlier, same_day_better), "first_e1rm"),
+        *keep_unless(earlier, "first_e1rm_at"),
+        ("updated_at", excluded.updated_at),
+    ]
+
+
+def record_upsert(bind):
+    return upsert(bind, PersonalRecord.__table__, ["client_id", "exercise_id"], _record_update)
+
+
+def rep_max_upsert(bind):
+    current = RepMaxRecord.__table__.c
+    return upsert(bind, RepMaxRecord.__table__, ["client_id", "exercise_id", "reps"], lambda excluded: [
+        (c, case((excluded.weight > current.weight, excluded[c]), else_=current[c])) for c in ("achieved_at", "weight")
+    ])
+
+
+def fold_lifts(connection: Connection, lifts: Iterable[Lift]) -> int:
+    """Merge sets into the stored records (one read and one upsert per table); returns pairs touched"""
+    by_pair: Dict[Pair, List[Lift]] = {}
+    for lift in lifts:
+        by_pair.setdefault((lift.client_id, lift.exercise_id), []).append(lift)
+    if not by_pair:
+        return 0
+
+    columns = [c.name for c in PersonalRecord.__table__.columns if c.name not in ("client_id", "exercise_id", "updated_at")]
+    records = {
+        (row.client_id, row.exercise_id): {c: getattr(row, c) for c in columns}
+        for row in connection.execute(
+            select(PersonalRecord.__table__).where(tuple_(PersonalRecord.client_id, PersonalRecord.exercise_id).in_(list(by_pair)))
+        )
+    }
+    rep_maxes: Dict[Pair, Dict[int, Tuple[float, datetime]]] = {}
+    for row in connection.execute(
+        select(RepMaxRecord.__table__).where(tuple_(RepMaxRecord.client_id, RepMaxRecord.exercise_id).in_(list(by_pair)))
+    ):
+        rep_maxes.setdefault((row.client_id, row.exercise_id), {})[row.reps] = (row.weight, row.achieved_at)
+
+    now = datetime.utcnow()
+    record_rows, rep_rows = [], []
+    for pair, pair_lifts in by_pair.items():
+        record = records.get(pair, {})
+        pair_rep_maxes = rep_maxes.setdefault(pair, {})
+        before = dict(pair_rep_maxes)
+        for lift in pair_lifts:
+            _merge(record, pair_rep_maxes, lift)
+        record_rows.append({c: record.get(c) for c in columns} | {"client_id": pair[0], "exercise_id": pair[1], "updated_at": now})
+        rep_rows.extend(
+            {"client_id": pair[0], "exercise_id": pair[1], "reps": reps, "weight": weight, "achieved_at": at}
+            for reps, (weight, at) in pair_rep_maxes.items()
+            if before.get(reps) != (weight, at)
+        )
+
+    connection.execute(record_upsert(connection), record_rows)
+    if rep_rows:
+        connection.execute(rep_max_upsert(connection), rep_rows)
+    return len(by_pair)
+
+
+def _lifts(connection: Connection, *criteria) -> List[Lift]:
+    return [Lift(*row) for row in connection.execute(_lifts_query().where(*criteria))]
+
+
+def fold_workouts(connection: Connection, workout_ids: Iterable[int]) -> int:
+    """Fold every set of the given (newly written or newly completed) workouts"""
+    workout_ids = set(workout_ids)
+    return fold_lifts(connection, _lifts(connection, Workout.id.in_(workout_ids))) if workout_ids else 0
+
+
+def recompute_pairs(connection: Connection, pairs: Iterable[Pair]) -> int:
+    """Rebuild the records of the given (client, exercise) pairs from their sets"""
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+    for table in (PersonalRecord.__table__, RepMaxRecord.__table__):
+        connection.execute(delete(table).where(tuple_(table.c.client_id, table.c.exercise_id).in_(list(pairs))))
+    fold_lifts(connection, _lifts(connection, tuple_(Workout.client_id, Setgroup.exercise_id).in_(list(pairs))))
+    return len(pairs)
+
+
+# ---------------------------------------------------------------------------
+# Maintenance from session events
+# ---------------------------------------------------------------------------
+
+_DIRTY_KEY = "personal_records_dirty"
+
+
+class _Pending(NamedTuple):
+    pairs: Set[Pair]  # recompute
+    fold_sets: Set[int]
+    fold_workouts: Set[int]
+    recompute_sets: Set[int]
+    recompute_setgroups: Set[int]
+    recompute_workouts: Set[int]
+
+
+def _pending(session: Session) -> _Pending:
+    if _DIRTY_KEY not in session.info:
+        session.info[_DIRTY_KEY] = _Pending(set(), set(), set(), set(), set(), set())
+    return session.info[_DIRTY_KEY]
+
+
+def _pairs_for(connection: Connection, setgroup_ids: Set[int] = frozenset(), workout_ids: Set[int] = frozenset()) -> Set[Pair]:
+    pairs: Set[Pair] = set()
+    if setgroup_ids:
+        pairs.update(tuple(r) for r in connection.execute(_pairs_query().where(Setgroup.id.in_(setgroup_ids))))
+    if workout_ids:
+        pairs.update(tuple(r) for r in connection.execute(_pairs_query().where(Workout.id.in_(workout_ids))))
+    return pairs
+
+
+def _changed(obj, attr: str) -> bool:
+    return inspect(obj).attrs[attr].history.has_changes()
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_removed_records(session: Session, flush_context, instances):
+    """Pairs whose rows are about to disappear or move, looked up while they still exist"""
+    setgroup_ids: Set[int] = set()
+    workout_ids: Set[int] = set()
+    for obj in session.deleted:
+        if isinstance(obj, WorkoutSet) and obj.setgroup_id is not None:
+            setgroup_ids.add(obj.setgroup_id)
+        elif isinstance(obj, Setgroup) and obj.id is not None:
+            setgroup_ids.add(obj.id)
+        elif isinstance(obj, Workout) and obj.id is not None:
+            workout_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Setgroup) and (_changed(obj, "exercise_id") or _changed(obj, "workout_id")):
+            setgroup_ids.add(obj.id)
+        elif isinstance(obj, Workout) and _changed(obj, "client_id"):
+            workout_ids.add(obj.id)
+    if setgroup_ids or workout_ids:
+        _pending(session).pairs.update(_pairs_for(session.connection(), setgroup_ids, workout_ids))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_records(session: Session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, WorkoutSet):
+            _pending(session).fold_sets.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, WorkoutSet) and (_changed(obj, "weight") or _changed(obj, "reps")):
+            pending = _pending(session)
+            lowered = any(
+                (old or 0) > (getattr(obj, attr) or 0)
+                for attr in ("weight", "reps")
+                for old in inspect(obj).attrs[attr].history.deleted
+            )
+            (pending.recompute_sets if lowered else pending.fold_sets).add(obj.id)
+        elif isinstance(obj, Setgroup) and (_changed(obj, "exercise_id") or _changed(obj, "workout_id")):
+            _pending(session).recompute_setgroups.add(obj.id)
+        elif isinstance(obj, Workout) and (_changed(obj, "completed_at") or _changed(obj, "client_id")):
+            pending = _pending(session)
+            newly_completed = not _changed(obj, "client_id") and all(
+                old is None for old in inspect(obj).attrs.completed_at.history.deleted
+            )
+            (pending.fold_workouts if newly_completed else pending.recompute_workouts).add(obj.id)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _apply_changed_records(session: Session, flush_context):
+    pending: Optional[_Pending] = session.info.pop(_DIRTY_KEY, None)
+    if pending is None:
+        return
+    connection = session.connection()
+    pairs = set(pending.pairs)
+    if pending.recompute_sets:
+        setgroup_ids = set(connection.execute(
+            select(WorkoutSet.setgroup_id).where(WorkoutSet.id.in_(pending.recompute_sets))
+        ).scalars())
+        pairs |= _pairs_for(connection, setgroup_ids)
+    pairs |= _pairs_for(connection, pending.recompute_setgroups, pending.recompute_workouts)
+    recompute_pairs(connection, pairs)
+
+    # Sets already counted by a recompute are skipped; folding them twice would be harmless
+    criteria = []
+    if pending.fold_sets:
+        criteria.append(WorkoutSet.id.in_(pending.fold_sets))
+    if pending.fold_workouts:
+        criteria.append(Workout.id.in_(pending.fold_workouts))
+    for criterion in criteria:
+        fold_lifts(connection, [l for l in _lifts(connection, criterion) if (l.client_id, l.exercise_id) not in pairs])
+
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, (PersonalRecord, RepMaxRecord)):
+            session.expire(obj)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_records(session: Session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def improvement(record: PersonalRecord) -> Optional[float]:
+    """e1RM gain over the first recorded day, as a fraction"""
+    if not record.first_e1rm or record.best_e1rm is None or record.best_e1rm_at.date() <= record.first_e1rm_at.date():
+        return None
+    return (record.best_e1rm - record.first_e1rm) / record.first_e1rm
+
+
+def serialize_record(record: PersonalRecord, rep_maxes: Optional[List[RepMaxRecord]] = None) -> Dict[str, Any]:
+    gain = improvement(record)
+    data = {
+        "exercise_id": record.exercise_id,
+        "exercise_name": record.exercise.name if record.exercise else None,
+        "best_weight": record.best_weight,
+        "best_weight_reps": record.best_weight_reps,
+        "best_weight_at": record.best_weight_at,
+        "best_e1rm": record.best_e1rm,
+        "best_e1rm_weight": record.best_e1rm_weight,
+        "best_e1rm_reps": record.best_e1rm_reps,
+        "best_e1rm_at": record.best_e1rm_at,
+        "first_e1rm": record.first_e1rm,
+        "first_e1rm_at": record.first_e1rm_at,
+        "e1rm_improvement_percent": round(gain * 100, 1) if gain is not None else None,
+        "formula": E1RM_FORMULA,
+    }
+    if rep_maxes is not None:
+        data["rep_maxes"] = [{"reps": r.reps, "weight": r.weight, "achieved_at": r.achieved_at} for r in rep_maxes]
+    return data
+
+
+def get_record(db: Session, client_id: int, exercise_id: int) -> Optional[PersonalRecord]:
+    return db.get(PersonalRecord, (client_id, exercise_id))
+
+
+def get_rep_maxes(db: Session, client_id: int, exercise_id: int) -> List[RepMaxRecord]:
+    return db.query(RepMaxRecord).filter(
+        RepMaxRecord.client_id == client_id,
+        RepMaxRecord.exercise_id == exercise_id
+    ).order_by(RepMaxRecord.reps).all()
+
+
+def client_records(db: Session, client_id: int) -> List[PersonalRecord]:
+    return db.query(PersonalRecord).join(Exercise).options(contains_eager(PersonalRecord.exercise)).filter(
+        PersonalRecord.client_id == client_id
+    ).order_by(Exercise.name).all()
+
+
+def most_improved(records: Iterable[PersonalRecord]) -> Optional[PersonalRecord]:
+    """Record with the largest relative e1RM gain, if any exercise has improved"""
+    improved = [(gain, r) for r in records if (gain := improvement(r)) is not None and gain > 0]
+    return max(improved, key=lambda item: item[0])[1] if improved else None
+
+
+def rebuild_records(db: Session, client_id: Optional[int] = None) -> Dict[str, int]:
+    """Recompute records from every completed set (all clients, or one)"""
+    connection = db.connection()
+    for table in (PersonalRecord.__table__, RepMaxRecord.__table__):
+        stmt = delete(table)
+        if client_id is not None:
+            stmt = stmt.where(table.c.client_id == client_id)
+        connection.execute(stmt)
+    criteria = [Workout.client_id == client_id] if client_id is not None else []
+    pairs = fold_lifts(connection, _lifts(connection, *criteria))
+    db.commit()
+    return {"records": pairs}
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .database import SessionLocal, engine
+    from .models import Base
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if "--rebuild" in sys.argv:
+            print(rebuild_records(db))
+        else:
+            print({"records": db.query(PersonalRecord).count(), "rep_maxes": db.query(RepMaxRecord).count()})
+    finally:
+        db.close()
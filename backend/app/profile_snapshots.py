@@ -0,0 +1,257 @@
+"""
+Static Profile Snapshots
+With PROFILE_SNAPSHOTS enabled, every shared profile is also rendered to a
+self-contained static bundle when it is shared:
+
+    uploads/profiles/<token>/profile.json   the public profile payload
+    uploads/profiles/<token>/index.html     standalone page (inline CSS, data embedded)
+
+The bundle is served by the /uploads mount (or synced to a CDN / the
+Cloudflare worker) with no database access per view. It is re-rendered in
+the background whenever the public profile cache is invalidated for that
+client, and removed once the share link is deactivated. Links that simply
+run out are swept every PROFILE_SNAPSHOT_SWEEP_INTERVAL seconds by a
+startup task, along with bundles whose token no longer exists.
+
+Re-render everything (e.g. after a template change) with:
+    python -m backend.app.profile_snapshots --refresh
+"""
+import asyncio
+import html
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import ShareToken
+from .public_profile import add_change_listener, build_public_profile
+
+PROFILE_SNAPSHOTS = os.getenv("PROFILE_SNAPSHOTS", "false").lower() in ("1", "true", "yes")
+PROFILE_SNAPSHOT_DIR = "uploads/profiles"
+PROFILE_SNAPSHOT_URL = "/uploads/profiles"
+PROFILE_SNAPSHOT_SWEEP_INTERVAL = int(os.getenv("PROFILE_SNAPSHOT_SWEEP_INTERVAL", "3600"))
+
+
+def snapshot_dir(token: str) -> str:
+    return os.path.join(PROFILE_SNAPSHOT_DIR, os.path.basename(token))
+
+
+def snapshot_url(token: str) -> str:
+    return f"{PROFILE_SNAPSHOT_URL}/{token}/index.html"
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{threading.get_ident()}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _rows(items, columns) -> str:
+    if not items:
+        return "<p class=\"empty\">Nothing yet</p>"
+    head = "".join(f"<th>{html.escape(label)}</th>" for label, _ in columns)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape('' if item.get(key) is None else str(item.get(key)))}</td>" for _, key in columns) + "</tr>"
+        for item in items
+    )
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def render_html(profile: Dict[str, Any]) -> str:
+    """Standalone HTML page for a profile; the JSON payload is embedded for client-side use"""
+    name = html.escape(profile["client"]["name"] or "Client")
+    photos = "".join(
+        f'<img src="{html.escape(url)}" alt="Progress photo" loading="lazy">'
+        for m in profile["measurements"] for url in m["photos"]
+    )
+    data = json.dumps(profile, separators=(",", ":")).replace("</", "<\\/")
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<meta name="robots" content="noindex">
+<title>{name} - FitTrack Pro progress</title>
+<style>
+body {{ font-family: system-ui, sans-serif; margin: 0 auto; max-width: 960px; padding: 1rem; color: #1f2933; }}
+h1 {{ margin-bottom: 0; }}
+.meta {{ color: #616e7c; margin-top: .25rem; }}
+table {{ border-collapse: collapse; width: 100%; margin-bottom: 1.5rem; }}
+th, td {{ border-bottom: 1px solid #e4e7eb; padding: .4rem; text-align: left; }}
+.photos img {{ max-width: 240px; margin: 0 .5rem .5rem 0; border-radius: 4px; }}
+.empty {{ color: #9aa5b1; }}
+</style>
+</head>
+<body>
+<h1>{name}</h1>
+<p class="meta">Snapshot generated {html.escape(profile["snapshot_generated_at"])} &middot; link valid until {html.escape(profile["share_expires_at"][:10])}</p>
+<h2>Measurements</h2>
+{_rows(profile["measurements"], [("Date", "date"), ("Weight", "weight"), ("Chest", "chest"), ("Waist", "waist"), ("Hips", "hips"), ("Body fat %", "body_fat")])}
+<div class="photos">{photos}</div>
+<h2>Achievements</h2>
+{_rows(profile["achievements"], [("Achievement", "name"), ("Description", "description"), ("Awarded", "awarded_at")])}
+<h2>Milestones</h2>
+{_rows(profile["milestones"], [("Milestone", "title"), ("Value", "value"), ("Unit", "unit"), ("Achieved", "achieved_at")])}
+<h2>Active quests</h2>
+{_rows(profile["quests"], [("Quest", "title"), ("Progress %", "progress_percentage"), ("Deadline", "deadline")])}
+<h2>Recent meals</h2>
+{_rows(profile["recent_meals"], [("Date", "date"), ("Meal", "name"), ("Notes", "notes")])}
+<script type="application/json" id="profile-data">{data}</script>
+</body>
+</html>
+"""
+
+
+def export_snapshot(db: Session, token: str) -> Optional[str]:
+    """Render one share token's bundle to disk; returns its URL, or None (and removes it) if the link is no longer valid"""
+    built = build_public_profile(db, token)
+    if built is None:
+        remove_snapshot(token)
+        return None
+    _, profile = built
+    profile["snapshot_generated_at"] = datetime.utcnow().isoformat()
+
+    directory = snapshot_dir(token)
+    os.makedirs(directory, exist_ok=True)
+    _write_atomic(os.path.join(directory, "profile.json"), json.dumps(profile, separators=(",", ":")).encode())
+    _write_atomic(os.path.join(directory, "index.html"), render_html(profile).encode())
+    return snapshot_url(token)
+
+
+def remove_snapshot(token: str):
+    shutil.rmtree(snapshot_dir(token), ignore_errors=True)
+
+
+def refresh_snapshots(db: Session, client_ids: Optional[Set[int]] = None) -> Dict[str, int]:
+    """Re-render the bundles of `client_ids` (all clients if None) and drop those of dead links"""
+    now = datetime.utcnow()
+    live = db.query(ShareToken.token).filter(ShareToken.is_active == True, ShareToken.expires_at > now)
+    dead = db.query(ShareToken.token).filter(or_(ShareToken.is_active == False, ShareToken.expires_at <= now))
+    if client_ids is not None:
+        live = live.filter(ShareToken.client_id.in_(client_ids))
+        dead = dead.filter(ShareToken.client_id.in_(client_ids))
+
+    exported = sum(1 for (token,) in live.all() if export_snapshot(db, token))
+    removed = 0
+    for (token,) in dead.all():
+        if os.path.isdir(snapshot_dir(token)):
+            remove_snapshot(token)
+            removed += 1
+    return {"exported": exported, "removed": removed}
+
+
+def sweep_snapshots(db: Session) -> int:
+    """Remove bundles whose share link expired, was deactivated or no longer exists; returns bundles removed"""
+    if not os.path.isdir(PROFILE_SNAPSHOT_DIR):
+        return 0
+    tokens = {name for name in os.listdir(PROFILE_SNAPSHOT_DIR) if os.path.isdir(snapshot_dir(name))}
+    if not tokens:
+        return 0
+    live = {
+        token for (token,) in db.query(ShareToken.token).filter(
+            ShareToken.token.in_(tokens), ShareToken.is_active == True, ShareToken.expires_at > datetime.utcnow()
+        )
+    }
+    for token in tokens - live:
+        remove_snapshot(token)
+    return len(tokens - live)
+
+
+def _sweep_once():
+    db = SessionLocal()
+    try:
+        removed = sweep_snapshots(db)
+        if removed:
+            print(f"Profile snapshots: removed {removed} expired bundle(s)")
+    except Exception as e:
+        print(f"Profile snapshot sweep failed: {e}")
+    finally:
+        db.close()
+
+
+async def sweep_snapshots_periodically():
+    """Startup task: sweep expired bundles now and every PROFILE_SNAPSHOT_SWEEP_INTERVAL seconds"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(None, _sweep_once)
+        await asyncio.sleep(PROFILE_SNAPSHOT_SWEEP_INTERVAL)
+
+
+class SnapshotRefresher:
+    """Debounced background re-rendering: changes that arrive while a refresh runs are batched into the next one"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-snapshots")
+        self._lock = threading.Lock()
+        self._pending: Set[int] = set()
+        self._refresh_all = False
+        self._scheduled = False
+
+    def schedule(self, client_ids: Optional[Set[int]]):
+        with self._lock:
+            if client_ids is None:
+                self._refresh_all = True
+            else:
+                self._pending.update(client_ids)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._executor.submit(self._run)
+
+    def _run(self):
+        with self._lock:
+            client_ids = None if self._refresh_all else set(self._pending)
+            self._pending.clear()
+            self._refresh_all = False
+            self._scheduled = False
+        db = SessionLocal()
+        try:
+            refresh_snapshots(db, client_ids)
+        except Exception as e:
+            print(f"Profile snapshot refresh failed: {e}")
+        finally:
+            db.close()
+
+    def wait(self):
+        """Block until queued refreshes have run (tests, shutdown)"""
+        self._executor.submit(lambda: None).result()
+
+
+_refresher: Optional[SnapshotRefresher] = None
+
+def get_snapshot_refresher() -> SnapshotRefresher:
+    """Get or create the snapshot refresher singleton"""
+    global _refresher
+    if _refresher is None:
+        _refresher = SnapshotRefresher()
+    return _refresher
+
+
+def _on_profile_change(client_ids: Optional[Set[int]]):
+    if PROFILE_SNAPSHOTS:
+        get_snapshot_refresher().schedule(client_ids)
+
+
+add_change_listener(_on_profile_change)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .database import engine
+    from .models import Base
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print(refresh_snapshots(db) if "--refresh" in sys.argv else {"snapshots": len(os.listdir(PROFILE_SNAPSHOT_DIR)) if os.path.isdir(PROFILE_SNAPSHOT_DIR) else 0})
+    finally:
+        db.close()
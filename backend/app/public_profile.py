@@ -0,0 +1,293 @@
+"""
+Public Profile Cache
+Shared profile links are unauthenticated and get bursty traffic, while the
+profile itself only changes when the client logs something. Rendered
+profiles are kept in a per-process LRU keyed by share token (and photo
+size/format), with a strong ETag and Last-Modified so repeat visits and the
+offline copy in the share page revalidate with a 304.
+
+Entries are invalidated from SQLAlchemy session events: any committed
+change to a client's measurements, meals, quests, milestones, achievements,
+share tokens or the client row drops that client's entries. Bulk
+query.update()/delete() on those tables clears the whole cache. A
+version check stops a render that raced with a commit from storing stale
+data. Other worker processes only see their own commits, so
+PROFILE_CACHE_TTL bounds staleness across processes.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .image_pipeline import photo_urls
+from .models import Achievement, Client, Meal, Measurement, Milestone, Quest, ShareToken
+from .utils.cache import VersionedLRU
+
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
+
+# Models whose rows appear in a public profile, and how to find the client they belong to
+WATCHED_MODELS = {
+    Measurement: "client_id",
+    Meal: "client_id",
+    Quest: "client_id",
+    Milestone: "client_id",
+    Achievement: "client_id",
+    ShareToken: "client_id",
+    Client: "id",
+}
+
+
+def build_public_profile(
+    db: Session,
+    token: str,
+    photo_size: str = "medium",
+    photo_format: str = "jpeg"
+) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """(client id, profile data) for a share token, or None if the token is invalid, expired or orphaned"""
+
+    # Validate token
+    share_token = db.query(ShareToken).filter(
+        ShareToken.token == token,
+        ShareToken.is_active == True,
+        ShareToken.expires_at > datetime.utcnow()
+    ).first()
+
+    if not share_token:
+        return None
+
+    # Get client data
+    client = db.query(Client).filter(Client.id == share_token.client_id).first()
+    if not client:
+        return None
+
+    # Get measurements (last 12)
+    measurements = db.query(Measurement).filter(
+        Measurement.client_id == client.id
+    ).order_by(Measurement.date.desc()).limit(12).all()
+
+    # Get recent meals (last 30 days)
+    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    recent_meals = db.query(Meal).filter(
+        Meal.client_id == client.id,
+        Meal.date >= thirty_days_ago
+    ).order_by(Meal.date.desc()).all()
+
+    # Get active quests
+    active_quests = db.query(Quest).filter(
+        Quest.client_id == client.id,
+        Quest.is_active == True,
+        Quest.completed_at == None
+    ).order_by(Quest.created_at.desc()).all()
+
+    # Get recent milestones (last 20)
+    milestones = db.query(Milestone).filter(
+        Milestone.client_id == client.id
+    ).order_by(Milestone.achieved_at.desc()).limit(20).all()
+
+    # Get achievements (all)
+    achievements = db.query(Achievement).filter(
+        Achievement.client_id == client.id
+    ).order_by(Achievement.awarded_at.desc()).all()
+
+    # Build response
+    return client.id, {
+        "client": {
+            "name": client.name,
+            "email": client.email,
+        },
+        "measurements": [
+            {
+                "id": m.id,
+                "date": m.date.isoformat() if m.date else None,
+                "weight": m.weight,
+                "chest": m.chest,
+                "waist": m.waist,
+                "hips": m.hips,
+                "biceps_left": m.biceps_left,
+                "biceps_right": m.biceps_right,
+                "body_fat": m.body_fat,
+                "photos": photo_urls(m.photos, m.photo_variants, photo_size, photo_format),
+                "photo_variants": m.photo_variants,
+                "notes": m.notes,
+            }
+            for m in measurements
+        ],
+        "recent_meals": [
+            {
+                "id": meal.id,
+                "date": meal.date.isoformat() if meal.date else None,
+                "name": meal.name,
+                "total_nutrients": meal.total_nutrients,
+                "notes": meal.notes,
+            }
+            for meal in recent_meals
+        ],
+        "quests": [
+            {
+                "id": q.id,
+                "title": q.title,
+                "description": q.description,
+                "quest_type": q.quest_type,
+                "target_value": q.target_value,
+                "current_value": q.current_value,
+                "target_unit": q.target_unit,
+                "progress_percentage": round(min(100, (q.current_value / q.target_value) * 100), 1) if q.target_value and q.current_value else 0,
+                "reward_achievement": q.reward_achievement,
+                "difficulty": q.difficulty,
+                "xp_reward": q.xp_reward,
+                "deadline": q.deadline.isoformat() if q.deadline else None,
+                "created_at": q.created_at.isoformat() if q.created_at else None,
+            }
+            for q in active_quests
+        ],
+        "milestones": [
+            {
+                "id": m.id,
+                "title": m.title,
+                "description": m.description,
+                "milestone_type": m.milestone_type,
+                "value": m.value,
+                "unit": m.unit,
+                "icon": m.icon,
+                "celebration_message": m.celebration_message,
+                "achieved_at": m.achieved_at.isoformat() if m.achieved_at else None,
+            }
+            for m in milestones
+        ],
+        "achievements": [
+            {
+                "id": a.id,
+                "name": a.name,
+                "description": a.description,
+                "icon": a.icon,
+                "category": a.category,
+                "awarded_at": a.awarded_at.isoformat() if a.awarded_at else None,
+            }
+            for a in achievements
+        ],
+        "share_expires_at": share_token.expires_at.isoformat(),
+    }
+
+
+class CachedProfile(NamedTuple):
+    client_id: int
+    body: bytes  # serialised JSON, sent as-is
+    etag: str
+    last_modified: str  # HTTP date
+    ttl: float  # seconds; never past the share token's own expiry
+
+
+class ProfileCache(VersionedLRU):
+    """LRU of rendered public profiles with per-client invalidation and hit/miss counters"""
+
+    def __init__(self, ttl: float = PROFILE_CACHE_TTL, maxsize: int = PROFILE_CACHE_SIZE):
+        super().__init__(ttl, maxsize)
+
+    def render(self, client_id: int, profile: Dict[str, Any]) -> CachedProfile:
+        """Serialise a built profile into a cacheable entry"""
+        body = json.dumps(profile, separators=(",", ":")).encode()
+        share_expires = datetime.fromisoformat(profile["share_expires_at"])
+        seconds_left = (share_expires - datetime.utcnow()).total_seconds()
+        return CachedProfile(
+            client_id=client_id,
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            last_modified=formatdate(time.time(), usegmt=True),
+            ttl=max(0.0, min(self.ttl, seconds_left)),
+        )
+
+    def put(self, key: Hashable, entry: CachedProfile, version: int):
+        """Store unless the client's data changed after `version` was taken"""
+        super().put(key, entry.client_id, entry, version, ttl=entry.ttl)
+
+    def _replace(self, previous: CachedProfile, entry: CachedProfile) -> CachedProfile:
+        return previous if previous.etag == entry.etag else entry  # unchanged content keeps its Last-Modified
+
+    invalidate_client = VersionedLRU.invalidate_owner
+
+
+def is_not_modified(entry: CachedProfile, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """Conditional GET check; If-None-Match takes precedence over If-Modified-Since"""
+    if if_none_match:
+        return entry.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    since = parsedate(if_modified_since or "")
+    return bool(since and since >= parsedate(entry.last_modified))
+
+
+_profile_cache: Optional[ProfileCache] = None
+
+def get_profile_cache() -> ProfileCache:
+    """Get or create the public profile cache singleton"""
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = ProfileCache()
+    return _profile_cache
+
+
+# ---------------------------------------------------------------------------
+# Invalidation from session events
+# ---------------------------------------------------------------------------
+
+_DIRTY_KEY = "public_profile_dirty"
+_ALL = "*"
+
+
+def _client_ids(obj) -> Set[int]:
+    """Current and previous owner of a changed row"""
+    attr = WATCHED_MODELS[type(obj)]
+    history = inspect(obj).attrs[attr].history
+    return {v for v in (getattr(obj, attr), *history.deleted) if v is not None}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_clients(session: Session, flush_context):
+    dirty = session.info.setdefault(_DIRTY_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if type(obj) in WATCHED_MODELS:
+            dirty.update(_client_ids(obj))
+
+
+def _collect_bulk_change(update_context):
+    if update_context.mapper.class_ in WATCHED_MODELS:
+        update_context.session.info.setdefault(_DIRTY_KEY, set()).add(_ALL)
+
+
+event.listen(Session, "after_bulk_update", _collect_bulk_change)
+event.listen(Session, "after_bulk_delete", _collect_bulk_change)
+
+
+# Called with the changed client ids (None for "all") after the cache is invalidated
+_change_listeners: List[Callable[[Optional[Set[int]]], None]] = []
+
+
+def add_change_listener(listener: Callable[[Optional[Set[int]]], None]):
+    """Run `listener` after every commit that changes public profile data (e.g. snapshot export)"""
+    _change_listeners.append(listener)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_clients(session: Session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+    client_ids = None if _ALL in dirty else dirty
+    if _profile_cache is not None:
+        if client_ids is None:
+            _profile_cache.clear()
+        else:
+            for client_id in client_ids:
+                _profile_cache.invalidate_client(client_id)
+    for listener in _change_listeners:
+        listener(client_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_clients(session: Session):
+    session.info.pop(_DIRTY_KEY, None)
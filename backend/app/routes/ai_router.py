@@ -3,13 +3,16 @@ AI-Powered Fitness Endpoints
 Provides intelligent workout generation, meal planning, and coaching
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import json
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import Client, Workout, Measurement
-from ..ai_service import get_ai_service
+from ..ai_service import get_ai_service, INTERACTIVE
+from ..ai_batch import create_batch_job, run_batch_job, get_job
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -22,6 +25,16 @@ class WorkoutGenerationRequest(BaseModel):
     space: str = 'moderate'
 
 
+class BatchWorkoutGenerationRequest(BaseModel):
+    client_ids: Optional[List[int]] = None  # explicit roster...
+    trainer_id: Optional[int] = None  # ...or every client of a trainer
+    body_part: Optional[str] = None
+    equipment: List[str] = ['bodyweight', 'dumbbells']
+    location: str = 'gym'
+    space: str = 'moderate'
+    persist: bool = True  # save each plan day as a Workout
+
+
 class MealPlanRequest(BaseModel):
     client_id: int
 
@@ -30,22 +43,26 @@ class ProgressReportRequest(BaseModel):
     client_id: int
 
 
-@router.post("/workout-plan")
-async def generate_workout_plan(request: WorkoutGenerationRequest, db: Session = Depends(get_db)):
-    """
-    Generate an AI-powered personalized workout plan
-    
-    Uses Claude AI if available, falls back to rule-based generation
-    """
-    client = db.query(Client).filter(Client.id == request.client_id).first()
+def _latest_measurement(db: Session, client_id: int) -> Optional[Measurement]:
+    return db.query(Measurement)\
+        .filter(Measurement.client_id == client_id)\
+        .order_by(Measurement.date.desc())\
+        .first()
+
+
+def _get_client(db: Session, client_id: int) -> Client:
+    client = db.query(Client).filter(Client.id == client_id).first()
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
+    return client
+
+
+def _workout_context(request: WorkoutGenerationRequest, db: Session) -> Tuple[Client, Dict[str, Any], Dict[str, Any]]:
+    """Build the (client, user_profile, preferences) triple for workout generation"""
+    client = _get_client(db, request.client_id)
     
     # Get latest measurements for context
-    latest_measurement = db.query(Measurement)\
-        .filter(Measurement.client_id == request.client_id)\
-        .order_by(Measurement.date.desc())\
-        .first()
+    latest_measurement = _latest_measurement(db, request.client_id)
     
     user_profile = {
         'name': client.name,
@@ -61,53 +78,159 @@ async def generate_workout_plan(request: WorkoutGenerationRequest, db: Session =
         'space': request.space,
         'equipment': request.equipment
     }
+    return client, user_profile, preferences
+
+
+def _meal_plan_context(request: MealPlanRequest, db: Session) -> Tuple[Client, Dict[str, Any]]:
+    """Build the (client, user_profile) pair for meal plan generation"""
+    client = _get_client(db, request.client_id)
+    latest_measurement = _latest_measurement(db, request.client_id)
+    
+    return client, {
+        'name': client.name,
+        'age': 'N/A',
+        'gender': 'N/A',
+        'weight': latest_measurement.weight if latest_measurement else None,
+        'goal': 'general fitness'
+    }
+
+
+def _event_stream(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Serialise service events as Server-Sent Events"""
+    async def body():
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/workout-plan")
+async def generate_workout_plan(request: WorkoutGenerationRequest, db: Session = Depends(get_db)):
+    """
+    Generate an AI-powered personalized workout plan
+    
+    Uses Claude AI if available, falls back to rule-based generation
+    """
+    client, user_profile, preferences = _workout_context(request, db)
     
     ai_service = get_ai_service()
-    workout_plan = await ai_service.generate_workout_plan(
+    workout_plan, generated_by = await ai_service.generate_workout_plan_with_source(
         user_profile,
         preferences,
-        request.body_part
+        request.body_part,
+        tenant=client.trainer_id,
+        priority=INTERACTIVE
     )
     
     return {
         "success": True,
         "workout_plan": workout_plan.dict(),
-        "generated_by": "AI" if ai_service.use_ai else "Rule-based"
+        "generated_by": generated_by
     }
 
 
-@router.post("/meal-plan")
-async def generate_meal_plan(request: MealPlanRequest, db: Session = Depends(get_db)):
+@router.post("/workout-plan/stream")
+async def stream_workout_plan(request: WorkoutGenerationRequest, db: Session = Depends(get_db)):
     """
-    Generate an AI-powered personalized meal plan
+    Stream workout plan generation as Server-Sent Events
+    
+    Emits `token` events with text as it is generated, then a final `plan`
+    event ({plan, generated_by, cached}). On AI failure an `error` event is
+    sent and the plan falls back to rule-based generation.
     """
-    client = db.query(Client).filter(Client.id == request.client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
+    client, user_profile, preferences = _workout_context(request, db)
     
-    latest_measurement = db.query(Measurement)\
-        .filter(Measurement.client_id == request.client_id)\
-        .order_by(Measurement.date.desc())\
-        .first()
+    ai_service = get_ai_service()
+    return _event_stream(
+        ai_service.stream_workout_plan(user_profile, preferences, request.body_part, tenant=client.trainer_id)
+    )
+
+
+@router.post("/workout-plans/batch", status_code=202)
+async def generate_workout_plans_batch(
+    request: BatchWorkoutGenerationRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Regenerate workout plans for a whole roster
     
-    user_profile = {
-        'name': client.name,
-        'age': 'N/A',
-        'gender': 'N/A',
-        'weight': latest_measurement.weight if latest_measurement else None,
-        'goal': 'general fitness'
+    Runs as a background job at batch priority (interactive requests are served
+    first); each plan day is saved as a Workout. Poll /ai/jobs/{job_id} for progress.
+    """
+    client_ids = list(request.client_ids or [])
+    if request.trainer_id is not None:
+        client_ids += [cid for (cid,) in db.query(Client.id).filter(Client.trainer_id == request.trainer_id).all()]
+    if not client_ids:
+        raise HTTPException(status_code=400, detail="Provide client_ids or a trainer_id with clients")
+    
+    params = request.dict(exclude={'client_ids', 'trainer_id'})
+    job = create_batch_job(db, sorted(set(client_ids)), params)
+    if not job["total"]:
+        raise HTTPException(status_code=404, detail="Client not found")
+    background_tasks.add_task(run_batch_job, job["job_id"])
+    
+    return {
+        "success": True,
+        "job_id": job["job_id"],
+        "total": job["total"],
+        "missing_client_ids": job["missing_client_ids"],
+        "status_url": f"/ai/jobs/{job['job_id']}"
     }
+
+
+@router.get("/jobs/{job_id}")
+def get_batch_job(job_id: str):
+    """
+    Get progress and per-client results of a batch generation job
+    """
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/meal-plan")
+async def generate_meal_plan(request: MealPlanRequest, db: Session = Depends(get_db)):
+    """
+    Generate an AI-powered personalized meal plan
+    """
+    client, user_profile = _meal_plan_context(request, db)
     
     ai_service = get_ai_service()
-    meal_plan = await ai_service.generate_meal_plan(user_profile)
+    meal_plan, generated_by = await ai_service.generate_meal_plan_with_source(user_profile, tenant=client.trainer_id, priority=INTERACTIVE)
     
     return {
         "success": True,
         "meal_plan": meal_plan.dict(),
-        "generated_by": "AI" if ai_service.use_ai else "Rule-based"
+        "generated_by": generated_by
     }
 
 
+@router.post("/meal-plan/stream")
+async def stream_meal_plan(request: MealPlanRequest, db: Session = Depends(get_db)):
+    """
+    Stream meal plan generation as Server-Sent Events (same events as /workout-plan/stream)
+    """
+    client, user_profile = _meal_plan_context(request, db)
+    
+    ai_service = get_ai_service()
+    return _event_stream(ai_service.stream_meal_plan(user_profile, tenant=client.trainer_id))
+
+
+@router.get("/metrics")
+def get_ai_metrics():
+    """
+    AI request scheduler metrics: concurrency, queue depth per priority,
+    requests shed to the rule-based fallback and queue wait percentiles
+    """
+    return get_ai_service().scheduler.stats()
+
+
 @router.get("/motivational-quote")
 def get_motivational_quote():
     """
@@ -207,7 +330,7 @@ async def generate_progress_report(request: ProgressReportRequest, db: Session =
     }
     
     ai_service = get_ai_service()
-    report = await ai_service.generate_progress_report(
+    report, generated_by = await ai_service.generate_progress_report_with_source(
         user_profile,
         workout_history,
         measurement_history
@@ -216,5 +339,5 @@ async def generate_progress_report(request: ProgressReportRequest, db: Session =
     return {
         "success": True,
         "report": report.dict(),
-        "generated_by": "AI" if ai_service.use_ai else "Rule-based"
+        "generated_by": generated_by
     }
@@ -4,7 +4,9 @@ from typing import Optional, Dict
 from pydantic import BaseModel, HttpUrl
 from ..database import get_db
 from ..models import BrandingConfig, Trainer
-from ..utils.auth import get_current_trainer
+from ..utils.auth import Principal, get_current_trainer, get_current_trainer_entity
+from ..utils.uploads import save_upload, MAX_PHOTO_BYTES, STAGING_DIR
+from ..media_store import adopt_file, acquire, release
 
 router = APIRouter()
 
@@ -28,7 +30,7 @@ class BrandingResponse(BaseModel):
 
 @router.get("/", response_model=BrandingResponse)
 async def get_branding(
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Get trainer's branding configuration"""
@@ -50,7 +52,7 @@ async def get_branding(
 @router.put("/", response_model=BrandingResponse)
 async def update_branding(
     branding: BrandingUpdate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Update trainer's branding configuration"""
@@ -68,7 +70,7 @@ async def update_branding(
 @router.post("/logo", response_model=BrandingResponse)
 async def upload_logo(
     file: UploadFile = File(...),
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Upload trainer's business logo"""
@@ -79,17 +81,16 @@ async def upload_logo(
             detail="File must be an image"
         )
     
-    # Save file and update logo URL
-    file_path = f"static/logos/{current_trainer.id}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
-    
     db_branding = current_trainer.branding_config
     if not db_branding:
         raise HTTPException(status_code=404, detail="Branding config not found")
     
-    db_branding.logo_url = f"/static/logos/{current_trainer.id}_{file.filename}"
+    # Stream to the shared content-addressed store and swap the reference
+    stored = await save_upload(file, STAGING_DIR, MAX_PHOTO_BYTES)
+    logo_url = adopt_file(stored)
+    acquire(db, logo_url)
+    release(db, db_branding.logo_url)
+    db_branding.logo_url = logo_url
     db.commit()
     db.refresh(db_branding)
     
@@ -98,7 +99,7 @@ async def upload_logo(
 @router.post("/preview")
 async def generate_preview(
     branding: BrandingUpdate,
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Generate preview of branding changes"""
     # This would typically generate preview images or return
@@ -9,7 +9,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from ..database import get_db
-from ..utils.auth import get_current_trainer
+from ..utils.auth import get_current_trainer, require_client
 from ..models import Client, Workout, Meal, Measurement, Achievement, Quest, Milestone
 from ..email_service import EmailService
 from ..pdf_generator import (
@@ -102,13 +102,11 @@ async def send_meal_plan_email(
     """
     Send meal plan email with PDF attachment
     """
-    client = db.query(Client).filter(Client.id == request.client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
     # Verify trainer has access
-    if client.trainer_id != current_trainer.id:
-        raise HTTPException(status_code=403, detail="Access denied")
+    require_client(current_trainer, request.client_id)
+    client = db.get(Client, request.client_id)
+    if client is None:
+        raise HTTPException(status_code=404, detail="Client not found")
     
     # Get client email
     to_email = request.client_email or client.email
@@ -165,13 +163,11 @@ async def send_progress_report_email(
     """
     Send progress report email with PDF attachment
     """
-    client = db.query(Client).filter(Client.id == request.client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
     # Verify trainer has access
-    if client.trainer_id != current_trainer.id:
-        raise HTTPException(status_code=403, detail="Access denied")
+    require_client(current_trainer, request.client_id)
+    client = db.get(Client, request.client_id)
+    if client is None:
+        raise HTTPException(status_code=404, detail="Client not found")
     
     # Get client email
     to_email = request.client_email or client.email
@@ -232,13 +228,11 @@ async def send_health_stats_email(
     """
     Send health statistics email with PDF attachment
     """
-    client = db.query(Client).filter(Client.id == request.client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
     # Verify trainer has access
-    if client.trainer_id != current_trainer.id:
-        raise HTTPException(status_code=403, detail="Access denied")
+    require_client(current_trainer, request.client_id)
+    client = db.get(Client, request.client_id)
+    if client is None:
+        raise HTTPException(status_code=404, detail="Client not found")
     
     # Get client email
     to_email = request.client_email or client.email
@@ -1,10 +1,13 @@
 """
-ExerciseDB Router - Proxy endpoints to ExerciseDB API
-Provides exercise database access with 1,300+ exercises
+ExerciseDB Router - Exercise database endpoints
+Provides exercise database access with 1,300+ exercises, served from the
+local catalogue mirror once synced (proxied to ExerciseDB API until then)
 """
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, BackgroundTasks
 from typing import Optional, List
 from ..exercisedb_service import get_exercisedb_service
+from ..exercisedb_catalogue import sync_exercisedb_catalogue, get_sync_status
+from ..utils.auth import Principal, get_current_trainer
 
 router = APIRouter(prefix="/exercisedb", tags=["exercisedb"])
 
@@ -62,7 +65,8 @@ async def filter_exercises(
     equipment: Optional[str] = Query(None, description="Comma-separated equipment (e.g., 'dumbbell,barbell')"),
     body_parts: Optional[str] = Query(None, description="Comma-separated body parts (e.g., 'chest,upper arms')"),
     sort_by: str = Query("name", description="Field to sort by (name, targetMuscles, bodyParts, equipments)"),
-    sort_order: str = Query("asc", description="Sort order (asc or desc)")
+    sort_order: str = Query("asc", description="Sort order (asc or desc)"),
+    include_secondary: bool = Query(False, description="Also match muscles listed as secondary targets")
 ):
     """
     Advanced filtering of exercises by multiple criteria
@@ -86,7 +90,8 @@ async def filter_exercises(
             equipment=equipment_list,
             body_parts=body_parts_list,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            include_secondary=include_secondary
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Filter failed: {str(e)}")
@@ -220,3 +225,27 @@ async def get_all_muscles():
         return {"success": True, "data": muscles}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch muscles: {str(e)}")
+
+
+@router.post("/sync")
+async def sync_catalogue(
+    background_tasks: BackgroundTasks,
+    full: bool = Query(False, description="Full sync also removes exercises that no longer exist upstream"),
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    """
+    Mirror the ExerciseDB catalogue into the local database
+    
+    Runs in the background; only exercises whose content changed are rewritten.
+    Poll /exercisedb/sync/status for progress.
+    """
+    background_tasks.add_task(sync_exercisedb_catalogue, full)
+    return {"success": True, "status": "scheduled", "full": full}
+
+
+@router.get("/sync/status")
+def sync_status():
+    """
+    Get the state of the local ExerciseDB mirror
+    """
+    return {"success": True, "data": get_sync_status()}
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
-from ..utils.auth import get_current_trainer
+from ..utils.auth import Principal, get_current_trainer, require_client
 from .. import models
 from ..schemas.meal import (
     MealCreate,
@@ -16,11 +16,9 @@ from ..utils import nutrition
 router = APIRouter()
 
 @router.post("/{client_id}/meals", response_model=Meal)
-async def create_meal(client_id: int, payload: MealCreate, db: Session = Depends(get_db), current_trainer: models.Trainer = Depends(get_current_trainer)):
+async def create_meal(client_id: int, payload: MealCreate, db: Session = Depends(get_db), current_trainer: Principal = Depends(get_current_trainer)):
     # verify client belongs to trainer
-    client = db.query(models.Client).filter(models.Client.id == client_id, models.Client.trainer_id == current_trainer.id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
+    require_client(current_trainer, client_id)
 
     # build meal
     meal = models.Meal(
@@ -77,19 +75,15 @@ async def create_meal(client_id: int, payload: MealCreate, db: Session = Depends
     return meal
 
 @router.get("/{client_id}/meals", response_model=List[Meal])
-async def list_meals(client_id: int, db: Session = Depends(get_db), current_trainer: models.Trainer = Depends(get_current_trainer)):
-    client = db.query(models.Client).filter(models.Client.id == client_id, models.Client.trainer_id == current_trainer.id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
+async def list_meals(client_id: int, db: Session = Depends(get_db), current_trainer: Principal = Depends(get_current_trainer)):
+    require_client(current_trainer, client_id)
 
     meals = db.query(models.Meal).filter(models.Meal.client_id == client_id).order_by(models.Meal.date.desc()).all()
     return meals
 
 @router.get("/{client_id}/meals/{meal_id}", response_model=Meal)
-async def get_meal(client_id: int, meal_id: int, db: Session = Depends(get_db), current_trainer: models.Trainer = Depends(get_current_trainer)):
-    client = db.query(models.Client).filter(models.Client.id == client_id, models.Client.trainer_id == current_trainer.id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
+async def get_meal(client_id: int, meal_id: int, db: Session = Depends(get_db), current_trainer: Principal = Depends(get_current_trainer)):
+    require_client(current_trainer, client_id)
 
     meal = db.query(models.Meal).filter(models.Meal.id == meal_id, models.Meal.client_id == client_id).first()
     if not meal:
@@ -97,11 +91,9 @@ async def get_meal(client_id: int, meal_id: int, db: Session = Depends(get_db),
     return meal
 
 @router.post("/meal-plans", response_model=MealPlan)
-async def create_meal_plan(payload: MealPlanCreate, db: Session = Depends(get_db), current_trainer: models.Trainer = Depends(get_current_trainer)):
+async def create_meal_plan(payload: MealPlanCreate, db: Session = Depends(get_db), current_trainer: Principal = Depends(get_current_trainer)):
     # allow trainer to create plan for a client
-    client = db.query(models.Client).filter(models.Client.id == payload.client_id, models.Client.trainer_id == current_trainer.id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
+    require_client(current_trainer, payload.client_id)
 
     plan = models.MealPlan(
         client_id=payload.client_id,
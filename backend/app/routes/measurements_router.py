@@ -1,26 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, File, Query, UploadFile
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime, timedelta
 from ..database import get_db
-from ..models import Measurement, Client, Trainer
+from ..models import Measurement
 from ..schemas.measurements import (
     MeasurementCreate,
     MeasurementUpdate,
     Measurement as MeasurementSchema,
     MeasurementStats
 )
-from ..utils.auth import get_current_trainer
+from ..utils.auth import get_authorized_client_id
+from ..utils.uploads import save_upload, MAX_PHOTO_BYTES, STAGING_DIR
+from ..image_pipeline import process_photo, photo_urls, reorder_photos, variant_urls, PHOTO_VARIANTS, PHOTO_FORMATS
+from ..media_store import acquire, release
+from PIL import UnidentifiedImageError
 import os
-import aiofiles
-import uuid
 from fastapi.responses import JSONResponse
 
 router = APIRouter()
 
-PHOTOS_DIR = "uploads/measurement_photos"
-os.makedirs(PHOTOS_DIR, exist_ok=True)
+PHOTO_SIZE_PATTERN = "^(" + "|".join(PHOTO_VARIANTS) + ")$"
+PHOTO_FORMAT_PATTERN = "^(" + "|".join(PHOTO_FORMATS) + ")$"
+
+
+def with_photo_size(measurement: Measurement, size: Optional[str], fmt: str) -> MeasurementSchema:
+    """Serialise a measurement with `photos` pointing at the requested variant"""
+    result = MeasurementSchema.model_validate(measurement)
+    if size:
+        result = result.model_copy(update={"photos": photo_urls(measurement.photos, measurement.photo_variants, size, fmt)})
+    return result
 
 def calculate_progress_rating(changes: dict) -> str:
     """Calculate progress rating based on measurements changes"""
@@ -40,48 +50,46 @@ def calculate_progress_rating(changes: dict) -> str:
     else:
         return "needs_improvement"
 
-@router.post("/{client_id}/measurements", response_model=MeasurementSchema)
+@router.post("/{client_id}/measurements", response_model=MeasurementSchema, dependencies=[Depends(get_authorized_client_id)])
 async def create_measurement(
     client_id: int,
     measurement: MeasurementCreate,
     photos: List[UploadFile] = File(None),
-    db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    db: Session = Depends(get_db)
 ):
-    # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-
     # Handle photo uploads
-    photo_urls = []
+    full_urls = []
+    variants = []
     if photos:
         for photo in photos:
             if not photo.content_type.startswith('image/'):
                 raise HTTPException(status_code=400, detail="File must be an image")
             
-            # Generate unique filename
-            ext = os.path.splitext(photo.filename)[1]
-            filename = f"{uuid.uuid4()}{ext}"
-            filepath = os.path.join(PHOTOS_DIR, filename)
+            # Stream to disk in chunks
+            stored = await save_upload(photo, STAGING_DIR, MAX_PHOTO_BYTES)
             
-            # Save photo
-            async with aiofiles.open(filepath, 'wb') as out_file:
-                content = await photo.read()
-                await out_file.write(content)
+            # Resized, EXIF-free variants go to the media store; the original
+            # (with GPS etc.) is not kept
+            try:
+                photo_variants = await process_photo(stored.path)
+            except (UnidentifiedImageError, OSError):
+                raise HTTPException(status_code=400, detail="File is not a readable image")
+            finally:
+                os.remove(stored.path)
             
-            photo_urls.append(f"/uploads/measurement_photos/{filename}")
+            for entry in photo_variants.values():
+                for fmt in PHOTO_FORMATS:
+                    acquire(db, entry[fmt])
+            full_urls.append(photo_variants["full"]["jpeg"])
+            variants.append(photo_variants)
 
     # Create measurement
     db_measurement = Measurement(
         client_id=client_id,
         date=measurement.date or datetime.utcnow(),
-        photos=photo_urls,
-        **measurement.model_dump(exclude={'client_id', 'date'})
+        photos=full_urls,
+        photo_variants=variants,
+        **measurement.model_dump(exclude={'client_id', 'date', 'photos'})
     )
     
     db.add(db_measurement)
@@ -89,45 +97,29 @@ async def create_measurement(
     db.refresh(db_measurement)
     return db_measurement
 
-@router.get("/{client_id}/measurements", response_model=List[MeasurementSchema])
+@router.get("/{client_id}/measurements", response_model=List[MeasurementSchema], dependencies=[Depends(get_authorized_client_id)])
 async def get_measurements(
     client_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    photo_size: Optional[str] = Query(None, pattern=PHOTO_SIZE_PATTERN, description="thumb, medium or full"),
+    photo_format: str = Query("jpeg", pattern=PHOTO_FORMAT_PATTERN),
+    db: Session = Depends(get_db)
 ):
-    # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-
     measurements = db.query(Measurement).filter(
         Measurement.client_id == client_id
     ).order_by(Measurement.date.desc()).offset(skip).limit(limit).all()
     
-    return measurements
+    return [with_photo_size(m, photo_size, photo_format) for m in measurements]
 
-@router.get("/{client_id}/measurements/{measurement_id}", response_model=MeasurementSchema)
+@router.get("/{client_id}/measurements/{measurement_id}", response_model=MeasurementSchema, dependencies=[Depends(get_authorized_client_id)])
 async def get_measurement(
     client_id: int,
     measurement_id: int,
-    db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    photo_size: Optional[str] = Query(None, pattern=PHOTO_SIZE_PATTERN, description="thumb, medium or full"),
+    photo_format: str = Query("jpeg", pattern=PHOTO_FORMAT_PATTERN),
+    db: Session = Depends(get_db)
 ):
-    # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-
     measurement = db.query(Measurement).filter(
         Measurement.id == measurement_id,
         Measurement.client_id == client_id
@@ -136,25 +128,15 @@ async def get_measurement(
     if not measurement:
         raise HTTPException(status_code=404, detail="Measurement not found")
     
-    return measurement
+    return with_photo_size(measurement, photo_size, photo_format)
 
-@router.put("/{client_id}/measurements/{measurement_id}", response_model=MeasurementSchema)
+@router.put("/{client_id}/measurements/{measurement_id}", response_model=MeasurementSchema, dependencies=[Depends(get_authorized_client_id)])
 async def update_measurement(
     client_id: int,
     measurement_id: int,
     measurement: MeasurementUpdate,
-    db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    db: Session = Depends(get_db)
 ):
-    # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-
     db_measurement = db.query(Measurement).filter(
         Measurement.id == measurement_id,
         Measurement.client_id == client_id
@@ -164,30 +146,32 @@ async def update_measurement(
         raise HTTPException(status_code=404, detail="Measurement not found")
     
     # Update measurement
-    for key, value in measurement.model_dump(exclude_unset=True).items():
+    data = measurement.model_dump(exclude_unset=True)
+    if "photos" in data:
+        # Photos can be removed or reordered here; their variants follow and dropped files are released
+        try:
+            photos, variants, dropped = reorder_photos(db_measurement.photos, db_measurement.photo_variants, data.pop("photos") or [])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{e}; upload new photos with a new measurement")
+        for entry in dropped:
+            for url in variant_urls(entry):
+                release(db, url)
+        db_measurement.photos = photos
+        db_measurement.photo_variants = variants
+    for key, value in data.items():
         setattr(db_measurement, key, value)
     
     db.commit()
     db.refresh(db_measurement)
     return db_measurement
 
-@router.get("/{client_id}/measurements/stats", response_model=MeasurementStats)
+@router.get("/{client_id}/measurements/stats", response_model=MeasurementStats, dependencies=[Depends(get_authorized_client_id)])
 async def get_measurement_stats(
     client_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    db: Session = Depends(get_db)
 ):
-    # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-
     # Set default date range if not provided
     if not end_date:
         end_date = datetime.utcnow()
@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, WebSocket, status
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
-from ..models import Message, Trainer, Client
-from ..utils.auth import get_current_trainer
+from ..models import Message
+from ..utils.auth import Principal, get_current_trainer, require_client
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -27,21 +27,12 @@ class MessageResponse(BaseModel):
 @router.post("/", response_model=MessageResponse)
 async def send_message(
     message: MessageCreate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Send a message to a client"""
     # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == message.client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(
-            status_code=404,
-            detail="Client not found or not authorized"
-        )
+    require_client(current_trainer, message.client_id, detail="Client not found or not authorized")
     
     db_message = Message(
         client_id=message.client_id,
@@ -57,21 +48,12 @@ async def send_message(
 @router.get("/client/{client_id}", response_model=List[MessageResponse])
 async def get_chat_history(
     client_id: int,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Get chat history with a specific client"""
     # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(
-            status_code=404,
-            detail="Client not found or not authorized"
-        )
+    require_client(current_trainer, client_id, detail="Client not found or not authorized")
     
     messages = db.query(Message).filter(
         Message.client_id == client_id,
@@ -83,21 +65,12 @@ async def get_chat_history(
 @router.put("/mark-read/{client_id}")
 async def mark_messages_read(
     client_id: int,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Mark all messages from a client as read"""
     # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
-        raise HTTPException(
-            status_code=404,
-            detail="Client not found or not authorized"
-        )
+    require_client(current_trainer, client_id, detail="Client not found or not authorized")
     
     db.query(Message).filter(
         Message.client_id == client_id,
@@ -9,8 +9,9 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from ..database import get_db
-from ..utils.auth import get_current_trainer
+from ..utils.auth import get_authorized_client, get_current_trainer
 from ..models import Client, Measurement, Meal, Workout, Achievement, Quest, Milestone
+from ..workout_loading import WORKOUT_DETAIL_LOAD, WORKOUT_SUMMARY_LOAD
 from ..pdf_generator import (
     generate_workout_pdf,
     generate_meal_plan_pdf,
@@ -30,7 +31,7 @@ async def download_workout_pdf(
     """
     Generate and download workout log PDF
     """
-    workout = db.query(Workout).filter(Workout.id == workout_id).first()
+    workout = db.query(Workout).options(*WORKOUT_DETAIL_LOAD).filter(Workout.id == workout_id).first()
     if not workout:
         raise HTTPException(status_code=404, detail="Workout not found")
     
@@ -61,7 +62,7 @@ async def download_meal_plan_pdf(
     days: int = Query(7, ge=1, le=30),
     start_date: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_trainer = Depends(get_current_trainer)
+    client: Client = Depends(get_authorized_client)
 ):
     """
     Generate and download meal plan PDF
@@ -71,14 +72,6 @@ async def download_meal_plan_pdf(
         days: Number of days (default 7, max 30)
         start_date: Start date in YYYY-MM-DD format (defaults to today)
     """
-    client = db.query(Client).filter(Client.id == client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    # Verify trainer has access
-    if client.trainer_id != current_trainer.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
     # Parse date range
     if start_date:
         try:
@@ -117,7 +110,7 @@ async def download_progress_report_pdf(
     client_id: int,
     days: int = Query(30, ge=7, le=365),
     db: Session = Depends(get_db),
-    current_trainer = Depends(get_current_trainer)
+    client: Client = Depends(get_authorized_client)
 ):
     """
     Generate and download comprehensive progress report PDF
@@ -126,14 +119,6 @@ async def download_progress_report_pdf(
         client_id: Client ID
         days: Number of days to include (default 30, max 365)
     """
-    client = db.query(Client).filter(Client.id == client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    # Verify trainer has access
-    if client.trainer_id != current_trainer.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
     # Calculate date range
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
@@ -176,7 +161,7 @@ async def download_health_stats_pdf(
     client_id: int,
     days: int = Query(30, ge=7, le=365),
     db: Session = Depends(get_db),
-    current_trainer = Depends(get_current_trainer)
+    client: Client = Depends(get_authorized_client)
 ):
     """
     Generate and download health statistics PDF
@@ -185,14 +170,6 @@ async def download_health_stats_pdf(
         client_id: Client ID
         days: Number of days to include (default 30, max 365)
     """
-    client = db.query(Client).filter(Client.id == client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    # Verify trainer has access
-    if client.trainer_id != current_trainer.id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
     # Calculate date range
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
@@ -208,7 +185,7 @@ async def download_health_stats_pdf(
         Meal.date >= start_date.date()
     ).all()
     
-    workouts = db.query(Workout).filter(
+    workouts = db.query(Workout).options(*WORKOUT_SUMMARY_LOAD).filter(
         Workout.client_id == client_id,
         Workout.created_at >= start_date
     ).all()
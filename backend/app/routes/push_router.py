@@ -3,8 +3,8 @@ from sqlalchemy.orm import Session
 from typing import Optional, List
 from pydantic import BaseModel
 from ..database import get_db
-from ..models import PushToken, Trainer, Client
-from ..utils.auth import get_current_trainer
+from ..models import PushToken, Client
+from ..utils.auth import Principal, get_current_trainer
 from pywebpush import webpush, WebPushException
 import json
 import os
@@ -31,7 +31,7 @@ class PushNotification(BaseModel):
 @router.post("/token")
 async def register_push_token(
     token: PushTokenCreate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Register a push notification token"""
@@ -61,7 +61,7 @@ async def register_push_token(
 @router.post("/send")
 async def send_push_notification(
     notification: PushNotification,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Send push notifications to specific clients or all clients"""
@@ -81,7 +81,7 @@ async def send_push_notification(
     else:
         # Send to all trainer's clients
         tokens = db.query(PushToken).filter(
-            PushToken.client_id.in_([c.id for c in current_trainer.clients])
+            PushToken.client_id.in_(current_trainer.client_ids)
         ).all()
     
     failed_tokens = []
@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from ..database import get_db
-from ..utils.auth import get_current_trainer
+from ..utils.auth import Principal, get_current_trainer, require_client
+from ..shealth_ingest import parse_batch_body, run_normaliser, store_batch
+from ..wearable_series import RESOLUTIONS, SERIES_METRICS, WEARABLE_MAX_POINTS, get_series
 from .. import models
 
 router = APIRouter()
 
 @router.post('/shealth/webhook')
-async def shealth_webhook(request: Request, db: Session = Depends(get_db)):
+async def shealth_webhook(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Receive Samsung Health data from an external app or integration.
-    This is a lightweight webhook that stores the incoming JSON payload for later processing.
+    This is a lightweight webhook that stores the incoming JSON payload; the background
+    normaliser parses it into the typed sample tables. Phones syncing many samples should
+    use /shealth/batch instead.
     For a production integration follow S-HealthStack instructions and validate signatures.
     """
     payload = await request.json()
@@ -26,15 +32,32 @@ async def shealth_webhook(request: Request, db: Session = Depends(get_db)):
     db.add(shealth)
     db.commit()
     db.refresh(shealth)
+    background_tasks.add_task(run_normaliser)
 
     return {"status": "ok", "received_id": shealth.id}
 
+@router.post('/shealth/batch', status_code=202)
+async def shealth_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    client_id: Optional[int] = None,
+    trainer_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Receive many S-Health samples at once as a JSON array, {"samples": [...]} or NDJSON.
+    Samples are stored in one transaction and normalised in the background; `client_id`
+    and `trainer_id` apply to samples that do not carry their own.
+    """
+    samples = parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    rows = store_batch(db, samples, client_id=client_id, trainer_id=trainer_id)
+    if rows:
+        background_tasks.add_task(run_normaliser)
+    return {"status": "accepted", "samples": len(samples), "batches": rows}
+
 @router.post('/shealth/import_for_client/{client_id}')
-async def shealth_import_for_client(client_id: int, request: Request, db: Session = Depends(get_db), current_trainer: models.Trainer = Depends(get_current_trainer)):
+async def shealth_import_for_client(client_id: int, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_trainer: Principal = Depends(get_current_trainer)):
     # Trainer can import S-Health data for a client (payload should follow agreed schema)
-    client = db.query(models.Client).filter(models.Client.id == client_id, models.Client.trainer_id == current_trainer.id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail='Client not found')
+    require_client(current_trainer, client_id)
 
     payload = await request.json()
     shealth = models.SHealthData(
@@ -45,4 +68,27 @@ async def shealth_import_for_client(client_id: int, request: Request, db: Sessio
     db.add(shealth)
     db.commit()
     db.refresh(shealth)
+    background_tasks.add_task(run_normaliser)
     return {"status": "ok", "id": shealth.id}
+
+@router.get('/shealth/clients/{client_id}/series/{metric}')
+def shealth_series(
+    client_id: int,
+    metric: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = Query("auto", pattern="^(auto|" + "|".join(RESOLUTIONS) + ")$"),
+    max_points: int = Query(WEARABLE_MAX_POINTS, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    """Downsampled wearable series (steps, heart_rate, sleep, weight) for a window; defaults to the last 7 days"""
+    if metric not in SERIES_METRICS:
+        raise HTTPException(status_code=404, detail='Unknown metric')
+    require_client(current_trainer, client_id)
+
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail='start must be before end')
+    return get_series(db, client_id, metric, start, end, resolution=resolution, max_points=max_points)
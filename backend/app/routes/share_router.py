@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import Dict, Any
 from ..database import get_db
-from ..models import Client, ShareToken, Measurement, Meal, Quest, Milestone, Achievement
-from ..utils.auth import get_current_trainer
+from ..models import Client, ShareToken
+from ..utils.auth import get_current_trainer, require_client
+from ..public_profile import build_public_profile, get_profile_cache, is_not_modified
+from .. import profile_snapshots
+from .measurements_router import PHOTO_FORMAT_PATTERN, PHOTO_SIZE_PATTERN
 from pydantic import BaseModel, EmailStr
 import os
 import smtplib
@@ -28,12 +30,9 @@ async def share_profile(
     """Generate a shareable profile link and email it to the client"""
     
     # Verify client belongs to trainer
-    client = db.query(Client).filter(
-        Client.id == client_id,
-        Client.trainer_id == current_trainer.id
-    ).first()
-    
-    if not client:
+    require_client(current_trainer, client_id)
+    client = db.get(Client, client_id)
+    if client is None:
         raise HTTPException(status_code=404, detail="Client not found")
     
     # Generate token
@@ -54,6 +53,7 @@ async def share_profile(
     # Build shareable URL
     worker_url = os.getenv("WORKER_URL", "http://localhost:5173")
     share_url = f"{worker_url}/profile/{token}"
+    static_url = profile_snapshots.export_snapshot(db, token) if profile_snapshots.PROFILE_SNAPSHOTS else None
     
     # Send email
     try:
@@ -72,135 +72,46 @@ async def share_profile(
         "share_url": share_url,
         "token": token,
         "expires_at": expires_at.isoformat(),
-        "email_sent": True
+        "email_sent": True,
+        "snapshot_url": static_url
     }
 
 
 @router.get("/public/profile/{token}")
-async def get_public_profile(token: str, db: Session = Depends(get_db)) -> Dict[str, Any]:
-    """Fetch client profile data using a share token (no auth required)"""
-    
-    # Validate token
-    share_token = db.query(ShareToken).filter(
-        ShareToken.token == token,
-        ShareToken.is_active == True,
-        ShareToken.expires_at > datetime.utcnow()
-    ).first()
-    
-    if not share_token:
-        raise HTTPException(status_code=404, detail="Invalid or expired share link")
-    
-    # Get client data
-    client = db.query(Client).filter(Client.id == share_token.client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    # Get measurements (last 12)
-    measurements = db.query(Measurement).filter(
-        Measurement.client_id == client.id
-    ).order_by(Measurement.date.desc()).limit(12).all()
-    
-    # Get recent meals (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_meals = db.query(Meal).filter(
-        Meal.client_id == client.id,
-        Meal.date >= thirty_days_ago
-    ).order_by(Meal.date.desc()).all()
-    
-    # Get active quests
-    active_quests = db.query(Quest).filter(
-        Quest.client_id == client.id,
-        Quest.is_active == True,
-        Quest.completed_at == None
-    ).order_by(Quest.created_at.desc()).all()
-    
-    # Get recent milestones (last 20)
-    milestones = db.query(Milestone).filter(
-        Milestone.client_id == client.id
-    ).order_by(Milestone.achieved_at.desc()).limit(20).all()
-    
-    # Get achievements (all)
-    achievements = db.query(Achievement).filter(
-        Achievement.client_id == client.id
-    ).order_by(Achievement.awarded_at.desc()).all()
-    
-    # Build response
-    return {
-        "client": {
-            "name": client.name,
-            "email": client.email,
-        },
-        "measurements": [
-            {
-                "id": m.id,
-                "date": m.date.isoformat() if m.date else None,
-                "weight": m.weight,
-                "chest": m.chest,
-                "waist": m.waist,
-                "hips": m.hips,
-                "biceps_left": m.biceps_left,
-                "biceps_right": m.biceps_right,
-                "body_fat": m.body_fat,
-                "photos": m.photos,
-                "notes": m.notes,
-            }
-            for m in measurements
-        ],
-        "recent_meals": [
-            {
-                "id": meal.id,
-                "date": meal.date.isoformat() if meal.date else None,
-                "name": meal.name,
-                "total_nutrients": meal.total_nutrients,
-                "notes": meal.notes,
-            }
-            for meal in recent_meals
-        ],
-        "quests": [
-            {
-                "id": q.id,
-                "title": q.title,
-                "description": q.description,
-                "quest_type": q.quest_type,
-                "target_value": q.target_value,
-                "current_value": q.current_value,
-                "target_unit": q.target_unit,
-                "progress_percentage": round(min(100, (q.current_value / q.target_value) * 100), 1) if q.target_value and q.current_value else 0,
-                "reward_achievement": q.reward_achievement,
-                "difficulty": q.difficulty,
-                "xp_reward": q.xp_reward,
-                "deadline": q.deadline.isoformat() if q.deadline else None,
-                "created_at": q.created_at.isoformat() if q.created_at else None,
-            }
-            for q in active_quests
-        ],
-        "milestones": [
-            {
-                "id": m.id,
-                "title": m.title,
-                "description": m.description,
-                "milestone_type": m.milestone_type,
-                "value": m.value,
-                "unit": m.unit,
-                "icon": m.icon,
-                "celebration_message": m.celebration_message,
-                "achieved_at": m.achieved_at.isoformat() if m.achieved_at else None,
-            }
-            for m in milestones
-        ],
-        "achievements": [
-            {
-                "id": a.id,
-                "name": a.name,
-                "description": a.description,
-                "icon": a.icon,
-                "category": a.category,
-                "awarded_at": a.awarded_at.isoformat() if a.awarded_at else None,
-            }
-            for a in achievements
-        ],
-        "share_expires_at": share_token.expires_at.isoformat(),
+def get_public_profile(
+    token: str,
+    request: Request,
+    photo_size: str = Query("medium", pattern=PHOTO_SIZE_PATTERN),
+    photo_format: str = Query("jpeg", pattern=PHOTO_FORMAT_PATTERN),
+    db: Session = Depends(get_db)
+):
+    """
+    Fetch client profile data using a share token (no auth required)
+    
+    Progress photos are returned at `photo_size` (medium by default);
+    `photo_variants` lists every size for responsive images. Responses are
+    cached per token until the client's data changes, and carry an ETag and
+    Last-Modified so revalidation returns 304.
+    """
+    cache = get_profile_cache()
+    key = (token, photo_size, photo_format)
+    entry = cache.get(key)
+    if entry is None:
+        version = cache.version()
+        built = build_public_profile(db, token, photo_size, photo_format)
+        if built is None:
+            raise HTTPException(status_code=404, detail="Invalid or expired share link")
+        entry = cache.render(*built)
+        cache.put(key, entry, version)
+
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": "private, no-cache",
     }
+    if is_not_modified(entry, request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 
 def send_profile_email(
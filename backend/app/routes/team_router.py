@@ -4,7 +4,7 @@ from typing import List, Optional
 from pydantic import BaseModel
 from ..database import get_db
 from ..models import Team, Trainer, Client
-from ..utils.auth import get_current_trainer
+from ..utils.auth import get_current_trainer_entity
 
 router = APIRouter()
 
@@ -29,7 +29,7 @@ class TeamResponse(BaseModel):
 @router.post("/", response_model=TeamResponse)
 async def create_team(
     team: TeamCreate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Create a new trainer team"""
@@ -51,7 +51,7 @@ async def create_team(
 
 @router.get("/", response_model=List[TeamResponse])
 async def list_teams(
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """List all teams the trainer is part of"""
@@ -69,7 +69,7 @@ async def list_teams(
 async def update_team(
     team_id: int,
     team_update: TeamUpdate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Update team details"""
@@ -96,7 +96,7 @@ async def update_team(
 async def add_trainer_to_team(
     team_id: int,
     trainer_id: int,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Add a trainer to the team"""
@@ -126,7 +126,7 @@ async def add_trainer_to_team(
 async def remove_trainer_from_team(
     team_id: int,
     trainer_id: int,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Remove a trainer from the team"""
@@ -1,21 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
 from ..models import Trainer, BrandingConfig, Message, VideoCall
 from ..schemas.trainer import TrainerCreate, TrainerUpdate, TrainerResponse
-from ..utils.auth import get_password_hash, create_access_token, get_current_trainer
+from ..utils.auth import create_access_token, get_current_trainer_entity
+from ..utils.passwords import hash_password_async, verify_and_update_async
 
 router = APIRouter()
 
 @router.post("/", response_model=TrainerResponse)
-def create_trainer(trainer: TrainerCreate, db: Session = Depends(get_db)):
+async def create_trainer(trainer: TrainerCreate, db: Session = Depends(get_db)):
     """Create a new trainer account (100% free, no limits)"""
     db_trainer = db.query(Trainer).filter(Trainer.email == trainer.email).first()
     if db_trainer:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(trainer.password)
+    hashed_password = await hash_password_async(trainer.password)
     db_trainer = Trainer(
         name=trainer.name,
         email=trainer.email,
@@ -37,21 +39,41 @@ def create_trainer(trainer: TrainerCreate, db: Session = Depends(get_db)):
     
     return db_trainer
 
+@router.post("/token")
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    """Exchange email (as username) and password for an access token"""
+    trainer = db.query(Trainer).filter(Trainer.email == form_data.username).first()
+    verified, new_hash = await verify_and_update_async(form_data.password, trainer.password_hash if trainer else None)
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Stored hash predates the current scheme/cost settings: upgrade it now
+    # that we have the plain password
+    if new_hash:
+        trainer.password_hash = new_hash
+        db.commit()
+
+    return {"access_token": create_access_token({"sub": str(trainer.id)}), "token_type": "bearer"}
+
 @router.get("/me", response_model=TrainerResponse)
-def read_current_trainer(current_trainer: Trainer = Depends(get_current_trainer)):
+def read_current_trainer(current_trainer: Trainer = Depends(get_current_trainer_entity)):
     """Get current trainer profile"""
     return current_trainer
 
 @router.put("/me", response_model=TrainerResponse)
-def update_trainer(
+async def update_trainer(
     trainer_update: TrainerUpdate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Update current trainer profile"""
     for key, value in trainer_update.dict(exclude_unset=True).items():
         if key == "password":
-            value = get_password_hash(value)
+            value = await hash_password_async(value)
             key = "password_hash"
         setattr(current_trainer, key, value)
     
@@ -61,7 +83,7 @@ def update_trainer(
 
 @router.get("/dashboard")
 def get_dashboard_stats(
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Trainer = Depends(get_current_trainer_entity),
     db: Session = Depends(get_db)
 ):
     """Get trainer dashboard statistics"""
@@ -6,6 +6,8 @@ from fastapi import APIRouter, HTTPException, Query
 import os
 import httpx
 from typing import Optional
+from ..utils.cache import async_cached
+from ..utils.singleflight import SingleFlight, request_key
 
 router = APIRouter(prefix="/usda", tags=["USDA Food Data"])
 
@@ -15,6 +17,46 @@ router = APIRouter(prefix="/usda", tags=["USDA Food Data"])
 USDA_API_KEY = os.getenv("USDA_API_KEY", "DEMO_KEY")  # Get free key at https://fdc.nal.usda.gov/api-key-signup.html
 USDA_BASE_URL = "https://api.nal.usda.gov/fdc/v1"
 
+# Nutrition data rarely changes; cache upstream responses (seconds)
+USDA_SEARCH_CACHE_TTL = float(os.getenv("USDA_SEARCH_CACHE_TTL", "3600"))
+USDA_FOOD_CACHE_TTL = float(os.getenv("USDA_FOOD_CACHE_TTL", "86400"))
+
+
+# Identical concurrent upstream requests share one HTTP call
+_upstream_flights = SingleFlight("usda")
+
+
+async def _usda_get(path: str, params: dict) -> dict:
+    """GET against FoodData Central, coalescing identical in-flight requests"""
+    url = f"{USDA_BASE_URL}{path}"
+
+    async def fetch():
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            resp = await client.get(url, params=params)
+            resp.raise_for_status()
+            return resp.json()
+
+    return await _upstream_flights.do(request_key("GET", url, params), fetch)
+
+
+@async_cached(ttl=USDA_SEARCH_CACHE_TTL, maxsize=512, name="usda.search")
+async def _fetch_search(q: str, page_size: int, page_number: int) -> dict:
+    """Raw USDA foods/search response (cached per query and page)"""
+    params = {
+        "query": q,
+        "dataType": ["Survey (FNDDS)", "Foundation", "Branded"],  # Most relevant datasets
+        "pageSize": page_size,
+        "pageNumber": page_number,
+        "api_key": USDA_API_KEY
+    }
+    return await _usda_get("/foods/search", params)
+
+
+@async_cached(ttl=USDA_FOOD_CACHE_TTL, maxsize=2048, name="usda.food")
+async def _fetch_food(fdc_id: int) -> dict:
+    """Raw USDA food detail response (cached per FDC ID)"""
+    return await _usda_get(f"/food/{fdc_id}", {"api_key": USDA_API_KEY})
+
 
 @router.get("/search")
 async def search_foods(
@@ -27,106 +69,90 @@ async def search_foods(
     Returns foods with calories, protein, carbs, fat, fiber, etc.
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            params = {
-                "query": q,
-                "dataType": ["Survey (FNDDS)", "Foundation", "Branded"],  # Most relevant datasets
-                "pageSize": page_size,
-                "pageNumber": page_number,
-                "api_key": USDA_API_KEY
-            }
-            resp = await client.get(f"{USDA_BASE_URL}/foods/search", params=params)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            # Parse and simplify response
-            foods = []
-            for food in data.get("foods", []):
-                nutrients = {}
-                for nutrient in food.get("foodNutrients", []):
-                    name = nutrient.get("nutrientName", "").lower()
-                    value = nutrient.get("value", 0)
-                    
-                    if "energy" in name or "calori" in name:
-                        nutrients["calories"] = value
-                    elif "protein" in name:
-                        nutrients["protein"] = value
-                    elif "carbohydrate" in name:
-                        nutrients["carbs"] = value
-                    elif "total lipid" in name or ("fat" in name and "fatty" not in name):
-                        nutrients["fat"] = value
-                    elif "fiber" in name:
-                        nutrients["fiber"] = value
-                    elif "sodium" in name:
-                        nutrients["sodium"] = value
-                
-                foods.append({
-                    "fdcId": food.get("fdcId"),
-                    "description": food.get("description"),
-                    "brandOwner": food.get("brandOwner"),
-                    "servingSize": food.get("servingSize"),
-                    "servingSizeUnit": food.get("servingSizeUnit", "g"),
-                    "calories": nutrients.get("calories", 0),
-                    "protein": nutrients.get("protein", 0),
-                    "carbs": nutrients.get("carbs", 0),
-                    "fat": nutrients.get("fat", 0),
-                    "fiber": nutrients.get("fiber", 0),
-                    "sodium": nutrients.get("sodium", 0),
-                })
-            
-            return {
-                "query": q,
-                "totalHits": data.get("totalHits", 0),
-                "currentPage": page_number,
-                "totalPages": data.get("totalPages", 0),
-                "foods": foods
-            }
-    except httpx.HTTPError as e:
-        raise HTTPException(status_code=502, detail=f"USDA API error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
-
-
-@router.get("/food/{fdc_id}")
-async def get_food_details(fdc_id: int):
-    """Get detailed nutritional information for a specific food item by FDC ID"""
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(
-                f"{USDA_BASE_URL}/food/{fdc_id}",
-                params={"api_key": USDA_API_KEY}
-            )
-            resp.raise_for_status()
-            food = resp.json()
-            
-            # Parse nutrients
+        data = await _fetch_search(q, page_size, page_number)
+        
+        # Parse and simplify response
+        foods = []
+        for food in data.get("foods", []):
             nutrients = {}
             for nutrient in food.get("foodNutrients", []):
-                name = nutrient.get("nutrient", {}).get("name", "").lower()
-                value = nutrient.get("amount", 0)
+                name = nutrient.get("nutrientName", "").lower()
+                value = nutrient.get("value", 0)
                 
-                if "energy" in name:
+                if "energy" in name or "calori" in name:
                     nutrients["calories"] = value
                 elif "protein" in name:
                     nutrients["protein"] = value
                 elif "carbohydrate" in name:
                     nutrients["carbs"] = value
-                elif "total lipid" in name:
+                elif "total lipid" in name or ("fat" in name and "fatty" not in name):
                     nutrients["fat"] = value
                 elif "fiber" in name:
                     nutrients["fiber"] = value
                 elif "sodium" in name:
                     nutrients["sodium"] = value
             
-            return {
+            foods.append({
                 "fdcId": food.get("fdcId"),
                 "description": food.get("description"),
                 "brandOwner": food.get("brandOwner"),
-                "ingredients": food.get("ingredients"),
                 "servingSize": food.get("servingSize"),
-                "servingSizeUnit": food.get("servingSizeUnit"),
-                **nutrients
-            }
+                "servingSizeUnit": food.get("servingSizeUnit", "g"),
+                "calories": nutrients.get("calories", 0),
+                "protein": nutrients.get("protein", 0),
+                "carbs": nutrients.get("carbs", 0),
+                "fat": nutrients.get("fat", 0),
+                "fiber": nutrients.get("fiber", 0),
+                "sodium": nutrients.get("sodium", 0),
+            })
+        
+        return {
+            "query": q,
+            "totalHits": data.get("totalHits", 0),
+            "currentPage": page_number,
+            "totalPages": data.get("totalPages", 0),
+            "foods": foods
+        }
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"USDA API error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+
+@router.get("/food/{fdc_id}")
+async def get_food_details(fdc_id: int):
+    """Get detailed nutritional information for a specific food item by FDC ID"""
+    try:
+        food = await _fetch_food(fdc_id)
+        
+        # Parse nutrients
+        nutrients = {}
+        for nutrient in food.get("foodNutrients", []):
+            name = nutrient.get("nutrient", {}).get("name", "").lower()
+            value = nutrient.get("amount", 0)
+            
+            if "energy" in name:
+                nutrients["calories"] = value
+            elif "protein" in name:
+                nutrients["protein"] = value
+            elif "carbohydrate" in name:
+                nutrients["carbs"] = value
+            elif "total lipid" in name:
+                nutrients["fat"] = value
+            elif "fiber" in name:
+                nutrients["fiber"] = value
+            elif "sodium" in name:
+                nutrients["sodium"] = value
+        
+        return {
+            "fdcId": food.get("fdcId"),
+            "description": food.get("description"),
+            "brandOwner": food.get("brandOwner"),
+            "ingredients": food.get("ingredients"),
+            "servingSize": food.get("servingSize"),
+            "servingSizeUnit": food.get("servingSizeUnit"),
+            **nutrients
+        }
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"USDA API error: {str(e)}")
     except Exception as e:
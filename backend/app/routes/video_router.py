@@ -3,8 +3,8 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 from ..database import get_db
-from ..models import VideoCall, Trainer, Client
-from ..utils.auth import get_current_trainer
+from ..models import VideoCall, Client
+from ..utils.auth import Principal, get_current_trainer
 from pydantic import BaseModel
 import json
 import os
@@ -35,7 +35,7 @@ class VideoCallResponse(BaseModel):
 @router.post("/schedule", response_model=VideoCallResponse)
 async def schedule_call(
     call: VideoCallCreate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Schedule a new video call with a client"""
@@ -66,7 +66,7 @@ async def schedule_call(
 
 @router.get("/upcoming", response_model=List[VideoCallResponse])
 async def get_upcoming_calls(
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Get all upcoming video calls"""
@@ -82,7 +82,7 @@ async def get_upcoming_calls(
 async def update_call_status(
     call_id: int,
     update: VideoCallUpdate,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Update video call status"""
@@ -108,7 +108,7 @@ async def update_call_status(
 @router.get("/{call_id}/ice-servers")
 async def get_ice_servers(
     call_id: int,
-    current_trainer: Trainer = Depends(get_current_trainer),
+    current_trainer: Principal = Depends(get_current_trainer),
     db: Session = Depends(get_db)
 ):
     """Get ICE servers configuration for WebRTC"""
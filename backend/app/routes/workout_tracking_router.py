@@ -2,19 +2,23 @@
 Workout Tracking API Routes
 Based on Pure Training architecture: Exercise → Workout (Session) → Setgroup → WorkoutSet
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime, timedelta
+import os
 
 from ..database import get_db
-from ..models import Exercise, Workout, Setgroup, WorkoutSet, Client, Trainer
+from ..models import Exercise, Workout, Setgroup, WorkoutSet, Client
 from ..schemas.workout_tracking import (
     Exercise as ExerciseSchema,
     ExerciseCreate,
     ExerciseUpdate,
     Workout as WorkoutSchema,
     WorkoutCreate,
+    WorkoutBulkCreate,
+    WorkoutBulkResult,
     WorkoutUpdate,
     WorkoutSummary,
     Setgroup as SetgroupSchema,
@@ -24,12 +28,96 @@ from ..schemas.workout_tracking import (
     WorkoutSetCreate,
     WorkoutSetUpdate,
     ExerciseProgress,
+    ExerciseProgressSeries,
+    PersonalRecord as PersonalRecordSchema,
     WorkoutStats
 )
-from ..utils.auth import get_current_trainer
+from ..exercise_series import BUCKETS, PROGRESS_SERIES_MAX_POINTS, SERIES_METRICS, cached_series
+from ..personal_records import (
+    client_records,
+    estimate_1rm,
+    get_record,
+    get_rep_maxes,
+    most_improved,
+    serialize_record,
+)
+from ..utils.auth import Principal, get_authorized_client_id, get_current_trainer, require_client
+from ..workout_loading import SETGROUP_HISTORY_LOAD, WORKOUT_DETAIL_LOAD, WORKOUT_SUMMARY_LOAD
+from ..workout_transfer import import_lines, stream_export
 
 router = APIRouter(prefix="/workouts", tags=["Workout Tracking"])
 
+# Workouts accepted by one bulk import request
+WORKOUT_BULK_MAX = int(os.getenv("WORKOUT_BULK_MAX", "1000"))
+
+
+# ==================== WRITE HELPERS ====================
+
+def _load_exercises(db: Session, exercise_ids: Iterable[int]) -> Dict[int, Exercise]:
+    """Fetch every referenced exercise in one IN query; 404 naming any that do not exist"""
+    wanted = set(exercise_ids)
+    if not wanted:
+        return {}
+    exercises = {e.id: e for e in db.query(Exercise).filter(Exercise.id.in_(wanted))}
+    missing = sorted(wanted - exercises.keys())
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Exercise {missing[0]} not found" if len(missing) == 1 else f"Exercises {missing} not found"
+        )
+    return exercises
+
+
+def _build_setgroup(setgroup_data: SetgroupCreate, exercises: Dict[int, Exercise]) -> Setgroup:
+    """Setgroup with its sets attached through relationships, so ids are assigned at flush"""
+    return Setgroup(
+        exercise=exercises[setgroup_data.exercise_id],
+        order_index=setgroup_data.order_index,
+        notes=setgroup_data.notes,
+        rest_seconds=setgroup_data.rest_seconds,
+        sets=[
+            WorkoutSet(
+                set_number=set_data.set_number,
+                reps=set_data.reps,
+                weight=set_data.weight,
+                duration_seconds=set_data.duration_seconds,
+                distance_meters=set_data.distance_meters,
+                rpe=set_data.rpe,
+                completed=set_data.completed,
+                notes=set_data.notes
+            )
+            for set_data in setgroup_data.sets
+        ]
+    )
+
+
+def _build_workout(workout: WorkoutCreate, trainer_id: int, exercises: Dict[int, Exercise]) -> Workout:
+    """The whole Workout -> Setgroup -> WorkoutSet graph, unsaved"""
+    db_workout = Workout(
+        client_id=workout.client_id,
+        trainer_id=trainer_id,
+        title=workout.title,
+        description=workout.description,
+        scheduled_at=workout.scheduled_at,
+        duration_minutes=workout.duration_minutes,
+        notes=workout.notes,
+        setgroups=[_build_setgroup(sg, exercises) for sg in workout.setgroups]
+    )
+    # Imported history keeps its original dates
+    for field in ("completed_at", "timestamp"):
+        value = getattr(workout, field, None)
+        if value is not None:
+            setattr(db_workout, field, value)
+    return db_workout
+
+
+def _get_workout_detail(db: Session, workout_id: int) -> Workout:
+    """Workout with setgroups, sets and exercises loaded for a full response; 404 if missing"""
+    workout = db.query(Workout).options(*WORKOUT_DETAIL_LOAD).filter(Workout.id == workout_id).first()
+    if not workout:
+        raise HTTPException(status_code=404, detail="Workout not found")
+    return workout
+
 
 # ==================== EXERCISE ROUTES ====================
 
@@ -60,7 +148,7 @@ def get_exercises(
 def create_exercise(
     exercise: ExerciseCreate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Create a new exercise"""
     # Check if exercise already exists
@@ -92,7 +180,7 @@ def update_exercise(
     exercise_id: int,
     exercise_update: ExerciseUpdate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Update an exercise"""
     exercise = db.query(Exercise).filter(Exercise.id == exercise_id).first()
@@ -112,7 +200,7 @@ def update_exercise(
 def delete_exercise(
     exercise_id: int,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Delete an exercise (only if not used in any workouts)"""
     exercise = db.query(Exercise).filter(Exercise.id == exercise_id).first()
@@ -144,7 +232,7 @@ def get_workouts(
     db: Session = Depends(get_db)
 ):
     """Get all workouts with optional filters"""
-    query = db.query(Workout)
+    query = db.query(Workout).options(*WORKOUT_SUMMARY_LOAD)
     
     if client_id:
         query = query.filter(Workout.client_id == client_id)
@@ -172,6 +260,8 @@ def get_workouts(
             completed_at=workout.completed_at,
             duration_minutes=workout.duration_minutes,
             total_volume=workout.total_volume,
+            set_count=workout.set_count,
+            total_reps=workout.total_reps,
             exercise_count=len(workout.setgroups),
             timestamp=workout.timestamp,
             created_at=workout.created_at
@@ -184,71 +274,56 @@ def get_workouts(
 def create_workout(
     workout: WorkoutCreate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
-    """Create a new workout with setgroups and sets"""
-    # Verify client exists
-    client = db.query(Client).filter(Client.id == workout.client_id).first()
-    if not client:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    # Create workout
-    db_workout = Workout(
-        client_id=workout.client_id,
-        trainer_id=current_trainer.id,
-        title=workout.title,
-        description=workout.description,
-        scheduled_at=workout.scheduled_at,
-        duration_minutes=workout.duration_minutes,
-        notes=workout.notes
-    )
+    """Create a new workout with setgroups and sets (one exercise query, one flush)"""
+    require_client(current_trainer, workout.client_id)
+    exercises = _load_exercises(db, (sg.exercise_id for sg in workout.setgroups))
+
+    db_workout = _build_workout(workout, current_trainer.id, exercises)
     db.add(db_workout)
-    db.flush()  # Get workout ID
-    
-    # Create setgroups and sets
-    for setgroup_data in workout.setgroups:
-        # Verify exercise exists
-        exercise = db.query(Exercise).filter(Exercise.id == setgroup_data.exercise_id).first()
-        if not exercise:
-            raise HTTPException(status_code=404, detail=f"Exercise {setgroup_data.exercise_id} not found")
-        
-        db_setgroup = Setgroup(
-            workout_id=db_workout.id,
-            exercise_id=setgroup_data.exercise_id,
-            order_index=setgroup_data.order_index,
-            notes=setgroup_data.notes,
-            rest_seconds=setgroup_data.rest_seconds
-        )
-        db.add(db_setgroup)
-        db.flush()  # Get setgroup ID
-        
-        # Create sets
-        for set_data in setgroup_data.sets:
-            db_set = WorkoutSet(
-                setgroup_id=db_setgroup.id,
-                set_number=set_data.set_number,
-                reps=set_data.reps,
-                weight=set_data.weight,
-                duration_seconds=set_data.duration_seconds,
-                distance_meters=set_data.distance_meters,
-                rpe=set_data.rpe,
-                completed=set_data.completed,
-                notes=set_data.notes
-            )
-            db.add(db_set)
-    
     db.commit()
-    db.refresh(db_workout)
-    return db_workout
+    return _get_workout_detail(db, db_workout.id)
+
+
+@router.post("/bulk", response_model=WorkoutBulkResult, status_code=status.HTTP_201_CREATED)
+def bulk_create_workouts(
+    payload: WorkoutBulkCreate,
+    db: Session = Depends(get_db),
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    """
+    Import many workouts in one transaction (e.g. history migrated from another app)
+
+    Every client must belong to the trainer and every exercise must exist,
+    otherwise nothing is written.
+    """
+    if len(payload.workouts) > WORKOUT_BULK_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {WORKOUT_BULK_MAX} workouts per request")
+    for workout in payload.workouts:
+        require_client(current_trainer, workout.client_id)
+    exercises = _load_exercises(
+        db, (sg.exercise_id for workout in payload.workouts for sg in workout.setgroups)
+    )
+
+    db_workouts = [_build_workout(workout, current_trainer.id, exercises) for workout in payload.workouts]
+    db.add_all(db_workouts)
+    db.flush()
+    workout_ids = [w.id for w in db_workouts]
+    result = WorkoutBulkResult(
+        created=len(db_workouts),
+        setgroups=sum(len(w.setgroups) for w in db_workouts),
+        sets=sum(len(sg.sets) for w in db_workouts for sg in w.setgroups),
+        workout_ids=workout_ids
+    )
+    db.commit()
+    return result
 
 
 @router.get("/{workout_id}", response_model=WorkoutSchema)
 def get_workout(workout_id: int, db: Session = Depends(get_db)):
     """Get a specific workout with all details"""
-    workout = db.query(Workout).filter(Workout.id == workout_id).first()
-    if not workout:
-        raise HTTPException(status_code=404, detail="Workout not found")
-    return workout
+    return _get_workout_detail(db, workout_id)
 
 
 @router.put("/{workout_id}", response_model=WorkoutSchema)
@@ -256,7 +331,7 @@ def update_workout(
     workout_id: int,
     workout_update: WorkoutUpdate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Update a workout"""
     workout = db.query(Workout).filter(Workout.id == workout_id).first()
@@ -268,15 +343,14 @@ def update_workout(
         setattr(workout, field, value)
     
     db.commit()
-    db.refresh(workout)
-    return workout
+    return _get_workout_detail(db, workout_id)
 
 
 @router.delete("/{workout_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_workout(
     workout_id: int,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Delete a workout (cascades to setgroups and sets)"""
     workout = db.query(Workout).filter(Workout.id == workout_id).first()
@@ -293,7 +367,7 @@ def complete_workout(
     workout_id: int,
     duration_minutes: Optional[int] = None,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Mark a workout as completed"""
     workout = db.query(Workout).filter(Workout.id == workout_id).first()
@@ -305,8 +379,7 @@ def complete_workout(
         workout.duration_minutes = duration_minutes
     
     db.commit()
-    db.refresh(workout)
-    return workout
+    return _get_workout_detail(db, workout_id)
 
 
 # ==================== SETGROUP ROUTES ====================
@@ -316,17 +389,14 @@ def add_setgroup_to_workout(
     workout_id: int,
     setgroup: SetgroupCreate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Add a new exercise (setgroup) to an existing workout"""
     workout = db.query(Workout).filter(Workout.id == workout_id).first()
     if not workout:
         raise HTTPException(status_code=404, detail="Workout not found")
     
-    # Verify exercise exists
-    exercise = db.query(Exercise).filter(Exercise.id == setgroup.exercise_id).first()
-    if not exercise:
-        raise HTTPException(status_code=404, detail="Exercise not found")
+    exercises = _load_exercises(db, [setgroup.exercise_id])
     
     # Check if exercise already in this workout
     existing = db.query(Setgroup).filter(
@@ -339,31 +409,9 @@ def add_setgroup_to_workout(
             detail="Exercise already exists in this workout"
         )
     
-    db_setgroup = Setgroup(
-        workout_id=workout_id,
-        exercise_id=setgroup.exercise_id,
-        order_index=setgroup.order_index,
-        notes=setgroup.notes,
-        rest_seconds=setgroup.rest_seconds
-    )
+    db_setgroup = _build_setgroup(setgroup, exercises)
+    db_setgroup.workout_id = workout_id
     db.add(db_setgroup)
-    db.flush()
-    
-    # Add sets if provided
-    for set_data in setgroup.sets:
-        db_set = WorkoutSet(
-            setgroup_id=db_setgroup.id,
-            set_number=set_data.set_number,
-            reps=set_data.reps,
-            weight=set_data.weight,
-            duration_seconds=set_data.duration_seconds,
-            distance_meters=set_data.distance_meters,
-            rpe=set_data.rpe,
-            completed=set_data.completed,
-            notes=set_data.notes
-        )
-        db.add(db_set)
-    
     db.commit()
     db.refresh(db_setgroup)
     return db_setgroup
@@ -374,7 +422,7 @@ def update_setgroup(
     setgroup_id: int,
     setgroup_update: SetgroupUpdate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Update a setgroup"""
     setgroup = db.query(Setgroup).filter(Setgroup.id == setgroup_id).first()
@@ -394,7 +442,7 @@ def update_setgroup(
 def delete_setgroup(
     setgroup_id: int,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Delete a setgroup (cascades to sets)"""
     setgroup = db.query(Setgroup).filter(Setgroup.id == setgroup_id).first()
@@ -413,7 +461,7 @@ def add_set_to_setgroup(
     setgroup_id: int,
     workout_set: WorkoutSetCreate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Add a new set to a setgroup"""
     setgroup = db.query(Setgroup).filter(Setgroup.id == setgroup_id).first()
@@ -442,7 +490,7 @@ def update_set(
     set_id: int,
     set_update: WorkoutSetUpdate,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Update a workout set"""
     workout_set = db.query(WorkoutSet).filter(WorkoutSet.id == set_id).first()
@@ -462,7 +510,7 @@ def update_set(
 def delete_set(
     set_id: int,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     """Delete a workout set"""
     workout_set = db.query(WorkoutSet).filter(WorkoutSet.id == set_id).first()
@@ -474,8 +522,50 @@ def delete_set(
     return None
 
 
+# ==================== HISTORY TRANSFER ROUTES ====================
+
+@router.get("/clients/{client_id}/export")
+def export_workout_history(client_id: int = Depends(get_authorized_client_id)):
+    """Stream a client's full workout history as NDJSON (see workout_transfer.py for the format)"""
+    return StreamingResponse(
+        stream_export(client_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="client-{client_id}-workouts.ndjson"'}
+    )
+
+
+@router.post("/clients/{client_id}/import", status_code=status.HTTP_201_CREATED)
+def import_workout_history(
+    client_id: int = Depends(get_authorized_client_id),
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    """Bulk-import an NDJSON workout history export into a client (all or nothing)"""
+    return import_lines(db, file.file, client_id, current_trainer.id)
+
+
 # ==================== PROGRESS & STATS ROUTES ====================
 
+@router.get("/clients/{client_id}/personal-records", response_model=List[PersonalRecordSchema])
+def list_personal_records(client_id: int = Depends(get_authorized_client_id), db: Session = Depends(get_db)):
+    """A client's best weight and estimated 1RM for every exercise they have completed"""
+    return [serialize_record(r) for r in client_records(db, client_id)]
+
+
+@router.get("/clients/{client_id}/personal-records/{exercise_id}", response_model=PersonalRecordSchema)
+def get_personal_record(
+    exercise_id: int,
+    client_id: int = Depends(get_authorized_client_id),
+    db: Session = Depends(get_db)
+):
+    """A client's records on one exercise, including rep maxes"""
+    record = get_record(db, client_id, exercise_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="No personal record for this exercise")
+    return serialize_record(record, get_rep_maxes(db, client_id, exercise_id))
+
+
 @router.get("/clients/{client_id}/exercise-progress/{exercise_id}", response_model=ExerciseProgress)
 def get_exercise_progress(
     client_id: int,
@@ -484,7 +574,7 @@ def get_exercise_progress(
 ):
     """Get progress history for a specific exercise for a client"""
     # Get all setgroups for this client and exercise
-    setgroups = db.query(Setgroup).join(Workout).filter(
+    setgroups = db.query(Setgroup).join(Workout).options(*SETGROUP_HISTORY_LOAD).filter(
         Workout.client_id == client_id,
         Setgroup.exercise_id == exercise_id,
         Workout.completed_at.isnot(None)
@@ -500,8 +590,9 @@ def get_exercise_progress(
     for setgroup in setgroups:
         max_weight = max([s.weight for s in setgroup.sets if s.weight], default=0)
         total_volume = setgroup.total_volume
-        total_reps = sum([s.reps for s in setgroup.sets if s.reps], default=0)
+        total_reps = setgroup.total_reps
         best_set_reps = max([s.reps for s in setgroup.sets if s.reps], default=0)
+        best_e1rm = max(filter(None, (estimate_1rm(s.weight, s.reps) for s in setgroup.sets)), default=None)
         
         history.append({
             "date": setgroup.workout.completed_at,
@@ -509,7 +600,8 @@ def get_exercise_progress(
             "max_weight": max_weight,
             "total_volume": total_volume,
             "total_reps": total_reps,
-            "best_set_reps": best_set_reps
+            "best_set_reps": best_set_reps,
+            "best_e1rm": best_e1rm
         })
     
     # Calculate improvements
@@ -517,6 +609,7 @@ def get_exercise_progress(
     current_max_weight = history[-1]["max_weight"] if history else 0
     starting_volume = history[0]["total_volume"] if history else 0
     current_volume = history[-1]["total_volume"] if history else 0
+    record = get_record(db, client_id, exercise_id)
     
     return ExerciseProgress(
         exercise_id=exercise_id,
@@ -531,15 +624,33 @@ def get_exercise_progress(
         current_volume=current_volume,
         starting_volume=starting_volume,
         volume_improvement=current_volume - starting_volume,
-        history=history
+        history=history,
+        personal_record=serialize_record(record) if record else None
     )
 
 
+@router.get("/clients/{client_id}/exercise-progress/{exercise_id}/series", response_model=ExerciseProgressSeries)
+def get_exercise_progress_series(
+    exercise_id: int,
+    client_id: int = Depends(get_authorized_client_id),
+    bucket: str = Query("week", pattern="^(" + "|".join(BUCKETS) + ")$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: Optional[int] = Query(None, ge=2, le=PROGRESS_SERIES_MAX_POINTS),
+    metric: str = Query("max_weight", pattern="^(" + "|".join(SERIES_METRICS) + ")$"),
+    db: Session = Depends(get_db)
+):
+    """Progress of an exercise in session/week/month buckets over [start, end), optionally downsampled to `points`"""
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return cached_series(db, client_id, exercise_id, bucket, start, end, points, metric)
+
+
 @router.get("/clients/{client_id}/stats", response_model=WorkoutStats)
 def get_workout_stats(client_id: int, db: Session = Depends(get_db)):
     """Get overall workout statistics for a client"""
     # Get all workouts for this client
-    workouts = db.query(Workout).filter(Workout.client_id == client_id).all()
+    workouts = db.query(Workout).options(*WORKOUT_SUMMARY_LOAD).filter(Workout.client_id == client_id).all()
     completed_workouts = [w for w in workouts if w.completed]
     
     if not completed_workouts:
@@ -558,7 +669,7 @@ def get_workout_stats(client_id: int, db: Session = Depends(get_db)):
     
     # Calculate stats
     total_volume = sum([w.total_volume for w in completed_workouts])
-    total_duration = sum([w.duration_minutes for w in completed_workouts if w.duration_minutes], default=0)
+    total_duration = sum(w.duration_minutes for w in completed_workouts if w.duration_minutes)
     
     # Count exercises
     all_setgroups = []
@@ -569,12 +680,7 @@ def get_workout_stats(client_id: int, db: Session = Depends(get_db)):
     unique_exercise_ids = set([sg.exercise_id for sg in all_setgroups])
     unique_exercises = len(unique_exercise_ids)
     
-    # Count total reps
-    total_reps = 0
-    for sg in all_setgroups:
-        for s in sg.sets:
-            if s.reps:
-                total_reps += s.reps
+    total_reps = sum(w.total_reps for w in completed_workouts)
     
     # Find favorite exercise (most frequently performed)
     exercise_counts = {}
@@ -587,14 +693,11 @@ def get_workout_stats(client_id: int, db: Session = Depends(get_db)):
         favorite_ex = db.query(Exercise).filter(Exercise.id == favorite_id).first()
         favorite_exercise = favorite_ex.name if favorite_ex else None
     
-    # Find strongest exercise (highest weight)
-    strongest_exercise = None
-    max_weight = 0
-    for sg in all_setgroups:
-        for s in sg.sets:
-            if s.weight and s.weight > max_weight:
-                max_weight = s.weight
-                strongest_exercise = sg.exercise.name
+    # Strongest (highest weight) and most improved (e1RM gain) come from the stored records
+    records = client_records(db, client_id)
+    strongest = max(records, key=lambda r: r.best_weight, default=None)
+    strongest_exercise = strongest.exercise.name if strongest else None
+    improved = most_improved(records)
     
     # Calculate workout frequency
     if len(completed_workouts) > 1:
@@ -635,7 +738,7 @@ def get_workout_stats(client_id: int, db: Session = Depends(get_db)):
         total_duration_minutes=total_duration,
         favorite_exercise=favorite_exercise,
         strongest_exercise=strongest_exercise,
-        most_improved_exercise=None,  # TODO: Calculate based on progress
+        most_improved_exercise=improved.exercise.name if improved else None,
         avg_workouts_per_week=avg_workouts_per_week,
         current_streak_days=current_streak,
         longest_streak_days=longest_streak
@@ -1,56 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
-from ..models import WorkoutVideo, WorkoutCategory, Trainer
+from ..models import WorkoutVideo, WorkoutCategory
 from ..schemas.workout import WorkoutVideoCreate, WorkoutVideo as WorkoutVideoSchema, WorkoutCategory as WorkoutCategorySchema
-from ..utils.auth import get_current_trainer
+from ..utils.auth import Principal, get_current_trainer
+from ..utils.uploads import save_upload, ResumableUpload, StoredFile, MAX_VIDEO_BYTES, STAGING_DIR
+from ..media_store import adopt_file, acquire, release, parse_blob_url
+from ..video_processing import get_video_processing_queue, remove_processed_files, PENDING
 import os
-import aiofiles
-import uuid
 from datetime import datetime
-import asyncio
-import subprocess
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads/workout_videos"
-THUMBNAIL_DIR = "uploads/thumbnails"
 
-# Ensure upload directories exist
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(THUMBNAIL_DIR, exist_ok=True)
-
-async def generate_thumbnail(video_path: str, thumbnail_path: str):
-    """Generate thumbnail from video using ffmpeg"""
-    try:
-        cmd = [
-            'ffmpeg', '-i', video_path,
-            '-ss', '00:00:01',  # Take frame from 1 second in
-            '-vframes', '1',
-            '-vf', 'scale=480:-1',  # Resize to 480p width, maintain aspect ratio
-            thumbnail_path
-        ]
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        await process.communicate()
-        
-        if process.returncode != 0:
-            raise Exception("Failed to generate thumbnail")
-            
-    except Exception as e:
-        print(f"Error generating thumbnail: {str(e)}")
-        raise
+class ResumableUploadInit(BaseModel):
+    filename: str
+    size: int  # total bytes
+    content_type: str
 
 @router.post("/categories/", response_model=WorkoutCategorySchema)
 async def create_category(
     name: str,
     description: str = None,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     category = WorkoutCategory(name=name, description=description)
     db.add(category)
@@ -61,10 +36,39 @@ async def create_category(
 @router.get("/categories/", response_model=List[WorkoutCategorySchema])
 async def list_categories(
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     return db.query(WorkoutCategory).all()
 
+def _create_video(
+    stored: StoredFile,
+    title: str,
+    description: str,
+    category_id: int,
+    difficulty: str,
+    trainer_id: int,
+    db: Session
+) -> WorkoutVideo:
+    # Create database entry; thumbnail, metadata and renditions are filled in
+    # by the processing workers, so the upload returns immediately
+    video_url = adopt_file(stored)  # shared content-addressed store
+    db_video = WorkoutVideo(
+        trainer_id=trainer_id,
+        category_id=category_id,
+        title=title,
+        description=description,
+        video_url=video_url,
+        difficulty=difficulty,
+        status=PENDING
+    )
+    
+    db.add(db_video)
+    acquire(db, video_url)
+    db.commit()
+    db.refresh(db_video)
+    get_video_processing_queue().enqueue(db_video.id)
+    return db_video
+
 @router.post("/videos/", response_model=WorkoutVideoSchema)
 async def upload_workout_video(
     video: UploadFile = File(...),
@@ -73,51 +77,82 @@ async def upload_workout_video(
     category_id: int = Form(...),
     difficulty: str = Form(...),
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     # Validate video file
     if not video.content_type.startswith('video/'):
         raise HTTPException(status_code=400, detail="File must be a video")
 
-    # Generate unique filename
-    video_filename = f"{uuid.uuid4()}{os.path.splitext(video.filename)[1]}"
-    video_path = os.path.join(UPLOAD_DIR, video_filename)
-    
-    # Save video file
-    async with aiofiles.open(video_path, 'wb') as out_file:
-        content = await video.read()
-        await out_file.write(content)
-
-    # Generate thumbnail
-    thumbnail_filename = f"{uuid.uuid4()}.jpg"
-    thumbnail_path = os.path.join(THUMBNAIL_DIR, thumbnail_filename)
-    await generate_thumbnail(video_path, thumbnail_path)
-
-    # Create database entry
-    video_url = f"/uploads/workout_videos/{video_filename}"
-    thumbnail_url = f"/uploads/thumbnails/{thumbnail_filename}"
+    # Stream to disk in chunks
+    stored = await save_upload(video, STAGING_DIR, MAX_VIDEO_BYTES)
+    return _create_video(stored, title, description, category_id, difficulty, current_trainer.id, db)
+
+@router.post("/videos/uploads")
+async def start_resumable_upload(
+    upload: ResumableUploadInit,
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    """
+    Start a resumable upload for a large video
     
-    db_video = WorkoutVideo(
-        trainer_id=current_trainer.id,
-        category_id=category_id,
-        title=title,
-        description=description,
-        video_url=video_url,
-        thumbnail_url=thumbnail_url,
-        difficulty=difficulty
+    Send the file as raw bytes with PUT /videos/uploads/{upload_id}?offset=N
+    (any number of chunks, in order), then POST .../complete with the
+    video details. GET /videos/uploads/{upload_id} returns the offset to
+    resume from after an interruption.
+    """
+    if not upload.content_type.startswith('video/'):
+        raise HTTPException(status_code=400, detail="File must be a video")
+    session = ResumableUpload.create(
+        current_trainer.id, upload.filename, upload.size, upload.content_type, MAX_VIDEO_BYTES
     )
-    
-    db.add(db_video)
-    db.commit()
-    db.refresh(db_video)
-    return db_video
+    return session.status()
+
+@router.get("/videos/uploads/{upload_id}")
+async def get_resumable_upload(
+    upload_id: str,
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    return ResumableUpload.load(upload_id, current_trainer.id).status()
+
+@router.put("/videos/uploads/{upload_id}")
+async def upload_video_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    session = ResumableUpload.load(upload_id, current_trainer.id)
+    await session.append(offset, request.stream())
+    return session.status()
+
+@router.post("/videos/uploads/{upload_id}/complete", response_model=WorkoutVideoSchema)
+async def complete_resumable_upload(
+    upload_id: str,
+    title: str = Form(...),
+    description: str = Form(...),
+    category_id: int = Form(...),
+    difficulty: str = Form(...),
+    db: Session = Depends(get_db),
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    session = ResumableUpload.load(upload_id, current_trainer.id)
+    stored = await session.complete(STAGING_DIR)
+    return _create_video(stored, title, description, category_id, difficulty, current_trainer.id, db)
+
+@router.delete("/videos/uploads/{upload_id}")
+async def abort_resumable_upload(
+    upload_id: str,
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    ResumableUpload.load(upload_id, current_trainer.id).abort()
+    return {"status": "success"}
 
 @router.get("/videos/", response_model=List[WorkoutVideoSchema])
 async def list_workout_videos(
     category_id: int = None,
     difficulty: str = None,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     query = db.query(WorkoutVideo).filter(
         WorkoutVideo.trainer_id == current_trainer.id
@@ -134,7 +169,7 @@ async def list_workout_videos(
 async def get_workout_video(
     video_id: int,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     video = db.query(WorkoutVideo).filter(
         WorkoutVideo.id == video_id,
@@ -146,11 +181,32 @@ async def get_workout_video(
     
     return video
 
+@router.post("/videos/{video_id}/reprocess", response_model=WorkoutVideoSchema)
+async def reprocess_workout_video(
+    video_id: int,
+    db: Session = Depends(get_db),
+    current_trainer: Principal = Depends(get_current_trainer)
+):
+    """Queue a video for processing again (e.g. after a failure)"""
+    video = db.query(WorkoutVideo).filter(
+        WorkoutVideo.id == video_id,
+        WorkoutVideo.trainer_id == current_trainer.id
+    ).first()
+    
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    video.status = PENDING
+    db.commit()
+    db.refresh(video)
+    get_video_processing_queue().enqueue(video.id)
+    return video
+
 @router.delete("/videos/{video_id}")
 async def delete_workout_video(
     video_id: int,
     db: Session = Depends(get_db),
-    current_trainer: Trainer = Depends(get_current_trainer)
+    current_trainer: Principal = Depends(get_current_trainer)
 ):
     video = db.query(WorkoutVideo).filter(
         WorkoutVideo.id == video_id,
@@ -160,17 +216,25 @@ async def delete_workout_video(
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    # Delete files
+    # The video file is shared by content hash; the media store's GC sweep
+    # deletes it once nothing references it. Derived files are per-video.
+    release(db, video.video_url)
     try:
-        if video.video_url:
+        if video.video_url and not parse_blob_url(video.video_url):
+            # uploaded before the media store existed
             video_path = os.path.join(".", video.video_url.lstrip('/'))
-            if os.path.exists(video_path):
+            shared = db.query(WorkoutVideo).filter(
+                WorkoutVideo.video_url == video.video_url,
+                WorkoutVideo.id != video.id
+            ).first()
+            if os.path.exists(video_path) and not shared:
                 os.remove(video_path)
                 
         if video.thumbnail_url:
             thumbnail_path = os.path.join(".", video.thumbnail_url.lstrip('/'))
             if os.path.exists(thumbnail_path):
                 os.remove(thumbnail_path)
+        remove_processed_files(video.id)
     except Exception as e:
         print(f"Error deleting files: {str(e)}")
     
@@ -0,0 +1,95 @@
+"""
+Schema Upgrades
+Base.metadata.create_all() creates missing tables but never alters existing
+ones, so a database created before a model gained a column fails every
+query that selects it. upgrade_schema() runs at startup, right after
+create_all(), and brings existing tables up to the models:
+
+    columns   ALTER TABLE ... ADD COLUMN for every model column a table lacks,
+              with its type and server default (NOT NULL only where that
+              default gives existing rows a value)
+    indexes   declared on those columns
+    backfills registered with add_backfill() by the module that owns the
+              columns, run once in the same transaction as the ALTER
+
+It is idempotent: once the columns exist it only inspects the tables. Rows
+the owning module already treats as "not done yet" need no backfill (e.g.
+S-Health payloads with no processed_at are picked up by the normaliser).
+
+Run it by hand with:
+    python -m backend.app.schema_upgrade
+"""
+from typing import Any, Callable, Iterable, List, Set, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models import Base
+
+# (columns as "table.column", backfill) registered by the modules that own the columns
+_backfills: List[Tuple[Set[str], Callable[[Connection], Any]]] = []
+
+
+def add_backfill(columns: Iterable[str], backfill: Callable[[Connection], Any]):
+    """Run `backfill(connection)` once whenever any of `columns` is added to an existing table"""
+    _backfills.append((set(columns), backfill))
+
+
+def _column_ddl(connection: Connection, column) -> str:
+    """Column spec for ADD COLUMN; NOT NULL only with a server default, as existing rows need a value"""
+    dialect = connection.dialect
+    spec = f"{dialect.identifier_preparer.format_column(column)} {column.type.compile(dialect=dialect)}"
+    default = dialect.ddl_compiler(dialect, None).get_column_default_string(column)
+    if default is not None:
+        spec += f" DEFAULT {default}"
+        if not column.nullable:
+            spec += " NOT NULL"
+    return spec
+
+
+def add_missing_columns(connection: Connection) -> List[str]:
+    """Add every model column an existing table lacks (and its indexes); returns the "table.column" names added"""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    preparer = connection.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all() builds it whole
+        present = {c["name"] for c in inspector.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in present and not c.primary_key]
+        new_columns = set()
+        for column in missing:
+            try:
+                with connection.begin_nested():
+                    connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {_column_ddl(connection, column)}"))
+            except SQLAlchemyError as e:
+                print(f"Schema upgrade: could not add {table.name}.{column.name}: {e}")
+                continue
+            new_columns.add(column)
+            added.append(f"{table.name}.{column.name}")
+        for index in table.indexes:
+            columns = set(index.columns)
+            if columns & new_columns and not columns & (set(missing) - new_columns):
+                index.create(connection, checkfirst=True)
+    return added
+
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """Add missing columns and indexes, then run the backfills they call for; returns the columns added"""
+    with engine.begin() as connection:
+        added = add_missing_columns(connection)
+        for columns, backfill in _backfills:
+            if columns & set(added):
+                backfill(connection)
+    if added:
+        print(f"Schema upgrade: added {', '.join(added)}")
+    return added
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    Base.metadata.create_all(bind=engine)
+    print({"columns_added": upgrade_schema(engine)})
@@ -30,6 +30,7 @@ class Measurement(MeasurementBase):
     id: int
     client_id: int
     date: datetime
+    photo_variants: Optional[List[dict]] = Field(None, description="Per photo: {thumb|medium|full: {webp, jpeg, width, height}}")
 
     class Config:
         from_attributes = True
@@ -17,6 +17,14 @@ class WorkoutVideoCreate(WorkoutVideoBase):
 class WorkoutVideo(WorkoutVideoBase):
     id: str
     trainer_id: str
+    status: Optional[str] = None  # pending, processing, ready, failed
+    processing_error: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    preview_url: Optional[str] = None
+    hls_url: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
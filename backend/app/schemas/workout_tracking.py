@@ -71,7 +71,7 @@ class WorkoutSetUpdate(BaseModel):
 class WorkoutSet(WorkoutSetBase):
     id: int
     setgroup_id: int
-    volume: float
+    volume: Optional[float] = None
     created_at: datetime
 
     class Config:
@@ -102,6 +102,8 @@ class Setgroup(SetgroupBase):
     exercise: Exercise
     sets: List[WorkoutSet]
     total_volume: float
+    set_count: int
+    total_reps: int
     created_at: datetime
 
     class Config:
@@ -122,6 +124,39 @@ class WorkoutCreate(WorkoutBase):
     setgroups: List[SetgroupCreate] = []
 
 
+class WorkoutImport(WorkoutCreate):
+    """Workout from another app's history; keeps its original dates"""
+    completed_at: Optional[datetime] = None
+    timestamp: Optional[datetime] = None
+
+
+class SetgroupTransfer(BaseModel):
+    """Setgroup in an NDJSON history export; the exercise travels by name"""
+    exercise: str = Field(..., min_length=1)
+    order_index: Optional[int] = None
+    notes: Optional[str] = None
+    rest_seconds: Optional[int] = None
+    sets: List[WorkoutSetCreate] = []
+
+
+class WorkoutTransfer(WorkoutBase):
+    """One workout line of an NDJSON history export"""
+    completed_at: Optional[datetime] = None
+    timestamp: Optional[datetime] = None
+    setgroups: List[SetgroupTransfer] = []
+
+
+class WorkoutBulkCreate(BaseModel):
+    workouts: List[WorkoutImport]
+
+
+class WorkoutBulkResult(BaseModel):
+    created: int
+    setgroups: int
+    sets: int
+    workout_ids: List[int]
+
+
 class WorkoutUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -138,6 +173,8 @@ class Workout(WorkoutBase):
     completed: bool
     completed_at: Optional[datetime] = None
     total_volume: float
+    set_count: int
+    total_reps: int
     setgroups: List[Setgroup]
     timestamp: datetime
     created_at: datetime
@@ -158,6 +195,8 @@ class WorkoutSummary(BaseModel):
     completed_at: Optional[datetime] = None
     duration_minutes: Optional[int] = None
     total_volume: float
+    set_count: int
+    total_reps: int
     exercise_count: int
     timestamp: datetime
     created_at: datetime
@@ -175,6 +214,32 @@ class ExerciseProgressEntry(BaseModel):
     total_volume: float
     total_reps: int
     best_set_reps: int
+    best_e1rm: Optional[float] = None  # best estimated one-rep max in the session
+
+
+class RepMax(BaseModel):
+    """Heaviest weight lifted for a number of reps"""
+    reps: int
+    weight: float
+    achieved_at: datetime
+
+
+class PersonalRecord(BaseModel):
+    """A client's best lifts on one exercise"""
+    exercise_id: int
+    exercise_name: Optional[str] = None
+    best_weight: float
+    best_weight_reps: int
+    best_weight_at: datetime
+    best_e1rm: Optional[float] = None
+    best_e1rm_weight: Optional[float] = None
+    best_e1rm_reps: Optional[int] = None
+    best_e1rm_at: Optional[datetime] = None
+    first_e1rm: Optional[float] = None
+    first_e1rm_at: Optional[datetime] = None
+    e1rm_improvement_percent: Optional[float] = None
+    formula: str
+    rep_maxes: Optional[List[RepMax]] = None
 
 
 class ExerciseProgress(BaseModel):
@@ -192,6 +257,32 @@ class ExerciseProgress(BaseModel):
     starting_volume: float
     volume_improvement: float
     history: List[ExerciseProgressEntry]
+    personal_record: Optional[PersonalRecord] = None
+
+
+class ProgressPoint(BaseModel):
+    """One session, week or month of an exercise"""
+    t: str  # bucket start (session: completion time)
+    sessions: int
+    sets: int
+    total_reps: int
+    max_weight: Optional[float] = None
+    mean_weight: Optional[float] = None
+    volume: float
+    best_e1rm: Optional[float] = None
+
+
+class ExerciseProgressSeries(BaseModel):
+    """Bucketed, optionally downsampled progress of an exercise"""
+    client_id: int
+    exercise_id: int
+    bucket: str
+    metric: str
+    start: Optional[str] = None
+    end: Optional[str] = None
+    total_points: int  # points before downsampling
+    downsampled: bool
+    points: List[ProgressPoint]
 
 
 class WorkoutStats(BaseModel):
@@ -0,0 +1,325 @@
+"""
+Samsung Health Ingest
+Phones sync S-Health data as thousands of small samples. The batch endpoint
+accepts them as a JSON array, an object with a "samples" list or NDJSON,
+and stores them as a few raw SHealthData rows in one transaction. A
+background normaliser then parses the raw payloads into typed tables:
+
+    steps       -> StepSample
+    heart_rate  -> HeartRateSample
+    sleep       -> SleepSample
+    weight      -> WeightSample
+
+Every typed row carries an idempotency key (the sample's own uuid when the
+phone sends one, otherwise a hash of its contents), so re-synced samples
+are ignored instead of counted twice. New samples are folded into the
+time-series rollups (wearable_series.py) in the same transaction. Raw rows
+keep their payload and are marked processed, which also lets the normaliser
+pick up rows that a crash or restart left behind.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import HeartRateSample, SHealthData, SleepSample, StepSample, WeightSample
+from .utils.dialects import insert_ignore, supports_insert_returning
+from .wearable_series import METRIC_BY_MODEL, update_rollups
+
+# Samples accepted in one request
+SHEALTH_MAX_BATCH = int(os.getenv("SHEALTH_MAX_BATCH", "20000"))
+# Samples stored per raw SHealthData row
+SHEALTH_RAW_CHUNK = int(os.getenv("SHEALTH_RAW_CHUNK", "500"))
+# Raw rows normalised per transaction
+SHEALTH_NORMALISE_BATCH = int(os.getenv("SHEALTH_NORMALISE_BATCH", "50"))
+
+# S-Health data type names and the short names we accept
+METRIC_ALIASES = {
+    "steps": "steps",
+    "step_count": "steps",
+    "com.samsung.health.step_count": "steps",
+    "com.samsung.shealth.step_daily_trend": "steps",
+    "heart_rate": "heart_rate",
+    "com.samsung.health.heart_rate": "heart_rate",
+    "sleep": "sleep",
+    "sleep_stage": "sleep",
+    "com.samsung.health.sleep": "sleep",
+    "com.samsung.health.sleep_stage": "sleep",
+    "weight": "weight",
+    "com.samsung.health.weight": "weight",
+}
+
+SLEEP_STAGES = {40001: "awake", 40002: "light", 40003: "deep", 40004: "rem"}
+
+
+def parse_time(value: Any) -> Optional[datetime]:
+    """Epoch seconds/milliseconds or ISO-8601 to a naive UTC datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        seconds = value / 1000 if value > 1e11 else value
+        try:
+            return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError):
+            raise ValueError(f"timestamp out of range: {value!r}")
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_batch_body(body: bytes, content_type: str = "") -> List[Dict[str, Any]]:
+    """
+    Samples from a JSON array, a {"samples": [...]} object or NDJSON
+
+    Top-level client_id/trainer_id of an object apply to samples that do
+    not set their own.
+    """
+    text = body.decode("utf-8").strip()
+    if not text:
+        return []
+    data = None
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            if "\n" not in text:
+                raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if data is not None:
+        samples = data if isinstance(data, list) else extract_samples(data)
+    else:
+        samples = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                samples.append(json.loads(line))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {number}")
+
+    if any(not isinstance(sample, dict) for sample in samples):
+        raise HTTPException(status_code=400, detail="Each sample must be a JSON object")
+    if len(samples) > SHEALTH_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {SHEALTH_MAX_BATCH} samples per batch")
+    return samples
+
+
+def extract_samples(payload: Any) -> List[Dict[str, Any]]:
+    """The samples in a raw payload (a batch chunk, a single sample or a legacy webhook body)"""
+    if isinstance(payload, list):
+        return [s for s in payload if isinstance(s, dict)]
+    if not isinstance(payload, dict):
+        return []
+    if isinstance(payload.get("samples"), list):
+        defaults = {k: payload[k] for k in ("client_id", "trainer_id") if payload.get(k) is not None}
+        return [{**defaults, **s} for s in payload["samples"] if isinstance(s, dict)]
+    return [payload]
+
+
+def store_batch(db: Session, samples: List[Dict[str, Any]], client_id: Optional[int] = None, trainer_id: Optional[int] = None) -> int:
+    """Insert samples as raw SHealthData rows (grouped per client) in one transaction; returns rows written"""
+    groups: Dict[Tuple[Any, Any], List[Dict[str, Any]]] = {}
+    for sample in samples:
+        owner = (sample.get("client_id", client_id), sample.get("trainer_id", trainer_id))
+        groups.setdefault(owner, []).append(sample)
+
+    now = datetime.utcnow()
+    rows = []
+    for (owner_client, owner_trainer), group in groups.items():
+        for start in range(0, len(group), SHEALTH_RAW_CHUNK):
+            rows.append({
+                "client_id": owner_client,
+                "trainer_id": owner_trainer,
+                "received_at": now,
+                "payload": {"samples": group[start:start + SHEALTH_RAW_CHUNK]},
+            })
+    if rows:
+        db.execute(insert(SHealthData), rows)
+    db.commit()
+    return len(rows)
+
+
+def _first(sample: Dict[str, Any], *names: str) -> Any:
+    for name in names:
+        if sample.get(name) is not None:
+            return sample[name]
+    return None
+
+
+def sample_key(metric: str, sample: Dict[str, Any], start: datetime, value: Any) -> str:
+    """Idempotency key: the device's uuid when present, else a hash of the sample"""
+    uid = _first(sample, "datauuid", "uuid")
+    basis = f"{metric}|uid|{uid}" if uid is not None else f"{metric}|{start.isoformat()}|{_first(sample, 'end_time')}|{value}"
+    return hashlib.sha256(basis.encode()).hexdigest()
+
+
+def normalise_sample(sample: Dict[str, Any], client_id: Optional[int], source_id: Optional[int] = None):
+    """(model, row mapping) for one sample; raises ValueError for unusable samples"""
+    metric = METRIC_ALIASES.get(str(_first(sample, "type", "data_type", "metric") or "").lower())
+    if metric is None:
+        raise ValueError(f"unknown sample type {_first(sample, 'type', 'data_type', 'metric')!r}")
+    client_id = sample.get("client_id", client_id)
+    if client_id is None:
+        raise ValueError("missing client_id")
+    start = parse_time(_first(sample, "start_time", "time", "timestamp", "create_time"))
+    if start is None:
+        raise ValueError("missing start_time")
+    end = parse_time(sample.get("end_time"))
+    row = {"client_id": int(client_id), "start_time": start, "source_id": source_id}
+
+    fields = {
+        "steps": ("count", "steps", "value"),
+        "heart_rate": ("heart_rate", "bpm", "value"),
+        "sleep": ("stage", "value"),
+        "weight": ("weight", "value"),
+    }[metric]
+    value = _first(sample, *fields)
+    if value is None and metric != "sleep":
+        raise ValueError(f"{metric} sample without a value")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f"{metric} sample with a non-finite value")
+
+    if metric == "steps":
+        row.update(end_time=end, count=int(value))
+        model = StepSample
+    elif metric == "heart_rate":
+        row.update(end_time=end, bpm=float(value), min_bpm=sample.get("min"), max_bpm=sample.get("max"))
+        model = HeartRateSample
+    elif metric == "sleep":
+        if end is None:
+            raise ValueError("sleep sample without end_time")
+        row.update(end_time=end, stage=SLEEP_STAGES.get(value, value))
+        model = SleepSample
+    else:
+        row.update(weight=float(value), body_fat=_first(sample, "body_fat", "body_fat_percentage"))
+        model = WeightSample
+
+    row["sample_key"] = sample_key(metric, sample, start, value)
+    return model, row
+
+
+def _insert_ignoring_duplicates(db: Session, model, rows: List[Dict[str, Any]]) -> int:
+    """Insert new samples and fold them into the rollups; duplicates touch neither"""
+    rows = list({(row["client_id"], row["sample_key"]): row for row in rows}.values())
+    stmt = insert_ignore(db, model.__table__, ["client_id", "sample_key"])
+    if supports_insert_returning(db):
+        inserted = {tuple(r) for r in db.connection().execute(stmt.returning(model.client_id, model.sample_key), rows)}
+        new_rows = [row for row in rows if (row["client_id"], row["sample_key"]) in inserted]
+    else:
+        # No RETURNING (MySQL): skip the keys already stored, then insert the rest
+        keys = [(row["client_id"], row["sample_key"]) for row in rows]
+        stored = {tuple(r) for r in db.execute(
+            select(model.client_id, model.sample_key).where(tuple_(model.client_id, model.sample_key).in_(keys))
+        )}
+        new_rows = [row for row in rows if (row["client_id"], row["sample_key"]) not in stored]
+        if new_rows:
+            db.connection().execute(stmt, new_rows)
+    update_rollups(db, METRIC_BY_MODEL[model], new_rows)
+    return len(new_rows)
+
+
+def normalise_rows(db: Session, raw_rows: Iterable[SHealthData]) -> Dict[str, int]:
+    """Parse raw rows into the typed tables and mark them processed (caller commits)"""
+    by_model: Dict[Any, List[Dict[str, Any]]] = {}
+    stats = {"raw_rows": 0, "samples": 0, "invalid": 0, "inserted": 0}
+    now = datetime.utcnow()
+    for raw in raw_rows:
+        parsed, errors = 0, []
+        for sample in extract_samples(raw.payload):
+            try:
+                model, row = normalise_sample(sample, raw.client_id, raw.id)
+            except (TypeError, ValueError, OverflowError, OSError) as e:
+                errors.append(str(e))
+                continue
+            by_model.setdefault(model, []).append(row)
+            parsed += 1
+        raw.processed_at = now
+        raw.samples = parsed
+        raw.error = f"{len(errors)} invalid sample(s), first: {errors[0]}" if errors else None
+        stats["raw_rows"] += 1
+        stats["samples"] += parsed
+        stats["invalid"] += len(errors)
+
+    for model, rows in by_model.items():
+        stats["inserted"] += _insert_ignoring_duplicates(db, model, rows)
+    return stats
+
+
+def _normalise_each(db: Session, raw_ids: List[int]) -> Dict[str, int]:
+    """
+    Normalise rows one transaction each, after their batch failed
+
+    A row that still fails is marked processed with the error, so one
+    poison payload cannot hold the head of the queue forever.
+    """
+    totals = {"raw_rows": 0, "samples": 0, "invalid": 0, "inserted": 0, "rejected": 0}
+    for raw_id in raw_ids:
+        try:
+            stats = normalise_rows(db, [db.get(SHealthData, raw_id)])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raw = db.get(SHealthData, raw_id)
+            raw.processed_at = datetime.utcnow()
+            raw.samples = 0
+            raw.error = f"rejected: {e}"[:1000]
+            db.commit()
+            print(f"S-Health normaliser: rejected raw row {raw_id}: {e}")
+            stats = {"raw_rows": 1, "rejected": 1}
+        for name, value in stats.items():
+            totals[name] += value
+    return totals
+
+
+def normalise_pending(db: Session, batch_size: int = SHEALTH_NORMALISE_BATCH) -> Dict[str, int]:
+    """Normalise every unprocessed raw row, one transaction per `batch_size` rows"""
+    totals = {"raw_rows": 0, "samples": 0, "invalid": 0, "inserted": 0, "rejected": 0}
+    while True:
+        pending = db.query(SHealthData).filter(SHealthData.processed_at.is_(None)).order_by(SHealthData.id).limit(batch_size).all()
+        if not pending:
+            return totals
+        raw_ids = [raw.id for raw in pending]
+        try:
+            stats = normalise_rows(db, pending)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"S-Health normaliser: batch of {len(raw_ids)} failed ({e}), retrying row by row")
+            stats = _normalise_each(db, raw_ids)
+        for name, value in stats.items():
+            totals[name] += value
+
+
+_normaliser_lock = threading.Lock()
+_normaliser_dirty = threading.Event()
+
+
+def run_normaliser():
+    """Background task: drain pending raw rows; concurrent calls fold into the running one"""
+    _normaliser_dirty.set()
+    while _normaliser_dirty.is_set():
+        if not _normaliser_lock.acquire(blocking=False):
+            return  # the running normaliser sees the flag and goes round again
+        try:
+            _normaliser_dirty.clear()
+            db = SessionLocal()
+            try:
+                stats = normalise_pending(db)
+                if stats["raw_rows"]:
+                    print(f"S-Health normaliser: {stats}")
+            except Exception as e:
+                db.rollback()
+                print(f"S-Health normaliser failed: {e}")
+                return
+            finally:
+                db.close()
+        finally:
+            _normaliser_lock.release()
@@ -1,32 +1,31 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, FrozenSet, Optional, Set
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
+import hashlib
 import os
+import time
 
 from ..database import get_db
-from ..models import Trainer
-
-# Configure password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ..models import Client, Trainer
+# Password hashing (scheme, cost and the hashing thread pool) lives in passwords.py
+from .passwords import hash_password as get_password_hash, verify_password
+from .cache import VersionedLRU
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-jwt")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+# Verified principals are reused for this long (and never past the token's exp)
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
 
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="trainers/token")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -40,11 +39,65 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated trainer as seen by request handlers (not an ORM entity)"""
+    id: int
+    name: str
+    email: str
+    client_ids: FrozenSet[int]
+
+    def owns(self, client_id: int) -> bool:
+        return client_id in self.client_ids
+
+
+class PrincipalCache(VersionedLRU):
+    """
+    Short-TTL LRU of verified principals keyed by the SHA-256 of the token
+
+    A hit skips both the JWT signature check and the database; entries are
+    dropped when the trainer or the set of their clients changes (see the
+    session hooks below) and expire with the token itself. Other worker
+    processes only see their own commits, so AUTH_CACHE_TTL bounds how long
+    a change made elsewhere can go unnoticed.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, maxsize: int = AUTH_CACHE_SIZE):
+        super().__init__(ttl, maxsize)
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def put(self, key: str, principal: Principal, token_exp: Optional[float], version: int):
+        """Store unless the trainer changed after `version` was taken"""
+        super().put(key, principal.id, principal, version, ttl=None if token_exp is None else token_exp - time.time())
+
+    invalidate_trainer = VersionedLRU.invalidate_owner
+
+
+principal_cache = PrincipalCache()
+
+
+def load_principal(db: Session, trainer_id: int) -> Optional[Principal]:
+    """Build a principal from the database (trainer row plus owned client ids)"""
+    row = db.query(Trainer.id, Trainer.name, Trainer.email).filter(Trainer.id == trainer_id).first()
+    if row is None:
+        return None
+    client_ids = frozenset(cid for (cid,) in db.query(Client.id).filter(Client.trainer_id == trainer_id))
+    return Principal(id=row.id, name=row.name, email=row.email, client_ids=client_ids)
+
+
 async def get_current_trainer(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> Trainer:
-    """Get the current authenticated trainer"""
+) -> Principal:
+    """Get the current authenticated trainer (cached per token)"""
+    key = principal_cache.token_key(token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -53,14 +106,106 @@ async def get_current_trainer(
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        trainer_id: int = payload.get("sub")
+        trainer_id = payload.get("sub")
         if trainer_id is None:
             raise credentials_exception
-    except JWTError:
+        trainer_id = int(trainer_id)
+    except (JWTError, ValueError):
         raise credentials_exception
-        
-    trainer = db.query(Trainer).filter(Trainer.id == trainer_id).first()
-    if trainer is None:
+
+    version = principal_cache.version()
+    principal = load_principal(db, trainer_id)
+    if principal is None:
         raise credentials_exception
-        
-    return trainer
\ No newline at end of file
+
+    principal_cache.put(key, principal, payload.get("exp"), version)
+    return principal
+
+
+async def get_current_trainer_entity(
+    principal: Principal = Depends(get_current_trainer),
+    db: Session = Depends(get_db)
+) -> Trainer:
+    """The authenticated trainer as an ORM entity, for handlers that modify it or walk its relationships"""
+    trainer = db.get(Trainer, principal.id)
+    if trainer is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return trainer
+
+
+def require_client(principal: Principal, client_id: int, detail: str = "Client not found") -> int:
+    """Raise 404 unless the trainer owns the client; answered from the principal, no query"""
+    if not principal.owns(client_id):
+        raise HTTPException(status_code=404, detail=detail)
+    return client_id
+
+
+async def get_authorized_client_id(
+    client_id: int,
+    current_trainer: Principal = Depends(get_current_trainer)
+) -> int:
+    """Path `client_id`, checked against the trainer's cached client set"""
+    return require_client(current_trainer, client_id)
+
+
+async def get_authorized_client(
+    client_id: int = Depends(get_authorized_client_id),
+    db: Session = Depends(get_db)
+) -> Client:
+    """The authorised client row, for handlers that need its fields (one primary-key lookup)"""
+    client = db.get(Client, client_id)
+    if client is None:
+        raise HTTPException(status_code=404, detail="Client not found")
+    return client
+
+
+# Invalidate cached principals when a trainer or their client set changes
+
+_AUTH_DIRTY_KEY = "auth_dirty_trainers"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_trainers(session: Session, flush_context):
+    dirty: Set[Any] = session.info.setdefault(_AUTH_DIRTY_KEY, set())
+    for obj in session.dirty:
+        if isinstance(obj, Trainer) and session.is_modified(obj):
+            dirty.add(obj.id)
+        elif isinstance(obj, Client):
+            history = inspect(obj).attrs.trainer_id.history
+            if history.has_changes():
+                dirty.update(v for v in (*history.added, *history.deleted) if v is not None)
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Client) and obj.trainer_id is not None:
+            dirty.add(obj.trainer_id)
+        elif isinstance(obj, Trainer) and obj.id is not None:
+            dirty.add(obj.id)
+
+
+def _collect_bulk_trainer_change(update_context):
+    if update_context.mapper.class_ in (Trainer, Client):
+        update_context.session.info.setdefault(_AUTH_DIRTY_KEY, set()).add("*")
+
+
+event.listen(Session, "after_bulk_update", _collect_bulk_trainer_change)
+event.listen(Session, "after_bulk_delete", _collect_bulk_trainer_change)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_trainers(session: Session):
+    dirty = session.info.pop(_AUTH_DIRTY_KEY, None)
+    if not dirty:
+        return
+    if "*" in dirty:
+        principal_cache.clear()
+        return
+    for trainer_id in dirty:
+        principal_cache.invalidate_trainer(trainer_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_trainers(session: Session):
+    session.info.pop(_AUTH_DIRTY_KEY, None)
@@ -0,0 +1,266 @@
+"""
+Async-aware memoisation for service calls
+
+`functools.lru_cache` on an `async def` caches the coroutine object rather
+than its result (and keys on the bound `self`), so it breaks on the second
+await. `async_cached` caches awaited results instead, with TTL, LRU size
+bounds, per-argument keys and single-flight de-duplication: concurrent
+misses for the same key share one in-flight call.
+
+`VersionedLRU` is the synchronous store behind the request-path caches
+(public profiles, progress series, auth principals): entries belong to an
+owner (a client or trainer) and are dropped when that owner changes, and a
+value built before the change is refused by put() even if it lands after.
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Set
+
+from .singleflight import SingleFlight
+
+# name -> AsyncCache, for the /health/caches endpoint
+_registry: Dict[str, "AsyncCache"] = {}
+
+
+def make_key(arguments: Dict[str, Any]) -> Hashable:
+    """Build a hashable cache key; dicts/lists are canonicalised via JSON"""
+    try:
+        key = tuple(sorted(arguments.items()))
+        hash(key)
+        return key
+    except TypeError:
+        return json.dumps(arguments, sort_keys=True, default=str)
+
+
+class AsyncCache:
+    """TTL + LRU result store with single-flight loading and hit/miss counters"""
+
+    def __init__(self, name: str, ttl: float, maxsize: int):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def coalesced(self) -> int:
+        return self._flight.coalesced
+
+    def _lookup(self, key: Hashable):
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+            return value
+
+        async def load():
+            self.misses += 1
+            value = await loader()
+            self._store(key, value)  # failures raise before this and are not cached
+            return value
+
+        return await self._flight.do(key, load)
+
+    def peek(self, key: Hashable):
+        """Return (found, value) without loading; counts as a hit when found"""
+        found, value = self._lookup(key)
+        if found:
+            self.hits += 1
+        return found, value
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value produced outside get_or_load (e.g. by a streamed call)"""
+        self._store(key, value)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+
+class _Entry(NamedTuple):
+    owner: Hashable
+    value: Any
+    expires_at: float  # monotonic
+
+
+class VersionedLRU:
+    """Thread-safe TTL + LRU store with per-owner invalidation and hit/miss counters"""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._by_owner: Dict[Hashable, Set[Hashable]] = {}
+        # Invalidation sequence: a value built before its owner's last
+        # invalidation must not be stored
+        self._sequence = 0
+        self._invalidated_at: Dict[Hashable, int] = {}
+        self._cleared_at = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self) -> int:
+        """Take before building a value and pass to put()"""
+        return self._sequence
+
+    def get(self, key: Hashable) -> Any:
+        """The cached value, or None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry.expires_at < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, owner: Hashable, value: Any, version: int, ttl: Optional[float] = None):
+        """Store unless the owner changed after `version` was taken; `ttl` may shorten self.ttl"""
+        ttl = self.ttl if ttl is None else min(self.ttl, ttl)
+        with self._lock:
+            if ttl <= 0 or max(self._cleared_at, self._invalidated_at.get(owner, 0)) > version:
+                return
+            previous = self._data.get(key)
+            if previous is not None:
+                value = self._replace(previous.value, value)
+            self._drop(key)
+            self._data[key] = _Entry(owner, value, time.monotonic() + ttl)
+            self._by_owner.setdefault(owner, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+
+    def _replace(self, previous: Any, value: Any) -> Any:
+        """Value stored over an existing entry for the same key"""
+        return value
+
+    def _drop(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            keys = self._by_owner.get(entry.owner)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_owner[entry.owner]
+
+    def invalidate_owner(self, owner: Hashable):
+        with self._lock:
+            self._sequence += 1
+            self._invalidated_at[owner] = self._sequence
+            for key in list(self._by_owner.pop(owner, ())):
+                self._data.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._sequence += 1
+            self._cleared_at = self._sequence
+            self._invalidated_at.clear()
+            self._data.clear()
+            self._by_owner.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def async_cached(
+    ttl: float = 300,
+    maxsize: int = 128,
+    key: Optional[Callable[..., Hashable]] = None,
+    name: Optional[str] = None,
+):
+    """
+    Cache the awaited result of an async function or method
+
+    Args:
+        ttl: Seconds a result stays fresh
+        maxsize: Maximum number of cached keys (least recently used evicted first)
+        key: Optional function receiving the call arguments as keywords
+             (without `self`) and returning a hashable key; defaults to all
+             arguments, with defaults applied
+        name: Name reported by cache_stats(); defaults to the qualified function name
+
+    Methods share one cache across instances: a leading `self` parameter is
+    excluded from the key.
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        signature = inspect.signature(func)
+        params = list(signature.parameters)
+        skip_self = bool(params) and params[0] == "self"
+        cache = AsyncCache(name or func.__qualname__, ttl, maxsize)
+        _registry[cache.name] = cache
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            if skip_self:
+                arguments.pop("self")
+            cache_key = key(**arguments) if key else make_key(arguments)
+            return await cache.get_or_load(cache_key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.stats
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss counters for every registered cache"""
+    return {name: cache.stats() for name, cache in sorted(_registry.items())}
@@ -0,0 +1,71 @@
+"""
+SQL Dialect Helpers
+Development runs on SQLite, production on PostgreSQL or MySQL. Upserts and
+a few scalar functions are spelled differently on each, so code that needs
+them builds the statement here from the connection's dialect instead of
+importing one dialect's insert().
+
+    SQLite / PostgreSQL   INSERT ... ON CONFLICT (...) DO UPDATE / DO NOTHING
+    MySQL / MariaDB       INSERT ... ON DUPLICATE KEY UPDATE / INSERT IGNORE
+"""
+from typing import Any, Callable, Iterable, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+_ON_CONFLICT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+_MYSQL_DIALECTS = ("mysql", "mariadb")
+
+
+def _dialect(bind):
+    """Dialect of an Engine, Connection or Session"""
+    return getattr(bind, "dialect", None) or bind.get_bind().dialect
+
+
+def dialect_name(bind) -> str:
+    return _dialect(bind).name
+
+
+def _on_conflict_insert(name: str):
+    if name not in _ON_CONFLICT_INSERTS:
+        raise NotImplementedError(f"Upserts are not supported on {name}")
+    return _ON_CONFLICT_INSERTS[name]
+
+
+def upsert(bind, table, index_elements: Iterable[str], update: Callable[[Any], Sequence[Tuple[str, Any]]]):
+    """
+    Insert that updates the conflicting row instead
+
+    `update(excluded)` returns (column, expression) pairs; `excluded` is the
+    row that failed to insert, the table's own columns are the stored row.
+    MySQL applies the assignments left to right and later ones see the
+    new values, so list a column after every assignment that reads it.
+    """
+    name = dialect_name(bind)
+    if name in _MYSQL_DIALECTS:
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(list(update(stmt.inserted)))
+    stmt = _on_conflict_insert(name)(table)
+    return stmt.on_conflict_do_update(index_elements=list(index_elements), set_=dict(update(stmt.excluded)))
+
+
+def insert_ignore(bind, table, index_elements: Iterable[str]):
+    """Insert that skips rows conflicting on `index_elements`"""
+    name = dialect_name(bind)
+    if name in _MYSQL_DIALECTS:
+        return mysql.insert(table).prefix_with("IGNORE")
+    return _on_conflict_insert(name)(table).on_conflict_do_nothing(index_elements=list(index_elements))
+
+
+def supports_insert_returning(bind) -> bool:
+    return bool(_dialect(bind).insert_returning)
+
+
+def greatest(bind, *values):
+    """Largest of several values (SQLite spells it as multi-argument max())"""
+    return func.max(*values) if dialect_name(bind) == "sqlite" else func.greatest(*values)
+
+
+def least(bind, *values):
+    """Smallest of several values (SQLite spells it as multi-argument min())"""
+    return func.min(*values) if dialect_name(bind) == "sqlite" else func.least(*values)
@@ -0,0 +1,103 @@
+"""
+Media serving for /uploads
+
+StaticFiles with caching suited to user media:
+
+- Content-addressed files (named <sha256>.<ext>, see utils/uploads.py) never
+  change, so they get their hash as a strong ETag and a one-year immutable
+  Cache-Control; other files revalidate after MEDIA_CACHE_MAX_AGE seconds.
+- Conditional GETs (If-None-Match / If-Modified-Since) are answered with 304.
+- Byte ranges (video seeking) are served as 206 partial content by
+  FileResponse, which also hands the file to the server via the ASGI
+  pathsend extension when available.
+- Behind nginx (or Apache/lighttpd), set MEDIA_SENDFILE_HEADER so the proxy
+  streams the file itself and large videos never pass through Python.
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Scope
+
+# Revalidation interval for files that can change (e.g. regenerated thumbnails)
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "300"))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# "X-Accel-Redirect" (nginx) or "X-Sendfile" (Apache/lighttpd); empty serves from Python
+MEDIA_SENDFILE_HEADER = os.getenv("MEDIA_SENDFILE_HEADER", "")
+# nginx `internal` location mapped to the uploads directory (X-Accel-Redirect only)
+MEDIA_SENDFILE_PREFIX = os.getenv("MEDIA_SENDFILE_PREFIX", "/protected-uploads")
+
+_CONTENT_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_content_addressed(path: str) -> bool:
+    """True for files stored under their SHA-256 (<64 hex chars>.<ext>)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return bool(_CONTENT_HASH_RE.match(stem))
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles with strong ETags, immutable caching, 304s and optional proxy sendfile"""
+
+    def cache_headers(self, full_path: PathLike, stat_result: os.stat_result) -> Dict[str, str]:
+        path = str(full_path)
+        if is_content_addressed(path):
+            etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+            cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+            cache_control = f"public, max-age={MEDIA_CACHE_MAX_AGE}"
+        return {
+            "etag": etag,
+            "cache-control": cache_control,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+        }
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+            if if_none_match.strip() == "*":
+                return True
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return response_headers["etag"] in tags
+
+        if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+        last_modified = parsedate(response_headers["last-modified"])
+        return bool(if_modified_since and last_modified and if_modified_since >= last_modified)
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        headers = self.cache_headers(full_path, stat_result)
+        if status_code == 200 and self.is_not_modified(Headers(headers), Headers(scope=scope)):
+            return NotModifiedResponse(Headers(headers))
+
+        if MEDIA_SENDFILE_HEADER and status_code == 200:
+            return self.sendfile_response(full_path, headers)
+
+        return FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+
+    def sendfile_response(self, full_path: PathLike, headers: Dict[str, str]) -> Response:
+        """Empty response telling the proxy which file to send (it handles ranges itself)"""
+        if MEDIA_SENDFILE_HEADER.lower() == "x-accel-redirect":
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            target = f"{MEDIA_SENDFILE_PREFIX.rstrip('/')}/{relative}"
+        else:
+            target = os.path.abspath(full_path)
+        media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+        response = Response(headers=headers, media_type=media_type)
+        response.headers[MEDIA_SENDFILE_HEADER] = target
+        del response.headers["content-length"]
+        return response
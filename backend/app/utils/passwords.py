@@ -0,0 +1,180 @@
+"""
+Password Hashing
+bcrypt and argon2 are deliberately slow, so hashing and verification run in
+a dedicated thread pool instead of on the event loop or the shared request
+threads. The C implementations release the GIL, so PASSWORD_HASH_WORKERS
+threads use that many cores; it also bounds how many hashes run at once, so
+a login burst queues behind the pool rather than stalling every request.
+
+    PASSWORD_SCHEME      scheme for new hashes: bcrypt (default), argon2
+                         (needs argon2-cffi) or pbkdf2_sha256 (pure Python)
+    BCRYPT_ROUNDS        bcrypt cost factor (log2 iterations)
+    ARGON2_TIME_COST     argon2 passes
+    ARGON2_MEMORY_COST   argon2 memory in KiB
+    ARGON2_PARALLELISM   argon2 lanes
+    PBKDF2_ROUNDS        pbkdf2_sha256 iterations
+
+Hashes made with another scheme or other cost parameters still verify, and
+are replaced with one using the current settings on the next successful
+login, so the cost can be tuned without resetting passwords.
+
+Measure logins per second for the current settings with:
+    python -m backend.app.utils.passwords --bench [--logins 200] [--workers 4]
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+PBKDF2_ROUNDS = int(os.getenv("PBKDF2_ROUNDS", "600000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+PASSWORD_SCHEMES = ("bcrypt", "argon2", "pbkdf2_sha256")
+
+
+def build_context(
+    scheme: str = PASSWORD_SCHEME,
+    bcrypt_rounds: int = BCRYPT_ROUNDS,
+    argon2_time_cost: int = ARGON2_TIME_COST,
+    argon2_memory_cost: int = ARGON2_MEMORY_COST,
+    argon2_parallelism: int = ARGON2_PARALLELISM,
+    pbkdf2_rounds: int = PBKDF2_ROUNDS
+) -> CryptContext:
+    """
+    Context that hashes with `scheme` and verifies all known schemes
+
+    Other schemes are deprecated and the cost settings are pinned (min =
+    max = default), so any hash that does not match the current settings
+    reports needs_update and gets rehashed on login.
+    """
+    if scheme not in PASSWORD_SCHEMES:
+        raise ValueError(f"Unsupported password scheme: {scheme}")
+    rounds = {"bcrypt": bcrypt_rounds, "argon2": argon2_time_cost, "pbkdf2_sha256": pbkdf2_rounds}
+    settings = {}
+    for name, value in rounds.items():
+        for option in ("default_rounds", "min_rounds", "max_rounds"):
+            settings[f"{name}__{option}"] = value
+    return CryptContext(
+        schemes=[scheme, *(s for s in PASSWORD_SCHEMES if s != scheme)],
+        deprecated="auto",
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+        **settings,
+    )
+
+
+pwd_context = build_context()
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the current settings (blocking)"""
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash (blocking); unknown hash formats never match"""
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    except (TypeError, ValueError):
+        return False
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(matches, replacement hash if the stored one uses outdated settings) (blocking)"""
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except (TypeError, ValueError):
+        return False, None
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_hash_pool() -> ThreadPoolExecutor:
+    """Get or create the password hashing thread pool"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=max(1, PASSWORD_HASH_WORKERS), thread_name_prefix="password-hash")
+    return _pool
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password in the hashing pool"""
+    return await asyncio.get_running_loop().run_in_executor(get_hash_pool(), hash_password, password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    verify_and_update() in the hashing pool
+
+    Without a stored hash (unknown account) a dummy hash is checked instead,
+    so the response time does not reveal which emails are registered.
+    """
+    if hashed_password is None:
+        hashed_password = await _dummy_hash()
+        await asyncio.get_running_loop().run_in_executor(get_hash_pool(), verify_password, plain_password, hashed_password)
+        return False, None
+    return await asyncio.get_running_loop().run_in_executor(get_hash_pool(), verify_and_update, plain_password, hashed_password)
+
+
+_dummy: Optional[Tuple[CryptContext, str]] = None
+
+
+async def _dummy_hash() -> str:
+    global _dummy
+    if _dummy is None or _dummy[0] is not pwd_context:
+        _dummy = (pwd_context, await hash_password_async("not-a-real-password"))
+    return _dummy[1]
+
+
+def bench(logins: int = 200, workers: int = PASSWORD_HASH_WORKERS) -> dict:
+    """Verify `logins` passwords concurrently through a pool of `workers` threads"""
+    import statistics
+    import time
+
+    stored = hash_password("correct horse battery staple")
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="password-bench")
+
+    async def login(loop) -> float:
+        started = time.perf_counter()
+        await loop.run_in_executor(pool, verify_password, "correct horse battery staple", stored)
+        return time.perf_counter() - started
+
+    async def burst():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(login(loop) for _ in range(logins)))
+
+    started = time.perf_counter()
+    latencies = sorted(asyncio.run(burst()))
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return {
+        "scheme": pwd_context.identify(stored),
+        "cpus": os.cpu_count(),
+        "workers": workers,
+        "logins": logins,
+        "seconds": round(elapsed, 2),
+        "logins_per_second": round(logins / elapsed, 1),
+        "min_ms": round(latencies[0] * 1000, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    def _arg(name: str, default: int) -> int:
+        return int(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+    if "--bench" in sys.argv:
+        print(bench(_arg("--logins", 200), _arg("--workers", PASSWORD_HASH_WORKERS)))
+    else:
+        print({"scheme": pwd_context.default_scheme(), "workers": PASSWORD_HASH_WORKERS})
@@ -0,0 +1,72 @@
+"""
+In-process request coalescing ("single-flight")
+
+When several coroutines ask for the same upstream resource at the same
+moment (e.g. the web client and desktop app opening one exercise or food
+detail), only the first performs the call; the rest await its in-flight
+call and receive the same result (or the same exception). The call runs
+as its own task, so cancelling any caller, the first one included, leaves
+it running for the others.
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# name -> SingleFlight, for the /health/caches endpoint
+_registry: Dict[str, "SingleFlight"] = {}
+
+
+def request_key(method: str, url: str, params: Optional[Dict[str, Any]] = None) -> Hashable:
+    """Key identifying an outbound HTTP request (params order-insensitive)"""
+    return (method.upper(), url, json.dumps(params or {}, sort_keys=True, default=str))
+
+
+class SingleFlight:
+    """Group of keyed in-flight calls with executed/coalesced counters"""
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}  # key -> task running the call
+        self.executed = 0
+        self.coalesced = 0
+        self.failed = 0
+        if name:
+            _registry[name] = self
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn` for `key`, or join the call already in flight for it"""
+        inflight = self._inflight.get(key)
+        if inflight is not None and not inflight.done():
+            self.coalesced += 1
+            # shield: a cancelled waiter must not cancel the shared call
+            return await asyncio.shield(inflight)
+
+        self.executed += 1
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, key: Hashable, task: asyncio.Future):
+        # runs before any caller resumes, so a later call starts afresh
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:  # also marks it retrieved
+            self.failed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+        }
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters for every named single-flight group"""
+    return {name: group.stats() for name, group in sorted(_registry.items())}
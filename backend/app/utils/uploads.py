@@ -0,0 +1,237 @@
+"""
+Streaming upload storage
+
+Uploads are copied to disk in fixed-size chunks (never read whole into
+memory) and hashed with SHA-256 on the way through, so peak memory per
+upload is bounded by UPLOAD_CHUNK_SIZE. Finished files land in a staging
+directory under a unique name; media_store.adopt_file() then moves them into
+the content-addressed store. Size limits are enforced as soon as they are
+exceeded (413), and large videos can also be sent as resumable chunked
+uploads (ResumableUpload).
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MiB
+MAX_PHOTO_BYTES = int(os.getenv("MAX_PHOTO_BYTES", str(25 * 1024 * 1024)))  # 25 MiB
+MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_BYTES", str(4 * 1024 * 1024 * 1024)))  # 4 GiB
+# Resumable sessions not completed within this many hours are discarded
+RESUMABLE_UPLOAD_TTL_HOURS = float(os.getenv("RESUMABLE_UPLOAD_TTL_HOURS", "24"))
+
+RESUMABLE_DIR = "uploads/.incoming"
+# Finished uploads wait here until they are moved into the media store
+STAGING_DIR = "uploads/.staging"
+
+
+class StoredFile(NamedTuple):
+    path: str
+    filename: str
+    size: int
+    sha256: str
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_to_disk(
+    chunks: AsyncIterator[bytes],
+    directory: str,
+    ext: str,
+    max_bytes: int
+) -> StoredFile:
+    """Write an async byte stream to a uniquely named file in `directory`"""
+    os.makedirs(directory, exist_ok=True)
+    name = uuid.uuid4().hex
+    tmp_path = os.path.join(directory, f".{name}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as out_file:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+    filename = f"{name}{ext.lower()}"
+    os.replace(tmp_path, os.path.join(directory, filename))
+    return StoredFile(os.path.join(directory, filename), filename, size, digest.hexdigest())
+
+
+async def _upload_chunks(upload: UploadFile, chunk_size: int) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def save_upload(
+    upload: UploadFile,
+    directory: str,
+    max_bytes: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> StoredFile:
+    """
+    Stream an UploadFile to a uniquely named file in `directory`
+
+    Rejects with 413 before reading when the size is already known, otherwise
+    as soon as the running total passes `max_bytes`.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+    ext = os.path.splitext(upload.filename or "")[1]
+    return await stream_to_disk(_upload_chunks(upload, chunk_size), directory, ext, max_bytes)
+
+
+class ResumableUpload:
+    """
+    A chunked upload session stored on disk
+
+    The data accumulates in <id>.part and the session (owner, declared size,
+    filename) in <id>.json, so an interrupted client can ask for the current
+    offset and continue, even across server restarts.
+    """
+
+    def __init__(self, upload_id: str, meta: Dict[str, Any]):
+        self.upload_id = upload_id
+        self.meta = meta
+
+    @staticmethod
+    def _paths(upload_id: str):
+        base = os.path.join(RESUMABLE_DIR, upload_id)
+        return f"{base}.part", f"{base}.json"
+
+    @property
+    def part_path(self) -> str:
+        return self._paths(self.upload_id)[0]
+
+    @property
+    def offset(self) -> int:
+        try:
+            return os.path.getsize(self.part_path)
+        except FileNotFoundError:
+            return 0
+
+    @classmethod
+    def create(cls, owner_id: int, filename: str, size: int, content_type: str, max_bytes: int) -> "ResumableUpload":
+        if size <= 0:
+            raise HTTPException(status_code=400, detail="Upload size must be positive")
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        os.makedirs(RESUMABLE_DIR, exist_ok=True)
+        cls.purge_expired()
+        upload = cls(uuid.uuid4().hex, {
+            "owner_id": owner_id,
+            "filename": filename,
+            "size": size,
+            "content_type": content_type,
+            "created_at": time.time(),
+        })
+        part_path, meta_path = cls._paths(upload.upload_id)
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w') as f:
+            json.dump(upload.meta, f)
+        return upload
+
+    @classmethod
+    def load(cls, upload_id: str, owner_id: int) -> "ResumableUpload":
+        _, meta_path = cls._paths(os.path.basename(upload_id))
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if meta.get("owner_id") != owner_id:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return cls(os.path.basename(upload_id), meta)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "offset": self.offset,
+            "size": self.meta["size"],
+            "chunk_size": UPLOAD_CHUNK_SIZE,
+            "complete": self.offset == self.meta["size"],
+        }
+
+    async def append(self, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Append a chunk at `offset` (must equal the bytes received so far); returns the new offset"""
+        current = self.offset
+        if offset != current:
+            raise HTTPException(status_code=409, detail=f"Expected offset {current}")
+        size = self.meta["size"]
+        written = current
+        async with aiofiles.open(self.part_path, 'ab') as out_file:
+            try:
+                async for chunk in chunks:
+                    written += len(chunk)
+                    if written > size:
+                        raise HTTPException(status_code=413, detail="Chunk runs past the declared upload size")
+                    await out_file.write(chunk)
+            except BaseException:
+                # Drop the partial chunk so the client can retry from `offset`
+                await out_file.flush()
+                await out_file.truncate(current)
+                raise
+        return written
+
+    async def complete(self, directory: str) -> StoredFile:
+        """Verify the upload is whole, hash it and move it to `directory`"""
+        if self.offset != self.meta["size"]:
+            raise HTTPException(status_code=409, detail=f"Upload incomplete: {self.offset} of {self.meta['size']} bytes")
+        digest = hashlib.sha256()
+        async with aiofiles.open(self.part_path, 'rb') as in_file:
+            while True:
+                chunk = await in_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+
+        os.makedirs(directory, exist_ok=True)
+        ext = os.path.splitext(self.meta["filename"])[1]
+        filename = f"{self.upload_id}{ext.lower()}"
+        os.replace(self.part_path, os.path.join(directory, filename))
+        _remove(self._paths(self.upload_id)[1])
+        return StoredFile(os.path.join(directory, filename), filename, self.meta["size"], digest.hexdigest())
+
+    def abort(self):
+        for path in self._paths(self.upload_id):
+            _remove(path)
+
+    @classmethod
+    def purge_expired(cls):
+        """Discard sessions older than RESUMABLE_UPLOAD_TTL_HOURS"""
+        cutoff = time.time() - RESUMABLE_UPLOAD_TTL_HOURS * 3600
+        if not os.path.isdir(RESUMABLE_DIR):
+            return
+        for name in os.listdir(RESUMABLE_DIR):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(RESUMABLE_DIR, name)
+            try:
+                with open(path) as f:
+                    created_at = json.load(f).get("created_at", 0)
+            except (OSError, ValueError):
+                created_at = 0
+            if created_at < cutoff:
+                cls(name[:-len(".json")], {}).abort()
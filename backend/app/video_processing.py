@@ -0,0 +1,296 @@
+"""
+Workout Video Processing
+Post-upload pipeline for workout videos, run by a small pool of background
+workers so uploads return immediately:
+
+    probe      duration / resolution / codecs via ffprobe
+    thumbnail  poster frame (JPEG)
+    preview    animated preview strip (WebP) for hover/scrub previews
+    hls        adaptive-bitrate HLS renditions + master playlist
+
+The WorkoutVideo row is updated after every stage, so clients can show the
+thumbnail before the renditions are ready. Videos already stored when the
+status column was added are marked ready as they are. Requires
+ffmpeg/ffprobe on PATH.
+"""
+import asyncio
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.engine import Connection
+
+from .database import SessionLocal
+from .models import WorkoutVideo
+from .schema_upgrade import add_backfill
+
+VIDEO_PROCESSING_CONCURRENCY = int(os.getenv("VIDEO_PROCESSING_CONCURRENCY", "2"))
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+PREVIEW_FRAMES = 12
+
+THUMBNAIL_DIR = "uploads/thumbnails"
+PREVIEW_DIR = "uploads/previews"
+HLS_DIR = "uploads/hls"
+
+# (height, video bitrate, audio bitrate) - only renditions at or below the source height are produced
+RENDITIONS: List[Tuple[int, str, str]] = [
+    (1080, "5000k", "192k"),
+    (720, "2800k", "128k"),
+    (480, "1400k", "128k"),
+    (360, "800k", "96k"),
+]
+
+# Processing states stored in WorkoutVideo.status
+PENDING, PROCESSING, READY, FAILED = "pending", "processing", "ready", "failed"
+
+
+def _adopt_existing_videos(connection: Connection):
+    """Videos uploaded before this pipeline are served as uploaded: mark them ready rather than re-encode them all"""
+    connection.execute(update(WorkoutVideo.__table__).where(WorkoutVideo.status.is_(None)).values(status=READY))
+
+
+add_backfill(["workout_videos.status"], _adopt_existing_videos)
+
+
+def rendition_ladder(source_height: Optional[int]) -> List[Tuple[int, str, str]]:
+    """Renditions to produce for a source; small sources still get the lowest rung"""
+    if not source_height:
+        return RENDITIONS[-1:]
+    ladder = [r for r in RENDITIONS if r[0] <= source_height]
+    return ladder or RENDITIONS[-1:]
+
+
+def master_playlist(ladder: List[Tuple[int, str, str]], width: Optional[int], height: Optional[int]) -> str:
+    """HLS master playlist pointing at <height>p/index.m3u8 for each rendition"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rung_height, video_rate, audio_rate in ladder:
+        bandwidth = (int(video_rate[:-1]) + int(audio_rate[:-1])) * 1000
+        rung_width = round(width * rung_height / height / 2) * 2 if width and height else None
+        resolution = f",RESOLUTION={rung_width}x{rung_height}" if rung_width else ""
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}{resolution}")
+        lines.append(f"{rung_height}p/index.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+async def _run(*cmd: str) -> bytes:
+    """Run a command, returning stdout; raises RuntimeError with the stderr tail on failure"""
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"{cmd[0]} failed: {stderr.decode(errors='replace')[-500:]}")
+    return stdout
+
+
+async def probe(video_path: str) -> Dict[str, Any]:
+    """Duration, resolution and codecs of a video"""
+    output = await _run(
+        'ffprobe', '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', video_path
+    )
+    info = json.loads(output or b"{}")
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    fmt = info.get("format", {})
+    duration = fmt.get("duration") or video.get("duration")
+    return {
+        "duration": float(duration) if duration else None,
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "video_codec": video.get("codec_name"),
+        "audio_codec": audio.get("codec_name"),
+        "bitrate": int(fmt["bit_rate"]) if fmt.get("bit_rate") else None,
+    }
+
+
+async def generate_thumbnail(video_path: str, thumbnail_path: str, at_seconds: float = 1.0):
+    """Generate thumbnail from video using ffmpeg"""
+    await _run(
+        'ffmpeg', '-y', '-ss', str(at_seconds), '-i', video_path,
+        '-vframes', '1',
+        '-vf', 'scale=480:-2',  # Resize to 480p width, maintain aspect ratio
+        thumbnail_path
+    )
+
+
+async def generate_preview(video_path: str, preview_path: str, duration: Optional[float]):
+    """Animated WebP of PREVIEW_FRAMES frames spread evenly across the video"""
+    fps = PREVIEW_FRAMES / duration if duration else 1
+    await _run(
+        'ffmpeg', '-y', '-i', video_path,
+        '-vf', f'fps={fps:.4f},scale=320:-2',
+        '-frames:v', str(PREVIEW_FRAMES),
+        '-c:v', 'libwebp', '-loop', '0', '-q:v', '60',
+        '-an', preview_path
+    )
+
+
+async def transcode_hls(video_path: str, output_dir: str, meta: Dict[str, Any]) -> str:
+    """Write one HLS rendition per ladder rung plus master.m3u8; returns the master path"""
+    ladder = rendition_ladder(meta.get("height"))
+    for height, video_rate, audio_rate in ladder:
+        rung_dir = os.path.join(output_dir, f"{height}p")
+        os.makedirs(rung_dir, exist_ok=True)
+        cmd = [
+            'ffmpeg', '-y', '-i', video_path,
+            '-vf', f'scale=-2:{height}',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main',
+            '-b:v', video_rate, '-maxrate', video_rate, '-bufsize', f"{int(video_rate[:-1]) * 2}k",
+            # keyframe every segment so renditions switch cleanly
+            '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})',
+        ]
+        cmd += ['-c:a', 'aac', '-b:a', audio_rate] if meta.get("audio_codec") else ['-an']
+        cmd += [
+            '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(rung_dir, 'seg_%04d.ts'),
+            os.path.join(rung_dir, 'index.m3u8')
+        ]
+        await _run(*cmd)
+
+    master_path = os.path.join(output_dir, "master.m3u8")
+    with open(master_path, "w") as f:
+        f.write(master_playlist(ladder, meta.get("width"), meta.get("height")))
+    return master_path
+
+
+def _update(video_id: int, **fields):
+    db = SessionLocal()
+    try:
+        video = db.query(WorkoutVideo).filter(WorkoutVideo.id == video_id).first()
+        if video:
+            for field, value in fields.items():
+                setattr(video, field, value)
+            db.commit()
+    finally:
+        db.close()
+
+
+def _video_path(video_id: int) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        video = db.query(WorkoutVideo).filter(WorkoutVideo.id == video_id).first()
+        return os.path.join(".", video.video_url.lstrip('/')) if video else None
+    finally:
+        db.close()
+
+
+async def process_video(video_id: int):
+    """Run every stage for one video, saving results as each completes"""
+    video_path = _video_path(video_id)
+    if not video_path:
+        return
+    _update(video_id, status=PROCESSING, processing_error=None)
+    try:
+        meta = await probe(video_path)
+        _update(video_id, **meta)
+
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        thumbnail_path = os.path.join(THUMBNAIL_DIR, f"{video_id}.jpg")
+        await generate_thumbnail(video_path, thumbnail_path, 1.0 if (meta["duration"] or 0) > 1 else 0.0)
+        _update(video_id, thumbnail_url=f"/uploads/thumbnails/{video_id}.jpg")
+
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        preview_path = os.path.join(PREVIEW_DIR, f"{video_id}.webp")
+        await generate_preview(video_path, preview_path, meta["duration"])
+        _update(video_id, preview_url=f"/uploads/previews/{video_id}.webp")
+
+        output_dir = os.path.join(HLS_DIR, str(video_id))
+        shutil.rmtree(output_dir, ignore_errors=True)
+        await transcode_hls(video_path, output_dir, meta)
+        _update(
+            video_id,
+            hls_url=f"/uploads/hls/{video_id}/master.m3u8",
+            status=READY,
+            processed_at=datetime.utcnow()
+        )
+    except Exception as e:
+        print(f"Error processing video {video_id}: {str(e)}")
+        _update(video_id, status=FAILED, processing_error=str(e)[:1000])
+
+
+def remove_processed_files(video_id: int):
+    """Delete thumbnail, preview and HLS output for a video"""
+    for path in (os.path.join(THUMBNAIL_DIR, f"{video_id}.jpg"), os.path.join(PREVIEW_DIR, f"{video_id}.webp")):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(os.path.join(HLS_DIR, str(video_id)), ignore_errors=True)
+
+
+class VideoProcessingQueue:
+    """Bounded pool of asyncio workers draining a queue of video ids"""
+
+    def __init__(self, concurrency: int = VIDEO_PROCESSING_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._queued: Set[int] = set()
+        self._active: Set[int] = set()
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # first use, or a new event loop (e.g. tests): start fresh
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._workers = []
+            self._queued.clear()
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(loop.create_task(self._worker()))
+
+    async def _worker(self):
+        while True:
+            video_id = await self._queue.get()
+            self._queued.discard(video_id)
+            self._active.add(video_id)
+            try:
+                await process_video(video_id)
+            finally:
+                self._active.discard(video_id)
+                self._queue.task_done()
+
+    def enqueue(self, video_id: int):
+        """Schedule a video for processing (no-op if already queued or running)"""
+        if video_id in self._queued or video_id in self._active:
+            return
+        self._ensure_workers()
+        self._queued.add(video_id)
+        self._queue.put_nowait(video_id)
+
+    def resume_pending(self):
+        """Re-queue videos left pending/processing by a restart"""
+        db = SessionLocal()
+        try:
+            ids = [vid for (vid,) in db.query(WorkoutVideo.id).filter(
+                WorkoutVideo.status.in_([PENDING, PROCESSING])
+            ).all()]
+        finally:
+            db.close()
+        for video_id in ids:
+            self.enqueue(video_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "queued": len(self._queued),
+            "processing": sorted(self._active),
+        }
+
+
+_processing_queue: Optional[VideoProcessingQueue] = None
+
+def get_video_processing_queue() -> VideoProcessingQueue:
+    """Get or create the video processing queue singleton"""
+    global _processing_queue
+    if _processing_queue is None:
+        _processing_queue = VideoProcessingQueue()
+    return _processing_queue
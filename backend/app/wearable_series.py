@@ -0,0 +1,198 @@
+"""
+Wearable Time Series
+Charts over wearable data read pre-aggregated buckets instead of raw
+samples. Every sample the S-Health normaliser inserts is folded into
+WearableRollup rows at three resolutions:
+
+    minute   (client, metric, minute bucket)   for windows up to a few hours
+    hour     (client, metric, hour bucket)     for days to weeks
+    day      (client, metric, day bucket)      for months and years
+
+Buckets keep count, total, min and max, so sums (steps, sleep minutes) and
+averages (heart rate, weight) come from one indexed range scan over the
+composite primary key. get_series() picks the finest resolution that fits
+the requested number of points.
+
+Rebuild the rollups from the sample tables with:
+    python -m backend.app.wearable_series --rebuild
+"""
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import HeartRateSample, SleepSample, StepSample, WearableRollup, WeightSample
+from .utils.dialects import greatest, least, upsert
+
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+# Upper bound on points returned when the resolution is "auto"
+WEARABLE_MAX_POINTS = int(os.getenv("WEARABLE_MAX_POINTS", "500"))
+
+# metric -> (sample model, how buckets combine into a chart value, unit)
+SERIES_METRICS = {
+    "steps": (StepSample, "sum", "steps"),
+    "heart_rate": (HeartRateSample, "avg", "bpm"),
+    "sleep": (SleepSample, "sum", "minutes"),
+    "weight": (WeightSample, "avg", "kg"),
+}
+METRIC_BY_MODEL = {model: metric for metric, (model, _, _) in SERIES_METRICS.items()}
+
+
+def sample_value(metric: str, row: Dict[str, Any]) -> float:
+    """The number a sample contributes to its buckets"""
+    if metric == "steps":
+        return float(row["count"])
+    if metric == "heart_rate":
+        return float(row["bpm"])
+    if metric == "sleep":
+        return (row["end_time"] - row["start_time"]).total_seconds() / 60
+    return float(row["weight"])
+
+
+def bucket_start(ts: datetime, resolution: str) -> datetime:
+    if resolution == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_upsert(bind):
+    """Insert of rollup buckets that merges into existing buckets"""
+    return upsert(bind, WearableRollup.__table__, ["client_id", "metric", "resolution", "bucket_start"], lambda excluded: [
+        ("samples", WearableRollup.samples + excluded.samples),
+        ("total", WearableRollup.total + excluded.total),
+        ("minimum", least(bind, WearableRollup.minimum, excluded.minimum)),
+        ("maximum", greatest(bind, WearableRollup.maximum, excluded.maximum)),
+    ])
+
+
+def update_rollups(db: Session, metric: str, rows: Iterable[Dict[str, Any]]) -> int:
+    """Fold newly inserted samples into every resolution (caller commits); returns buckets touched"""
+    buckets: Dict[Tuple[int, str, datetime], List[float]] = defaultdict(lambda: [0, 0.0, None, None])
+    for row in rows:
+        value = sample_value(metric, row)
+        for resolution in RESOLUTIONS:
+            agg = buckets[(row["client_id"], resolution, bucket_start(row["start_time"], resolution))]
+            agg[0] += 1
+            agg[1] += value
+            agg[2] = value if agg[2] is None else min(agg[2], value)
+            agg[3] = value if agg[3] is None else max(agg[3], value)
+    if not buckets:
+        return 0
+
+    db.connection().execute(rollup_upsert(db), [
+        {
+            "client_id": client_id,
+            "metric": metric,
+            "resolution": resolution,
+            "bucket_start": start,
+            "samples": agg[0],
+            "total": agg[1],
+            "minimum": agg[2],
+            "maximum": agg[3],
+        }
+        for (client_id, resolution, start), agg in buckets.items()
+    ])
+    return len(buckets)
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    """Samples are stored as naive UTC"""
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def pick_resolution(start: datetime, end: datetime, max_points: int = WEARABLE_MAX_POINTS) -> str:
+    """Finest resolution whose bucket count over the window fits in max_points"""
+    span = (end - start).total_seconds()
+    for resolution, seconds in RESOLUTIONS.items():
+        if span / seconds <= max_points:
+            return resolution
+    return "day"
+
+
+def get_series(
+    db: Session,
+    client_id: int,
+    metric: str,
+    start: datetime,
+    end: datetime,
+    resolution: str = "auto",
+    max_points: int = WEARABLE_MAX_POINTS
+) -> Dict[str, Any]:
+    """Downsampled series for [start, end) from the rollup table"""
+    _, combine, unit = SERIES_METRICS[metric]
+    start, end = _naive_utc(start), _naive_utc(end)
+    if resolution == "auto":
+        resolution = pick_resolution(start, end, max_points)
+    rows = db.query(WearableRollup).filter(
+        WearableRollup.client_id == client_id,
+        WearableRollup.metric == metric,
+        WearableRollup.resolution == resolution,
+        WearableRollup.bucket_start >= bucket_start(start, resolution),
+        WearableRollup.bucket_start < end,
+    ).order_by(WearableRollup.bucket_start).all()
+
+    points = [
+        {
+            "t": row.bucket_start.isoformat(),
+            "value": round(row.total if combine == "sum" else row.total / row.samples, 2),
+            "min": row.minimum,
+            "max": row.maximum,
+            "samples": row.samples,
+        }
+        for row in rows
+    ]
+    return {
+        "client_id": client_id,
+        "metric": metric,
+        "unit": unit,
+        "resolution": resolution,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "points": points,
+    }
+
+
+def rebuild_rollups(db: Session, client_id: Optional[int] = None, chunk_size: int = 5000) -> Dict[str, int]:
+    """Recompute rollups from the sample tables (e.g. after a manual data fix)"""
+    deleted = db.query(WearableRollup)
+    if client_id is not None:
+        deleted = deleted.filter(WearableRollup.client_id == client_id)
+    deleted.delete(synchronize_session=False)
+
+    counts = {}
+    for metric, (model, _, _) in SERIES_METRICS.items():
+        query = db.query(model)
+        if client_id is not None:
+            query = query.filter(model.client_id == client_id)
+        total, batch = 0, []
+        for sample in query.yield_per(chunk_size):
+            batch.append({c.name: getattr(sample, c.name) for c in model.__table__.columns})
+            if len(batch) >= chunk_size:
+                update_rollups(db, metric, batch)
+                total += len(batch)
+                batch = []
+        update_rollups(db, metric, batch)
+        counts[metric] = total + len(batch)
+    db.commit()
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .database import SessionLocal, engine
+    from .models import Base
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if "--rebuild" in sys.argv:
+            print(rebuild_rollups(db))
+        else:
+            print({r: db.query(WearableRollup).filter(WearableRollup.resolution == r).count() for r in RESOLUTIONS})
+    finally:
+        db.close()
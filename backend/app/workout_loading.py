@@ -0,0 +1,32 @@
+"""
+Workout Loader Profiles
+Workout responses walk Workout -> Setgroup -> WorkoutSet (for the sets
+themselves) and Setgroup -> Exercise (for names); volume and counts are
+stored columns (workout_totals.py). Left to lazy loading that is
+one query per workout and per setgroup, so every endpoint that reads those
+relationships loads them up front with one of these option lists. Each
+selectinload level is a single IN query, so the query count per request is
+fixed no matter how many workouts, setgroups or sets are returned.
+"""
+from sqlalchemy.orm import contains_eager, selectinload
+
+from .models import Setgroup, Workout
+
+# List views and the health stats PDF: exercise counts (totals are columns)
+WORKOUT_SUMMARY_LOAD = (
+    selectinload(Workout.setgroups),
+)
+
+# Full workout responses, the workout PDF and client stats: every set plus exercise details
+WORKOUT_DETAIL_LOAD = (
+    selectinload(Workout.setgroups).options(
+        selectinload(Setgroup.sets),
+        selectinload(Setgroup.exercise),
+    ),
+)
+
+# Setgroups of one exercise queried with .join(Workout): the workout comes from the join
+SETGROUP_HISTORY_LOAD = (
+    contains_eager(Setgroup.workout),
+    selectinload(Setgroup.sets),
+)
@@ -0,0 +1,200 @@
+"""
+Workout Totals
+Setgroup and Workout store total_volume (sum of reps × weight), set_count
+and total_reps, so list views, stats, PDFs and progress read them without
+touching workout_sets.
+
+The columns are recomputed in SQL from the rows underneath them:
+
+    workout_sets -> setgroups.totals -> workouts.totals
+
+Session hooks collect every setgroup whose sets were added, changed or
+deleted (and every workout whose setgroups were), and recompute just those
+rows at the end of the same flush, so the ORM write paths (creating
+workouts, adding/updating/deleting sets and setgroups) need no extra code.
+Writers that bypass the ORM unit of work (Core inserts, bulk
+Query.update/delete on workout_sets) call refresh_totals() themselves.
+
+Databases created before the columns existed get them at startup
+(schema_upgrade.py), filled in by fill_totals(). Check stored totals against
+the sets, or recompute all of them, with:
+    python -m backend.app.workout_totals --check
+    python -m backend.app.workout_totals --backfill
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from .models import Setgroup, Workout, WorkoutSet
+from .schema_upgrade import add_backfill, add_missing_columns
+
+TOTAL_COLUMNS = ("total_volume", "set_count", "total_reps")
+
+_sets = WorkoutSet.__table__
+_setgroups = Setgroup.__table__
+_workouts = Workout.__table__
+
+
+def _setgroup_totals(setgroup_id):
+    """Correlated subqueries computing a setgroup's totals from its sets"""
+    aggregates = {
+        "total_volume": func.coalesce(func.sum(_sets.c.reps * _sets.c.weight), 0.0),
+        "set_count": func.count(_sets.c.id),
+        "total_reps": func.coalesce(func.sum(_sets.c.reps), 0),
+    }
+    return {
+        column: select(aggregate).where(_sets.c.setgroup_id == setgroup_id).scalar_subquery()
+        for column, aggregate in aggregates.items()
+    }
+
+
+def _workout_totals(workout_id):
+    """Correlated subqueries summing a workout's setgroup totals"""
+    return {
+        column: select(func.coalesce(func.sum(_setgroups.c[column]), 0)).where(_setgroups.c.workout_id == workout_id).scalar_subquery()
+        for column in TOTAL_COLUMNS
+    }
+
+
+def refresh_totals(
+    connection: Connection,
+    setgroup_ids: Iterable[int] = (),
+    workout_ids: Iterable[int] = ()
+) -> Set[int]:
+    """Recompute the given setgroups, then their workouts plus `workout_ids`; returns the workouts touched"""
+    setgroup_ids = set(setgroup_ids)
+    workout_ids = set(workout_ids)
+    if setgroup_ids:
+        connection.execute(
+            update(_setgroups).where(_setgroups.c.id.in_(setgroup_ids)).values(**_setgroup_totals(_setgroups.c.id))
+        )
+        workout_ids.update(connection.execute(
+            select(_setgroups.c.workout_id).where(_setgroups.c.id.in_(setgroup_ids))
+        ).scalars())
+    if workout_ids:
+        connection.execute(
+            update(_workouts).where(_workouts.c.id.in_(workout_ids)).values(**_workout_totals(_workouts.c.id))
+        )
+    return workout_ids
+
+
+# ---------------------------------------------------------------------------
+# Maintenance from session events
+# ---------------------------------------------------------------------------
+
+_DIRTY_KEY = "workout_totals_dirty"
+
+
+def key_values(obj, attr: str) -> Set[int]:
+    """Current and previous value of a foreign key (shared with the other session hooks)"""
+    history = inspect(obj).attrs[attr].history
+    return {v for v in (getattr(obj, attr), *history.deleted) if v is not None}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_totals(session: Session, flush_context):
+    setgroup_ids, workout_ids = session.info.setdefault(_DIRTY_KEY, (set(), set()))
+    for obj in session.new:
+        if isinstance(obj, WorkoutSet):
+            setgroup_ids.update(key_values(obj, "setgroup_id"))
+        elif isinstance(obj, Setgroup):
+            setgroup_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, WorkoutSet) and session.is_modified(obj):
+            setgroup_ids.update(key_values(obj, "setgroup_id"))
+        elif isinstance(obj, Setgroup) and inspect(obj).attrs.workout_id.history.has_changes():
+            workout_ids.update(key_values(obj, "workout_id"))
+    for obj in session.deleted:
+        if isinstance(obj, WorkoutSet):
+            setgroup_ids.update(key_values(obj, "setgroup_id"))
+        elif isinstance(obj, Setgroup):
+            workout_ids.update(key_values(obj, "workout_id"))
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _apply_changed_totals(session: Session, flush_context):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty or not (dirty[0] or dirty[1]):
+        return
+    setgroup_ids, workout_ids = dirty
+    workout_ids = refresh_totals(session.connection(), setgroup_ids, workout_ids)
+
+    # Loaded rows now hold stale totals; reload them on next access
+    for model, ids in ((Setgroup, setgroup_ids), (Workout, workout_ids)):
+        for pk in ids:
+            obj = session.identity_map.get(identity_key(model, pk))
+            if obj is not None:
+                session.expire(obj, TOTAL_COLUMNS)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_totals(session: Session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+# ---------------------------------------------------------------------------
+# Consistency check and backfill
+# ---------------------------------------------------------------------------
+
+def check_totals(db: Session, limit: Optional[int] = 100) -> Dict[str, Any]:
+    """Stored totals that disagree with the sets underneath them"""
+    mismatches: Dict[str, Any] = {}
+    for name, table, expected in (
+        ("setgroups", _setgroups, _setgroup_totals(_setgroups.c.id)),
+        ("workouts", _workouts, _workout_totals(_workouts.c.id)),
+    ):
+        computed = {column: expected[column].label(f"expected_{column}") for column in TOTAL_COLUMNS}
+        stmt = select(table.c.id, *(table.c[c] for c in TOTAL_COLUMNS), *computed.values())
+        rows = []
+        for row in db.execute(stmt):
+            diff = {
+                column: {"stored": row._mapping[column], "expected": row._mapping[f"expected_{column}"]}
+                for column in TOTAL_COLUMNS
+                if abs((row._mapping[column] or 0) - (row._mapping[f"expected_{column}"] or 0)) > 1e-6
+            }
+            if diff:
+                rows.append({"id": row.id, **diff})
+        mismatches[name] = rows[:limit] if limit else rows
+        mismatches[f"{name}_mismatched"] = len(rows)
+    return mismatches
+
+
+def fill_totals(connection: Connection) -> Dict[str, int]:
+    """Recompute every setgroup total, then every workout total from them"""
+    setgroups = connection.execute(update(_setgroups).values(**_setgroup_totals(_setgroups.c.id))).rowcount
+    workouts = connection.execute(update(_workouts).values(**_workout_totals(_workouts.c.id))).rowcount
+    return {"setgroups": setgroups, "workouts": workouts}
+
+
+add_backfill([f"{table.name}.{column}" for table in (_setgroups, _workouts) for column in TOTAL_COLUMNS], fill_totals)
+
+
+def backfill_totals(db: Session) -> Dict[str, Any]:
+    """Recompute every setgroup and workout total (adding missing columns first)"""
+    connection = db.connection()
+    added = add_missing_columns(connection)
+    counts = fill_totals(connection)
+    db.commit()
+    return {"columns_added": added, **counts}
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .database import SessionLocal, engine
+    from .models import Base
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if "--backfill" in sys.argv:
+            print(backfill_totals(db))
+        else:
+            report = check_totals(db)
+            print(report)
+            sys.exit(1 if report["setgroups_mismatched"] or report["workouts_mismatched"] else 0)
+    finally:
+        db.close()
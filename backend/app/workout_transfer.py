@@ -0,0 +1,278 @@
+"""
+Workout History Transfer
+Moves a client's full workout history (Workout -> Setgroup -> WorkoutSet)
+in and out as NDJSON, for clients changing trainers or arriving from other
+trackers. The first line is a header; every following line is one workout
+with its setgroups nested and each set as a compact array:
+
+    {"format": "fittrack-workouts", "version": 1, "set_columns": ["set_number", "reps", ...]}
+    {"title": "Push day", "completed_at": "...", "setgroups": [
+        {"exercise": "Bench Press", "order_index": 0, "sets": [[1, 8, 80.0, null, null, 8, true, null], ...]}]}
+
+Exercises travel by name, so histories move between installations; names
+missing on import are created. Export reads one joined, server-side cursor
+in workout order and never holds more than one workout in memory. Import
+parses line by line and bulk-inserts every WORKOUT_IMPORT_BATCH sets in a
+single transaction, so a failed import leaves nothing behind.
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .exercise_series import mark_client_changed
+from .models import Exercise, Setgroup, Workout, WorkoutSet
+from .personal_records import fold_workouts
+from .schemas.workout_tracking import WorkoutTransfer
+from .workout_totals import refresh_totals
+
+EXPORT_FORMAT = "fittrack-workouts"
+EXPORT_VERSION = 1
+# Sets written per bulk insert on import / rows fetched per round trip on export
+WORKOUT_IMPORT_BATCH = int(os.getenv("WORKOUT_IMPORT_BATCH", "5000"))
+WORKOUT_EXPORT_CHUNK = int(os.getenv("WORKOUT_EXPORT_CHUNK", "2000"))
+
+WORKOUT_FIELDS = ("title", "description", "scheduled_at", "completed_at", "duration_minutes", "notes", "timestamp")
+SETGROUP_FIELDS = ("order_index", "notes", "rest_seconds")
+SET_COLUMNS = ("set_number", "reps", "weight", "duration_seconds", "distance_meters", "rpe", "completed", "notes")
+DATETIME_FIELDS = ("scheduled_at", "completed_at", "timestamp")
+
+
+def _encode(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode()
+
+
+def export_lines(db: Session, client_id: int, chunk_size: int = WORKOUT_EXPORT_CHUNK) -> Iterator[bytes]:
+    """NDJSON lines for a client's history, streamed from one joined query"""
+    yield _line({
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "set_columns": list(SET_COLUMNS),
+    })
+
+    stmt = (
+        select(
+            Workout.id.label("workout_id"),
+            *(getattr(Workout, f).label(f"w_{f}") for f in WORKOUT_FIELDS),
+            Setgroup.id.label("setgroup_id"),
+            *(getattr(Setgroup, f).label(f"g_{f}") for f in SETGROUP_FIELDS),
+            Exercise.name.label("exercise"),
+            WorkoutSet.id.label("set_id"),
+            *(getattr(WorkoutSet, f).label(f"s_{f}") for f in SET_COLUMNS),
+        )
+        .select_from(Workout)
+        .outerjoin(Setgroup, Setgroup.workout_id == Workout.id)
+        .outerjoin(Exercise, Exercise.id == Setgroup.exercise_id)
+        .outerjoin(WorkoutSet, WorkoutSet.setgroup_id == Setgroup.id)
+        .where(Workout.client_id == client_id)
+        .order_by(Workout.id, Setgroup.order_index, Setgroup.id, WorkoutSet.set_number, WorkoutSet.id)
+    )
+    result = db.connection().execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+
+    workout: Optional[Dict[str, Any]] = None
+    workout_id = setgroup_id = None
+    for row in result:
+        if row.workout_id != workout_id:
+            if workout is not None:
+                yield _line(workout)
+            workout_id, setgroup_id = row.workout_id, None
+            workout = {f: _encode(getattr(row, f"w_{f}")) for f in WORKOUT_FIELDS}
+            workout["setgroups"] = []
+        if row.setgroup_id is not None and row.setgroup_id != setgroup_id:
+            setgroup_id = row.setgroup_id
+            setgroup = {"exercise": row.exercise, **{f: getattr(row, f"g_{f}") for f in SETGROUP_FIELDS}, "sets": []}
+            workout["setgroups"].append(setgroup)
+        if row.set_id is not None:
+            workout["setgroups"][-1]["sets"].append([getattr(row, f"s_{f}") for f in SET_COLUMNS])
+    if workout is not None:
+        yield _line(workout)
+
+
+def stream_export(client_id: int) -> Iterator[bytes]:
+    """export_lines() on its own session, for a StreamingResponse that outlives the request's session"""
+    db = SessionLocal()
+    try:
+        yield from export_lines(db, client_id)
+    finally:
+        db.close()
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+
+class _ImportBatch:
+    """Workouts parsed but not yet written"""
+
+    def __init__(self):
+        self.workouts: List[Dict[str, Any]] = []
+        self.sets = 0
+
+    def add(self, workout: Dict[str, Any]):
+        self.workouts.append(workout)
+        self.sets += sum(len(sg.get("sets") or []) for sg in workout.get("setgroups") or [])
+
+    def clear(self):
+        self.workouts = []
+        self.sets = 0
+
+
+def _exercise_ids(db: Session, names: Iterable[str], cache: Dict[str, int], stats: Dict[str, int]) -> None:
+    """Resolve exercise names into `cache` with one IN query, creating the missing ones"""
+    wanted = {n for n in names if n not in cache}
+    if not wanted:
+        return
+    cache.update({name: id for name, id in db.execute(select(Exercise.name, Exercise.id).where(Exercise.name.in_(wanted)))})
+    missing = sorted(wanted - cache.keys())
+    if missing:
+        created = db.execute(
+            insert(Exercise).returning(Exercise.name, Exercise.id, sort_by_parameter_order=True),
+            [{"name": name, "created_at": datetime.utcnow()} for name in missing]
+        )
+        cache.update({name: id for name, id in created})
+        stats["exercises_created"] += len(missing)
+
+
+def _write_batch(db: Session, batch: _ImportBatch, client_id: int, trainer_id: Optional[int], exercises: Dict[str, int], stats: Dict[str, int]):
+    if not batch.workouts:
+        return
+    now = datetime.utcnow()
+    _exercise_ids(db, (sg["exercise"] for w in batch.workouts for sg in w["setgroups"]), exercises, stats)
+
+    workout_ids = db.scalars(
+        insert(Workout).returning(Workout.id, sort_by_parameter_order=True),
+        [
+            {
+                **{f: w.get(f) for f in WORKOUT_FIELDS},
+                "client_id": client_id,
+                "trainer_id": trainer_id,
+                "timestamp": w.get("timestamp") or now,
+                "created_at": now,
+            }
+            for w in batch.workouts
+        ]
+    ).all()
+
+    setgroups = [(workout_id, sg) for workout_id, w in zip(workout_ids, batch.workouts) for sg in w["setgroups"]]
+    setgroup_ids = db.scalars(
+        insert(Setgroup).returning(Setgroup.id, sort_by_parameter_order=True),
+        [
+            {
+                **{f: sg.get(f) for f in SETGROUP_FIELDS},
+                "order_index": sg.get("order_index") or 0,
+                "workout_id": workout_id,
+                "exercise_id": exercises[sg["exercise"]],
+                "created_at": now,
+            }
+            for workout_id, sg in setgroups
+        ]
+    ).all() if setgroups else []
+
+    sets = [
+        {**dict(zip(SET_COLUMNS, values)), "setgroup_id": setgroup_id, "created_at": now}
+        for setgroup_id, (_, sg) in zip(setgroup_ids, setgroups)
+        for values in sg["sets"]
+    ]
+    if sets:
+        db.connection().execute(insert(WorkoutSet), sets)
+    # Core inserts skip the session hooks that maintain the stored totals and records
+    refresh_totals(db.connection(), setgroup_ids, workout_ids)
+    fold_workouts(db.connection(), workout_ids)
+    mark_client_changed(db, client_id)
+
+    stats["workouts"] += len(workout_ids)
+    stats["setgroups"] += len(setgroup_ids)
+    stats["sets"] += len(sets)
+    batch.clear()
+
+
+def _with_set_mappings(setgroup: Any, set_columns: List[str]) -> Any:
+    """Array-form sets as mappings (named by the header's set_columns), ready for validation"""
+    if not isinstance(setgroup, dict) or not isinstance(setgroup.get("sets"), list):
+        return setgroup
+    sets = []
+    for values in setgroup["sets"]:
+        if isinstance(values, list):
+            values = dict(zip(set_columns, values))
+        if isinstance(values, dict) and values.get("completed") is None:
+            values = {k: v for k, v in values.items() if k != "completed"}
+        sets.append(values)
+    return {**setgroup, "sets": sets}
+
+
+def _parse_workout(record: Dict[str, Any], set_columns: List[str]) -> Dict[str, Any]:
+    """Validate one workout line (WorkoutTransfer) into insertable values; raises ValidationError"""
+    if isinstance(record.get("setgroups"), list):
+        record = {**record, "setgroups": [_with_set_mappings(sg, set_columns) for sg in record["setgroups"]]}
+    workout = WorkoutTransfer.model_validate(record)
+    values = {f: getattr(workout, f) for f in WORKOUT_FIELDS}
+    for f in DATETIME_FIELDS:
+        values[f] = _naive_utc(values[f])
+    values["setgroups"] = [
+        {
+            "exercise": sg.exercise,
+            **{f: getattr(sg, f) for f in SETGROUP_FIELDS},
+            "sets": [[getattr(s, c) for c in SET_COLUMNS] for s in sg.sets],
+        }
+        for sg in workout.setgroups
+    ]
+    return values
+
+
+def _error_detail(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()[:3])
+    return str(e)
+
+
+def import_lines(
+    db: Session,
+    lines: Iterable[bytes],
+    client_id: int,
+    trainer_id: Optional[int] = None,
+    batch_size: int = WORKOUT_IMPORT_BATCH
+) -> Dict[str, int]:
+    """Bulk-insert an NDJSON export into `client_id`'s history in one transaction; 400 names the bad line"""
+    stats = {"workouts": 0, "setgroups": 0, "sets": 0, "exercises_created": 0}
+    exercises: Dict[str, int] = {}
+    set_columns = list(SET_COLUMNS)
+    batch = _ImportBatch()
+    number = 0
+    try:
+        for number, raw in enumerate(lines, start=1):
+            if not raw.strip():
+                continue
+            record = json.loads(raw)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            if "format" in record:
+                if record["format"] != EXPORT_FORMAT or record.get("version", 1) > EXPORT_VERSION:
+                    raise ValueError(f"unsupported format {record['format']!r} version {record.get('version')}")
+                set_columns = record.get("set_columns") or set_columns
+                continue
+            batch.add(_parse_workout(record, set_columns))
+            if batch.sets >= batch_size:
+                _write_batch(db, batch, client_id, trainer_id, exercises, stats)
+        _write_batch(db, batch, client_id, trainer_id, exercises, stats)
+    except (ValueError, KeyError, TypeError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Invalid workout record on line {number}: {_error_detail(e)}")
+    except (SQLAlchemyError, OverflowError) as e:
+        # Values that validated but the database still refused (e.g. integers out of range)
+        db.rollback()
+        print(f"Workout import failed writing the batch ending on line {number}: {e}")
+        raise HTTPException(status_code=400, detail=f"Could not store the workouts up to line {number}")
+    db.commit()
+    return stats
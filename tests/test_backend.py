@@ -175,3 +175,1620 @@ def test_share_profile_and_public_view():
     body = resp3.json()
     assert 'client' in body and 'measurements' in body and 'achievements' in body
 
+
+
+def test_exercisedb_mirror_filters_locally(monkeypatch):
+    import asyncio
+    from backend.app.exercisedb_service import get_exercisedb_service
+    from backend.app.exercisedb_catalogue import sync_exercisedb_catalogue, get_exercise_catalogue
+
+    upstream = [
+        {"exerciseId": "ex1", "name": "Barbell Bench Press", "bodyParts": ["chest"], "equipments": ["barbell"],
+         "targetMuscles": ["pectoralis major"], "secondaryMuscles": ["triceps"]},
+        {"exerciseId": "ex2", "name": "Push-up", "bodyParts": ["chest"], "equipments": ["body weight"],
+         "targetMuscles": ["pectoralis major"], "secondaryMuscles": ["triceps"]},
+        {"exerciseId": "ex3", "name": "Barbell Curl", "bodyParts": ["upper arms"], "equipments": ["barbell"],
+         "targetMuscles": ["biceps"], "secondaryMuscles": []},
+    ]
+
+    async def fake_page(offset=0, limit=100):
+        return {"success": True, "metadata": {"totalExercises": len(upstream)}, "data": upstream[offset:offset + limit]}
+
+    service = get_exercisedb_service()
+    monkeypatch.setattr(service, "fetch_upstream_page", fake_page)
+    result = asyncio.run(sync_exercisedb_catalogue(full=True))
+    assert result["inserted"] == 3
+
+    # Re-syncing unchanged data rewrites nothing
+    assert asyncio.run(sync_exercisedb_catalogue())["updated"] == 0
+    get_exercise_catalogue().reload()
+
+    resp = client.get('/exercisedb/exercises/filter', params={'equipment': 'barbell', 'body_parts': 'chest'})
+    assert resp.status_code == 200
+    assert [e['exerciseId'] for e in resp.json()['data']] == ['ex1']
+
+    resp2 = client.get('/exercisedb/exercises/search', params={'q': 'bench pres'})
+    assert resp2.json()['data'][0]['exerciseId'] == 'ex1'
+
+    resp3 = client.get('/exercisedb/metadata/equipments')
+    assert resp3.json()['data'] == ['barbell', 'body weight']
+
+    resp4 = client.get('/exercisedb/muscles/triceps/exercises', params={'include_secondary': True})
+    assert {e['exerciseId'] for e in resp4.json()['data']} == {'ex1', 'ex2'}
+
+    # A page that fails to commit leaves the in-memory indexes untouched
+    upstream.append({"exerciseId": "ex4", "name": "Goblet Squat", "bodyParts": ["upper legs"], "equipments": ["kettlebell"],
+                     "targetMuscles": ["quads"], "secondaryMuscles": []})
+
+    def failing_insert(self, *args, **kwargs):
+        raise RuntimeError("disk full")
+
+    from sqlalchemy.orm import Session
+    with monkeypatch.context() as m:
+        m.setattr(Session, "bulk_insert_mappings", failing_insert)
+        try:
+            asyncio.run(sync_exercisedb_catalogue())
+            assert False, "expected the sync to fail"
+        except RuntimeError:
+            pass
+    assert get_exercise_catalogue().get("ex4") is None
+
+    # Triggering a sync needs a trainer
+    assert client.post('/exercisedb/sync').status_code == 401
+
+
+def test_async_cached_single_flight_and_ttl():
+    import asyncio
+    from backend.app.utils.cache import async_cached
+
+    calls = []
+
+    class Upstream:
+        @async_cached(ttl=60, maxsize=2)
+        async def fetch(self, key, params=None):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return {"key": key}
+
+    async def run():
+        # 100 concurrent misses across two instances -> one upstream call
+        results = await asyncio.gather(*[Upstream().fetch("a", params={"x": 1}) for _ in range(100)])
+        assert all(r == {"key": "a"} for r in results)
+        assert calls == ["a"]
+        await Upstream().fetch("a", {"x": 1})  # positional/keyword spellings share a key
+        assert calls == ["a"]
+        await Upstream().fetch("b")
+        await Upstream().fetch("c")  # evicts "a" (maxsize=2)
+        await Upstream().fetch("a", params={"x": 1})
+        assert calls == ["a", "b", "c", "a"]
+
+    asyncio.run(run())
+    info = Upstream.fetch.cache_info()
+    assert info["misses"] == 4 and info["coalesced"] == 99 and info["hits"] == 1
+    assert info["evictions"] == 2
+
+
+def test_versioned_lru_owner_invalidation_and_stale_puts():
+    from backend.app.utils.cache import VersionedLRU
+
+    cache = VersionedLRU(ttl=60, maxsize=2)
+    version = cache.version()
+    cache.put('a1', 'alice', 1, version)
+    cache.put('b1', 'bob', 2, version)
+    assert (cache.get('a1'), cache.get('b1')) == (1, 2)
+
+    # A value built before its owner changed is refused; other owners are unaffected
+    stale = cache.version()
+    cache.invalidate_owner('alice')
+    assert cache.get('a1') is None and cache.get('b1') == 2
+    cache.put('a1', 'alice', 3, stale)
+    cache.put('b2', 'bob', 4, stale)
+    assert cache.get('a1') is None and cache.get('b2') == 4
+
+    cache.put('a1', 'alice', 5, cache.version())  # evicts b1, the least recently used
+    assert cache.get('b1') is None and cache.get('a1') == 5
+    cache.put('a2', 'alice', 6, cache.version(), ttl=0)  # already expired: not stored
+    assert cache.get('a2') is None
+    cache.invalidate_owner('bob')
+    assert cache.stats()['size'] == 1 and cache.stats()['invalidations'] == 2
+
+
+def test_singleflight_coalesces_concurrent_requests():
+    import asyncio
+    from backend.app.utils.singleflight import SingleFlight, request_key
+
+    group = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"fdcId": 123}
+
+    async def run():
+        key = request_key("GET", "https://api.nal.usda.gov/fdc/v1/food/123", {"api_key": "k"})
+        results = await asyncio.gather(*[group.do(key, fetch) for _ in range(10)])
+        assert all(r is results[0] for r in results)
+        # Once settled, the next request goes upstream again
+        await group.do(key, fetch)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert group.stats() == {"executed": 2, "coalesced": 9, "failed": 0, "in_flight": 0}
+
+
+def test_singleflight_survives_cancelling_the_first_caller():
+    import asyncio
+    from backend.app.utils.singleflight import SingleFlight
+
+    group = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"fdcId": 456}
+
+    async def run():
+        leader = asyncio.create_task(group.do("food", fetch))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(group.do("food", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()  # e.g. the first client disconnected
+        results = await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        assert all(r == {"fdcId": 456} for r in results)
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    assert group.stats() == {"executed": 1, "coalesced": 3, "failed": 0, "in_flight": 0}
+
+
+def test_ai_workout_plan_stream_and_cache(monkeypatch):
+    import json
+    from backend.app.ai_service import get_ai_service, AIFitnessService
+
+    plan = {
+        "weeklyPlan": [{"day": "Day 1", "focus": "Strength",
+                        "exercises": [{"name": "Push Up", "sets": 3, "reps": "10", "rest": "60 seconds"}]}],
+        "nutritionAdvice": "Eat well",
+    }
+    text = json.dumps(plan)
+    calls = []
+
+    class FakeStream:
+        async def __aenter__(self):
+            calls.append("stream")
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        @property
+        async def text_stream(self):
+            for i in range(0, len(text), 20):
+                yield text[i:i + 20]
+
+    class FakeMessages:
+        async def create(self, **kwargs):
+            calls.append("create")
+            raise AssertionError("expected a cache hit")
+
+        def stream(self, **kwargs):
+            return FakeStream()
+
+    class FakeClient:
+        messages = FakeMessages()
+
+    service = get_ai_service()
+    monkeypatch.setattr(service, "use_ai", True)
+    monkeypatch.setattr(service, "client", FakeClient(), raising=False)
+    AIFitnessService._ai_generate_workout.cache_clear()
+
+    resp = client.post('/clients', json={'name': 'Stream User', 'email': 'stream@example.com'})
+    client_id = resp.json()['id']
+    body = {'client_id': client_id, 'equipment': ['Dumbbells', 'bodyweight'], 'body_part': 'Chest'}
+
+    resp2 = client.post('/ai/workout-plan/stream', json=body)
+    assert resp2.status_code == 200
+    assert resp2.headers['content-type'].startswith('text/event-stream')
+    events = [
+        (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+        for block in resp2.text.strip().split('\n\n')
+    ]
+    assert events[0][0] == 'token'
+    assert ''.join(data['text'] for name, data in events if name == 'token') == text
+    assert events[-1][0] == 'plan'
+    assert events[-1][1]['generated_by'] == 'AI' and events[-1][1]['cached'] is False
+
+    # Same request with cosmetic differences is served from the plan cache
+    body.update(equipment=['bodyweight', ' dumbbells'], body_part='chest ')
+    resp3 = client.post('/ai/workout-plan', json=body)
+    assert resp3.status_code == 200
+    assert resp3.json()['workout_plan']['weeklyPlan'][0]['exercises'][0]['name'] == 'Push Up'
+    assert calls == ['stream']
+    AIFitnessService._ai_generate_workout.cache_clear()
+
+
+def test_ai_routes_report_rule_based_fallback(monkeypatch):
+    from backend.app.ai_service import get_ai_service, AIFitnessService
+
+    class FailingMessages:
+        async def create(self, **kwargs):
+            raise RuntimeError("model unavailable")
+
+    class FailingClient:
+        messages = FailingMessages()
+
+    service = get_ai_service()
+    monkeypatch.setattr(service, "use_ai", True)
+    monkeypatch.setattr(service, "client", FailingClient(), raising=False)
+    AIFitnessService._ai_generate_workout.cache_clear()
+    AIFitnessService._ai_generate_meal_plan.cache_clear()
+
+    resp = client.post('/clients', json={'name': 'Fallback User', 'email': 'fallback@example.com'})
+    client_id = resp.json()['id']
+
+    # AI is configured but failed, so the plans came from the rule-based planner
+    resp2 = client.post('/ai/workout-plan', json={'client_id': client_id, 'body_part': 'legs'})
+    assert resp2.status_code == 200 and resp2.json()['generated_by'] == 'Rule-based'
+    resp3 = client.post('/ai/meal-plan', json={'client_id': client_id})
+    assert resp3.status_code == 200 and resp3.json()['generated_by'] == 'Rule-based'
+    resp4 = client.post('/ai/progress-report', json={'client_id': client_id})
+    assert resp4.status_code == 200 and resp4.json()['generated_by'] == 'Rule-based'
+
+
+def test_ai_scheduler_priority_fairness_and_shedding():
+    import asyncio
+    from backend.app.ai_service import AIRequestScheduler, AIQueueTimeout, INTERACTIVE, BATCH
+
+    scheduler = AIRequestScheduler(max_concurrency=1, timeouts={INTERACTIVE: 5, BATCH: 5})
+    order = []
+
+    async def call(tenant, priority, label):
+        async with scheduler.slot(tenant, priority):
+            order.append(label)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("t0", INTERACTIVE):
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(call("t1", BATCH, "b1"))]
+        tasks += [asyncio.create_task(call("t1", INTERACTIVE, f"t1-{i}")) for i in range(3)]
+        tasks += [asyncio.create_task(call("t2", INTERACTIVE, "t2-0"))]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queue_depth"] == {"interactive": 4, "batch": 1}
+        gate.set()
+        await asyncio.gather(holder, *tasks)
+
+        # Interactive before batch; trainers alternate instead of t1 draining first
+        assert order == ["t1-0", "t2-0", "t1-1", "t1-2", "b1"]
+
+        # A request that can't get a slot before its deadline is shed
+        scheduler.timeouts[INTERACTIVE] = 0.01
+        gate.clear()
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        try:
+            await call("t3", INTERACTIVE, "late")
+            assert False, "expected AIQueueTimeout"
+        except AIQueueTimeout:
+            pass
+        gate.set()
+        await holder
+
+    asyncio.run(run())
+    stats = scheduler.stats()
+    assert stats["shed"] == 1 and stats["active"] == 0
+    assert stats["queue_depth"] == {"interactive": 0, "batch": 0}
+    assert "late" not in order
+
+
+def test_ai_batch_workout_plans_job():
+    ids = []
+    for i in range(3):
+        resp = client.post('/clients', json={'name': f'Roster {i}', 'email': f'roster{i}@example.com'})
+        ids.append(resp.json()['id'])
+    client.post(f'/clients/{ids[0]}/measurements', json={'weight': 80})
+
+    resp = client.post('/ai/workout-plans/batch', json={'client_ids': ids + [999999], 'body_part': 'chest'})
+    assert resp.status_code == 202
+    data = resp.json()
+    assert data['total'] == 3 and data['missing_client_ids'] == [999999]
+
+    # TestClient runs background tasks before returning
+    job = client.get(data['status_url']).json()
+    assert job['status'] == 'completed' and job['progress'] == 1.0
+    assert job['completed'] == 3 and job['failed'] == 0
+    assert job['workouts_created'] == 3  # one focused day per client
+    assert all(r['generated_by'] == 'Rule-based' for r in job['results'].values())
+
+    assert client.get('/ai/jobs/unknown').status_code == 404
+
+
+def test_streaming_and_resumable_uploads(tmp_path, monkeypatch):
+    import asyncio
+    import hashlib
+    from io import BytesIO
+    from fastapi import HTTPException, UploadFile
+    from backend.app.utils import uploads
+
+    monkeypatch.setattr(uploads, "RESUMABLE_DIR", str(tmp_path / "incoming"))
+    data = os.urandom(300_000)
+    digest = hashlib.sha256(data).hexdigest()
+
+    async def body(*parts):
+        for part in parts:
+            yield part
+
+    async def run():
+        # Plain upload: chunked copy, stored under its hash, limit enforced while streaming
+        stored = await uploads.save_upload(UploadFile(BytesIO(data), filename="clip.MP4"), str(tmp_path), 10**6, chunk_size=4096)
+        assert stored.sha256 == digest and stored.filename.endswith(".mp4") and stored.size == len(data)
+        assert (tmp_path / stored.filename).read_bytes() == data
+        try:
+            await uploads.save_upload(UploadFile(BytesIO(data), filename="big.mp4"), str(tmp_path), 1000)
+            assert False, "expected 413"
+        except HTTPException as e:
+            assert e.status_code == 413
+        assert not [p for p in os.listdir(tmp_path) if p.endswith(".part")]
+
+        # Resumable upload: out-of-order chunk rejected, interrupted chunk rolled back
+        session = uploads.ResumableUpload.create(1, "long.mp4", len(data), "video/mp4", 10**6)
+        assert await session.append(0, body(data[:100_000])) == 100_000
+        try:
+            await session.append(0, body(data[:10]))
+            assert False, "expected 409"
+        except HTTPException as e:
+            assert e.status_code == 409
+
+        async def broken():
+            yield data[100_000:150_000]
+            raise ConnectionError("client went away")
+
+        try:
+            await session.append(100_000, broken())
+        except ConnectionError:
+            pass
+        resumed = uploads.ResumableUpload.load(session.upload_id, owner_id=1)
+        assert resumed.status()["offset"] == 100_000
+        await resumed.append(100_000, body(data[100_000:200_000], data[200_000:]))
+        final = await resumed.complete(str(tmp_path / "videos"))
+        assert final.sha256 == digest and (tmp_path / "videos" / final.filename).read_bytes() == data
+        try:
+            uploads.ResumableUpload.load(session.upload_id, owner_id=1)
+            assert False, "session should be gone"
+        except HTTPException as e:
+            assert e.status_code == 404
+
+    asyncio.run(run())
+
+
+def test_video_rendition_ladder_and_master_playlist():
+    from backend.app.video_processing import rendition_ladder, master_playlist
+
+    assert [r[0] for r in rendition_ladder(1080)] == [1080, 720, 480, 360]
+    assert [r[0] for r in rendition_ladder(720)] == [720, 480, 360]
+    assert [r[0] for r in rendition_ladder(240)] == [360]  # tiny sources still get one rung
+    assert [r[0] for r in rendition_ladder(None)] == [360]
+
+    playlist = master_playlist(rendition_ladder(720), 1280, 720)
+    assert playlist.startswith("#EXTM3U")
+    assert "#EXT-X-STREAM-INF:BANDWIDTH=2928000,RESOLUTION=1280x720\n720p/index.m3u8" in playlist
+    assert "RESOLUTION=854x480" in playlist
+
+
+def test_video_processing_queue_records_ready_and_failed_jobs(monkeypatch, tmp_path):
+    import asyncio
+    import json
+    from backend.app import video_processing
+    from backend.app.database import SessionLocal
+    from backend.app.models import Trainer, WorkoutCategory, WorkoutVideo
+
+    db = SessionLocal()
+    try:
+        trainer = Trainer(name='Video Queue Coach', email='videoqueuecoach@example.com', password_hash='x')
+        category = WorkoutCategory(name='Video Queue')
+        db.add_all([trainer, category])
+        db.commit()
+        videos = [
+            WorkoutVideo(trainer_id=trainer.id, category_id=category.id, title=title, video_url=f'/uploads/workout_videos/{title}.mp4')
+            for title in ('good', 'broken')
+        ]
+        db.add_all(videos)
+        db.commit()
+        good_id, broken_id = [v.id for v in videos]
+    finally:
+        db.close()
+
+    # ffprobe/ffmpeg stand-in: probes succeed, encoders write their output file, the broken upload fails to transcode
+    commands = []
+
+    async def fake_run(*cmd):
+        commands.append(cmd)
+        if cmd[0] == 'ffprobe':
+            return json.dumps({'format': {'duration': '30.0', 'bit_rate': '900000'},
+                               'streams': [{'codec_type': 'video', 'codec_name': 'h264', 'width': 640, 'height': 360}]}).encode()
+        if 'broken.mp4' in cmd[cmd.index('-i') + 1] and 'hls' in cmd:
+            raise RuntimeError('ffmpeg failed: Invalid data found when processing input')
+        Path(cmd[-1]).parent.mkdir(parents=True, exist_ok=True)
+        Path(cmd[-1]).write_bytes(b'')
+        return b''
+
+    monkeypatch.setattr(video_processing, '_run', fake_run)
+    for name in ('THUMBNAIL_DIR', 'PREVIEW_DIR', 'HLS_DIR'):
+        monkeypatch.setattr(video_processing, name, str(tmp_path / name.lower()))
+
+    queue = video_processing.VideoProcessingQueue(concurrency=2)
+
+    async def run():
+        queue.enqueue(good_id)
+        queue.enqueue(broken_id)
+        queue.enqueue(good_id)  # already queued: not processed twice
+        assert queue.stats()['queued'] == 2
+        await queue._queue.join()
+        assert queue.stats() == {'concurrency': 2, 'queued': 0, 'processing': []}
+
+    asyncio.run(run())
+    assert sum(1 for cmd in commands if cmd[0] == 'ffprobe') == 2
+
+    db = SessionLocal()
+    try:
+        good, broken = db.get(WorkoutVideo, good_id), db.get(WorkoutVideo, broken_id)
+        assert (good.status, good.processing_error, good.height, good.video_codec) == ('ready', None, 360, 'h264')
+        assert good.hls_url == f'/uploads/hls/{good_id}/master.m3u8' and good.processed_at is not None
+        assert (tmp_path / 'hls_dir' / str(good_id) / 'master.m3u8').exists()
+        # The failure is recorded, along with the stages that did finish
+        assert broken.status == 'failed' and 'Invalid data found' in broken.processing_error
+        assert broken.thumbnail_url == f'/uploads/thumbnails/{broken_id}.jpg' and broken.hls_url is None
+    finally:
+        db.close()
+
+
+def test_media_range_etag_and_conditional_get():
+    import hashlib
+
+    data = os.urandom(10_000)
+    digest = hashlib.sha256(data).hexdigest()
+    media_dir = Path('uploads') / 'measurement_photos'
+    media_dir.mkdir(parents=True, exist_ok=True)
+    path = media_dir / f'{digest}.jpg'
+    path.write_bytes(data)
+    try:
+        url = f'/uploads/measurement_photos/{digest}.jpg'
+        resp = client.get(url)
+        assert resp.status_code == 200 and resp.content == data
+        assert resp.headers['etag'] == f'"{digest}"'
+        assert 'immutable' in resp.headers['cache-control']
+
+        resp2 = client.get(url, headers={'If-None-Match': resp.headers['etag']})
+        assert resp2.status_code == 304 and resp2.content == b''
+
+        resp3 = client.get(url, headers={'Range': 'bytes=100-199'})
+        assert resp3.status_code == 206
+        assert resp3.headers['content-range'] == f'bytes 100-199/{len(data)}'
+        assert resp3.content == data[100:200]
+    finally:
+        path.unlink()
+
+
+def test_progress_photo_variants_strip_exif(tmp_path):
+    from PIL import Image
+    from backend.app.image_pipeline import render_variants, photo_urls
+
+    source = tmp_path / 'phone.jpg'
+    exif = Image.Exif()
+    exif[0x0112] = 6  # orientation: rotate 90 degrees
+    exif[0x010F] = 'PhoneMaker'
+    Image.new('RGB', (4000, 3000), (200, 80, 40)).save(source, 'JPEG', exif=exif.tobytes())
+
+    variants = render_variants(str(source), str(tmp_path), '/media')
+    assert set(variants) == {'thumb', 'medium', 'full'}
+    # orientation applied to the pixels, longest edge capped per size
+    assert (variants['thumb']['width'], variants['thumb']['height']) == (180, 240)
+    assert (variants['full']['width'], variants['full']['height']) == (1536, 2048)
+    for entry in variants.values():
+        for fmt in ('webp', 'jpeg'):
+            with Image.open(tmp_path / entry[fmt][len('/media/'):]) as out:
+                assert not out.getexif()
+    assert os.path.getsize(tmp_path / variants['thumb']['webp'][len('/media/'):]) < os.path.getsize(source) / 10
+
+    assert photo_urls(['/orig.jpg'], [variants], 'thumb', 'webp') == [variants['thumb']['webp']]
+    assert photo_urls(['/legacy.jpg'], None, 'medium') == ['/legacy.jpg']
+
+
+
+def test_measurement_photo_edits_and_client_delete_release_blobs():
+    from backend.app.database import SessionLocal
+    from backend.app.models import Trainer, Client as ClientModel, Measurement, MediaBlob
+    from backend.app.media_store import acquire, blob_url, gc_sweep, write_blob_bytes
+    from backend.app.utils.auth import create_access_token
+
+    db = SessionLocal()
+    try:
+        trainer = Trainer(name='Photo Coach', email='photocoach@example.com', password_hash='x')
+        db.add(trainer)
+        db.commit()
+        member = ClientModel(name='Photo Member', email='photomember@example.com', trainer_id=trainer.id)
+        db.add(member)
+        db.commit()
+        trainer_id, client_id = trainer.id, member.id
+
+        # Two processed photos, each with every size/format stored as its own blob
+        variants = []
+        for photo in range(2):
+            entry = {}
+            for size in ('thumb', 'medium', 'full'):
+                entry[size] = {}
+                for fmt, ext in (('webp', '.webp'), ('jpeg', '.jpg')):
+                    url = blob_url(write_blob_bytes(os.urandom(64), ext), ext)
+                    acquire(db, url)
+                    entry[size][fmt] = url
+            variants.append(entry)
+        photos = [v['full']['jpeg'] for v in variants]
+        measurement = Measurement(client_id=client_id, weight=80, photos=photos, photo_variants=variants)
+        db.add(measurement)
+        db.commit()
+        measurement_id = measurement.id
+    finally:
+        db.close()
+    auth = {'Authorization': f'Bearer {create_access_token({"sub": str(trainer_id)})}'}
+    url = f'/clients/{client_id}/measurements/{measurement_id}'
+
+    def refcounts(entry):
+        db = SessionLocal()
+        try:
+            shas = [u.rsplit('/', 1)[-1].split('.')[0] for size in entry.values() for u in size.values()]
+            return {b.refcount for b in db.query(MediaBlob).filter(MediaBlob.sha256.in_(shas))}
+        finally:
+            db.close()
+
+    # Linking a URL that is not one of the measurement's photos is refused
+    assert client.put(url, json={'photos': ['/uploads/blobs/elsewhere.jpg']}, headers=auth).status_code == 400
+
+    # Keeping the second photo (named by its thumbnail) drops the first and its variants follow
+    resp = client.put(url, json={'photos': [variants[1]['thumb']['webp']], 'weight': 79}, headers=auth)
+    assert resp.status_code == 200
+    assert resp.json()['photos'] == [photos[1]] and resp.json()['weight'] == 79
+    thumbs = client.get(f'{url}?photo_size=thumb&photo_format=webp', headers=auth).json()['photos']
+    assert thumbs == [variants[1]['thumb']['webp']]
+    assert refcounts(variants[0]) == {0} and refcounts(variants[1]) == {1}
+
+    # Deleting the client releases what its measurements still referenced
+    assert client.delete(f'/clients/{client_id}').status_code == 200
+    assert refcounts(variants[1]) == {0}
+
+    # ...so a sweep collects every one of them
+    db = SessionLocal()
+    try:
+        assert gc_sweep(db, grace_seconds=0)['deleted_blobs'] == 12
+    finally:
+        db.close()
+    assert refcounts(variants[0]) == refcounts(variants[1]) == set()
+
+
+def test_media_store_dedupes_and_collects_unreferenced_blobs():
+    import hashlib
+    import time
+    from datetime import datetime, timedelta
+    from backend.app.database import SessionLocal
+    from backend.app.models import MediaBlob
+    from backend.app.media_store import adopt_file, acquire, release, gc_sweep, blob_path
+    from backend.app.utils.uploads import StoredFile, STAGING_DIR
+
+    data = os.urandom(2048)
+    digest = hashlib.sha256(data).hexdigest()
+
+    def stage(name):
+        os.makedirs(STAGING_DIR, exist_ok=True)
+        path = os.path.join(STAGING_DIR, name)
+        Path(path).write_bytes(data)
+        return StoredFile(path, name, len(data), digest)
+
+    db = SessionLocal()
+    try:
+        # Two uploads of the same bytes share one file and one row
+        url = adopt_file(stage('a.png'))
+        assert adopt_file(stage('b.PNG')) == url
+        assert url == f'/uploads/blobs/{digest[:2]}/{digest[2:4]}/{digest}.png'
+        acquire(db, url)
+        acquire(db, url)
+        acquire(db, '/static/legacy.png')  # non-blob URLs are ignored
+        db.commit()
+        assert db.get(MediaBlob, digest).refcount == 2
+
+        release(db, url)
+        db.commit()
+        assert gc_sweep(db, grace_seconds=0)['deleted_blobs'] == 0
+        assert os.path.exists(blob_path(digest, '.png'))
+
+        release(db, url)
+        db.commit()
+        result = gc_sweep(db, grace_seconds=0)
+        assert result['deleted_blobs'] == 1 and result['freed_bytes'] >= len(data)
+        assert not os.path.exists(blob_path(digest, '.png'))
+        assert db.get(MediaBlob, digest) is None
+
+        # Re-uploaded while unreferenced: the expired row goes, the file waits out a new grace period
+        url = adopt_file(stage('c.png'))
+        acquire(db, url)
+        db.commit()
+        path = blob_path(digest, '.png')
+        os.utime(path, (time.time() - 7200, time.time() - 7200))
+        release(db, url)
+        db.query(MediaBlob).filter(MediaBlob.sha256 == digest).update({MediaBlob.released_at: datetime.utcnow() - timedelta(hours=2)})
+        db.commit()
+        assert adopt_file(stage('d.png')) == url
+        result = gc_sweep(db, grace_seconds=3600)
+        assert result['deleted_blobs'] == 1 and result['orphaned_files'] == 0
+        assert os.path.exists(path)
+        acquire(db, url)
+        db.commit()
+        assert db.get(MediaBlob, digest).refcount == 1
+        release(db, url)
+        db.commit()
+        gc_sweep(db, grace_seconds=0)
+        assert not os.path.exists(path)
+    finally:
+        db.close()
+
+
+def test_avatar_sizes_etag_and_cache():
+    from io import BytesIO
+    from PIL import Image
+    from backend.app.avatar_service import get_avatar_cache
+
+    resp = client.post('/clients', json={'name': 'Cached Avatar', 'email': 'cachedavatar@example.com'})
+    client_id = resp.json()['id']
+    client.post(f'/clients/{client_id}/weights', json={'weight': 72.2})
+
+    cache = get_avatar_cache()
+    cache.clear()
+    resp = client.get(f'/clients/{client_id}/avatar?size=128&format=webp')
+    assert resp.status_code == 200
+    assert resp.headers['content-type'] == 'image/webp'
+    assert Image.open(BytesIO(resp.content)).size == (128, 128)
+    etag = resp.headers['etag']
+
+    # Same inputs: served from memory with the same ETag
+    hits = cache.stats()['hits']
+    again = client.get(f'/clients/{client_id}/avatar?size=128&format=webp')
+    assert again.content == resp.content and again.headers['etag'] == etag
+    assert cache.stats()['hits'] == hits + 1
+
+    # Revalidation is answered without rendering
+    not_modified = client.get(f'/clients/{client_id}/avatar?size=128&format=webp', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+
+    # A weight change that rounds to a new kilogram changes the avatar
+    client.post(f'/clients/{client_id}/weights', json={'weight': 80})
+    changed = client.get(f'/clients/{client_id}/avatar?size=128&format=webp', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['etag'] != etag
+
+    assert client.get(f'/clients/{client_id}/avatar?size=4096').status_code == 422
+
+
+def test_avatar_disk_tier_evicts_least_recently_used(tmp_path):
+    import time
+    from backend.app.avatar_service import AvatarCache
+
+    cache = AvatarCache(maxsize=1, directory=str(tmp_path), disk_maxsize=2)
+    cache.get('Ann', 70, size=64)
+    cache.get('Bob', 70, size=64)
+    a_path = tmp_path / f"{cache.etag('Ann', 70, 64)}.png"
+    b_path = tmp_path / f"{cache.etag('Bob', 70, 64)}.png"
+    for path in (a_path, b_path):
+        os.utime(path, (time.time() - 60, time.time() - 60))
+
+    # Ann is read back from disk (memory holds one entry), so Bob is now the oldest
+    cache.clear()
+    cache.get('Ann', 70, size=64)
+    assert cache.stats()['disk_hits'] == 1
+    cache.get('Cy', 70, size=64)
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([a_path.name, f"{cache.etag('Cy', 70, 64)}.png"])
+    assert not b_path.exists() and cache.stats()['disk_evictions'] == 1
+
+
+def test_shealth_batch_ingest_normalises_idempotently():
+    import json
+    from backend.app.database import SessionLocal
+    from backend.app.models import SHealthData, StepSample, HeartRateSample, SleepSample, WeightSample
+
+    client_id = client.post('/clients', json={'name': 'Wearable User', 'email': 'wearable@example.com'}).json()['id']
+    start_ms = 1760000000000
+    samples = [
+        {'type': 'com.samsung.health.step_count', 'start_time': start_ms + i * 60000, 'end_time': start_ms + (i + 1) * 60000, 'count': 100 + i}
+        for i in range(50)
+    ] + [
+        {'type': 'heart_rate', 'start_time': start_ms + i * 1000, 'heart_rate': 60 + i % 30, 'datauuid': f'hr-{client_id}-{i}'}
+        for i in range(300)
+    ] + [
+        {'type': 'com.samsung.health.sleep_stage', 'start_time': '2025-10-09T23:00:00Z', 'end_time': '2025-10-10T01:00:00Z', 'stage': 40003},
+        {'type': 'weight', 'start_time': '2025-10-10T07:00:00+02:00', 'weight': 81.4},
+        {'type': 'steps', 'start_time': start_ms},  # no value: skipped and reported
+    ]
+    ndjson = '\n'.join(json.dumps(s) for s in samples)
+    resp = client.post(f'/integrations/shealth/batch?client_id={client_id}', content=ndjson, headers={'Content-Type': 'application/x-ndjson'})
+    assert resp.status_code == 202
+    assert resp.json()['samples'] == len(samples)
+
+    # Re-syncing the same samples as a JSON array adds nothing
+    resp = client.post('/integrations/shealth/batch', json={'client_id': client_id, 'samples': samples})
+    assert resp.status_code == 202
+
+    db = SessionLocal()
+    try:
+        assert db.query(StepSample).filter(StepSample.client_id == client_id).count() == 50
+        assert db.query(HeartRateSample).filter(HeartRateSample.client_id == client_id).count() == 300
+        sleep = db.query(SleepSample).filter(SleepSample.client_id == client_id).one()
+        assert sleep.stage == 'deep' and (sleep.end_time - sleep.start_time).seconds == 7200
+        weight = db.query(WeightSample).filter(WeightSample.client_id == client_id).one()
+        assert weight.weight == 81.4 and weight.start_time.hour == 5
+        raw = db.query(SHealthData).filter(SHealthData.client_id == client_id).all()
+        assert raw and all(r.processed_at is not None for r in raw)
+        assert any(r.error and 'without a value' in r.error for r in raw)
+    finally:
+        db.close()
+
+    assert client.post('/integrations/shealth/batch', content='{"type": "steps"\n{oops', headers={'Content-Type': 'application/x-ndjson'}).status_code == 400
+
+
+
+def test_shealth_normaliser_skips_poison_samples():
+    from backend.app.database import SessionLocal
+    from backend.app.models import SHealthData, StepSample
+
+    client_id = client.post('/clients', json={'name': 'Poison Wearable', 'email': 'poisonwearable@example.com'}).json()['id']
+    body = '\n'.join([
+        '{"type": "steps", "start_time": 1e20, "count": 5}',                     # OSError/OverflowError from fromtimestamp
+        '{"type": "steps", "start_time": 1760000000000, "count": Infinity}',      # OverflowError from int(inf)
+        '{"type": "heart_rate", "start_time": 1760000000000, "bpm": NaN}',
+        '{"type": "steps", "start_time": 1760000060000, "count": 42}',
+    ])
+    resp = client.post(f'/integrations/shealth/batch?client_id={client_id}', content=body, headers={'Content-Type': 'application/x-ndjson'})
+    assert resp.status_code == 202
+
+    db = SessionLocal()
+    try:
+        assert [s.count for s in db.query(StepSample).filter(StepSample.client_id == client_id)] == [42]
+        raw = db.query(SHealthData).filter(SHealthData.client_id == client_id).one()
+        assert raw.processed_at is not None and raw.samples == 1 and raw.error.startswith('3 invalid')
+
+        # A row whose insert fails is rejected on its own instead of blocking the queue
+        from backend.app import shealth_ingest
+        shealth_ingest._normaliser_lock.acquire()  # keep the background loop off these rows
+        poison = SHealthData(client_id=client_id, payload={'samples': [{'type': 'steps', 'start_time': 1760000120000, 'count': 7}]})
+        good = SHealthData(client_id=client_id, payload={'samples': [{'type': 'steps', 'start_time': 1760000180000, 'count': 8}]})
+        db.add_all([poison, good])
+        db.commit()
+        poison_id, good_id = poison.id, good.id
+        original = shealth_ingest.normalise_sample
+
+        def normalise(sample, client_id, source_id=None):
+            model, row = original(sample, client_id, source_id)
+            if source_id == poison_id:
+                row['count'] = None  # violates NOT NULL, failing the typed insert
+            return model, row
+
+        shealth_ingest.normalise_sample = normalise
+        try:
+            stats = shealth_ingest.normalise_pending(db)
+        finally:
+            shealth_ingest.normalise_sample = original
+            shealth_ingest._normaliser_lock.release()
+        assert stats['rejected'] == 1 and stats['inserted'] == 1, stats
+        db.expire_all()
+        assert db.get(SHealthData, poison_id).error.startswith('rejected')
+        assert db.get(SHealthData, good_id).error is None
+        assert db.query(SHealthData).filter(SHealthData.processed_at.is_(None)).count() == 0
+        assert sorted(s.count for s in db.query(StepSample).filter(StepSample.client_id == client_id)) == [8, 42]
+    finally:
+        db.close()
+
+
+def test_wearable_rollups_and_series_api():
+    from datetime import datetime, timedelta
+    from backend.app.database import SessionLocal
+    from backend.app.models import Trainer, Client as ClientModel, WearableRollup
+    from backend.app.utils.auth import create_access_token
+    from backend.app.wearable_series import rebuild_rollups
+
+    db = SessionLocal()
+    try:
+        trainer = Trainer(name='Series Coach', email='seriescoach@example.com', password_hash='x')
+        db.add(trainer)
+        db.commit()
+        member = ClientModel(name='Series Client', email='seriesclient@example.com', trainer_id=trainer.id)
+        db.add(member)
+        db.commit()
+        trainer_id, client_id = trainer.id, member.id
+    finally:
+        db.close()
+    auth = {'Authorization': f'Bearer {create_access_token({"sub": str(trainer_id)})}'}
+
+    # Three days of one reading every 10 minutes; heart rate cycles 60..119
+    start = datetime(2025, 3, 1)
+    samples = [
+        {'type': 'heart_rate', 'start_time': (start + timedelta(minutes=10 * i)).isoformat(), 'bpm': 60 + i % 60}
+        for i in range(3 * 144)
+    ] + [{'type': 'steps', 'start_time': (start + timedelta(hours=h)).isoformat(), 'count': 500} for h in range(48)]
+    assert client.post(f'/integrations/shealth/batch?client_id={client_id}', json=samples).status_code == 202
+
+    url = f'/integrations/shealth/clients/{client_id}/series'
+    resp = client.get(f'{url}/heart_rate?start=2025-03-01T00:00:00Z&end=2025-03-04T00:00:00Z&resolution=day', headers=auth)
+    assert resp.status_code == 200
+    days = resp.json()['points']
+    assert [p['samples'] for p in days] == [144, 144, 144]
+    assert days[0]['min'] == 60 and days[0]['max'] == 119
+
+    # auto picks hours for a 3-day window at 100 points, minutes for a short one
+    hours = client.get(f'{url}/heart_rate?start=2025-03-01T00:00:00&end=2025-03-04T00:00:00&max_points=100', headers=auth).json()
+    assert hours['resolution'] == 'hour' and len(hours['points']) == 72
+    minutes = client.get(f'{url}/heart_rate?start=2025-03-01T01:00:00&end=2025-03-01T02:00:00', headers=auth).json()
+    assert minutes['resolution'] == 'minute' and len(minutes['points']) == 6
+
+    steps = client.get(f'{url}/steps?start=2025-03-01T00:00:00&end=2025-03-03T00:00:00&resolution=day', headers=auth).json()
+    assert [p['value'] for p in steps['points']] == [12000, 12000]
+
+    assert client.get(f'{url}/calories', headers=auth).status_code == 404
+    assert client.get(f'{url}/steps').status_code == 401
+
+    # Rebuilding from the sample tables reproduces the incremental rollups
+    db = SessionLocal()
+    try:
+        before = {(r.resolution, r.bucket_start, r.metric): (r.samples, r.total) for r in db.query(WearableRollup).filter(WearableRollup.client_id == client_id)}
+        rebuild_rollups(db, client_id=client_id)
+        after = {(r.resolution, r.bucket_start, r.metric): (r.samples, r.total) for r in db.query(WearableRollup).filter(WearableRollup.client_id == client_id)}
+        assert before == after
+    finally:
+        db.close()
+
+
+def test_public_profile_cache_etag_and_invalidation():
+    from backend.app.database import SessionLocal
+    from backend.app.models import ShareToken
+    from backend.app.public_profile import get_profile_cache
+
+    client_id = client.post('/clients', json={'name': 'Cached Share', 'email': 'cachedshare@example.com'}).json()['id']
+    token = client.post(f'/clients/{client_id}/share', json={'client_email': 'cachedshare@example.com'}).json()['token']
+    cache = get_profile_cache()
+
+    first = client.get(f'/public/profile/{token}')
+    assert first.status_code == 200
+    etag, last_modified = first.headers['etag'], first.headers['last-modified']
+    hits = cache.stats()['hits']
+    assert client.get(f'/public/profile/{token}').content == first.content
+    assert cache.stats()['hits'] == hits + 1
+
+    assert client.get(f'/public/profile/{token}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/public/profile/{token}', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    # A new achievement invalidates the cached profile
+    client.post(f'/clients/{client_id}/achievements', json={'name': 'Shared Win'})
+    updated = client.get(f'/public/profile/{token}', headers={'If-None-Match': etag})
+    assert updated.status_code == 200 and updated.headers['etag'] != etag
+    assert [a['name'] for a in updated.json()['achievements']] == ['Shared Win']
+
+    # Deactivating the link takes effect immediately
+    db = SessionLocal()
+    try:
+        db.query(ShareToken).filter(ShareToken.token == token).one().is_active = False
+        db.commit()
+    finally:
+        db.close()
+    assert client.get(f'/public/profile/{token}').status_code == 404
+
+
+def test_profile_snapshot_export_and_refresh(monkeypatch):
+    import json
+    from backend.app import profile_snapshots
+    from backend.app.database import SessionLocal
+    from backend.app.models import ShareToken
+
+    monkeypatch.setattr(profile_snapshots, 'PROFILE_SNAPSHOTS', True)
+    client_id = client.post('/clients', json={'name': 'Static <Share>', 'email': 'staticshare@example.com'}).json()['id']
+    resp = client.post(f'/clients/{client_id}/share', json={'client_email': 'staticshare@example.com'})
+    token, url = resp.json()['token'], resp.json()['snapshot_url']
+    assert url == f'/uploads/profiles/{token}/index.html'
+
+    # Served straight from disk by the /uploads mount
+    page = client.get(url)
+    assert page.status_code == 200 and 'text/html' in page.headers['content-type']
+    assert 'Static &lt;Share&gt;' in page.text
+    snapshot = client.get(f'/uploads/profiles/{token}/profile.json').json()
+    assert snapshot['achievements'] == []
+
+    # Data changes re-render the bundle in the background
+    client.post(f'/clients/{client_id}/achievements', json={'name': 'Snapshot Star'})
+    profile_snapshots.get_snapshot_refresher().wait()
+    snapshot = json.loads(Path(profile_snapshots.snapshot_dir(token), 'profile.json').read_text())
+    assert [a['name'] for a in snapshot['achievements']] == ['Snapshot Star']
+
+    # Deactivated links lose their snapshot
+    db = SessionLocal()
+    try:
+        db.query(ShareToken).filter(ShareToken.token == token).one().is_active = False
+        db.commit()
+    finally:
+        db.close()
+    profile_snapshots.get_snapshot_refresher().wait()
+    assert not os.path.exists(profile_snapshots.snapshot_dir(token))
+
+
+def test_profile_snapshot_sweep_removes_expired_bundles(monkeypatch):
+    from datetime import datetime, timedelta
+    from backend.app import profile_snapshots
+    from backend.app.database import SessionLocal
+    from backend.app.models import ShareToken
+
+    monkeypatch.setattr(profile_snapshots, 'PROFILE_SNAPSHOTS', True)
+    client_id = client.post('/clients', json={'name': 'Sweep Share', 'email': 'sweepshare@example.com'}).json()['id']
+    expiring = client.post(f'/clients/{client_id}/share', json={'client_email': 'sweepshare@example.com'}).json()['token']
+    lasting = client.post(f'/clients/{client_id}/share', json={'client_email': 'sweepshare@example.com'}).json()['token']
+    profile_snapshots.get_snapshot_refresher().wait()
+    monkeypatch.setattr(profile_snapshots, 'PROFILE_SNAPSHOTS', False)  # nothing re-renders behind the sweep
+    orphan = profile_snapshots.snapshot_dir('no-such-token')
+    os.makedirs(orphan, exist_ok=True)
+
+    db = SessionLocal()
+    try:
+        # The link runs out without any write that would trigger a refresh
+        db.query(ShareToken).filter(ShareToken.token == expiring).update({'expires_at': datetime.utcnow() - timedelta(minutes=1)})
+        db.commit()
+        assert client.get(f'/uploads/profiles/{expiring}/index.html').status_code == 200
+        assert profile_snapshots.sweep_snapshots(db) >= 2
+    finally:
+        db.close()
+    assert client.get(f'/uploads/profiles/{expiring}/index.html').status_code == 404
+    assert not os.path.exists(orphan)
+    assert client.get(f'/uploads/profiles/{lasting}/index.html').status_code == 200
+    profile_snapshots.remove_snapshot(lasting)
+
+
+def test_cached_principal_and_invalidation():
+    from backend.app.database import SessionLocal
+    from backend.app.models import Trainer, Client as ClientModel
+    from backend.app.utils.auth import create_access_token, principal_cache, Principal
+
+    db = SessionLocal()
+    try:
+        trainer = Trainer(name='Cached Coach', email='cachedcoach@example.com', password_hash='x')
+        db.add(trainer)
+        db.commit()
+        trainer_id = trainer.id
+    finally:
+        db.close()
+    token = create_access_token({'sub': str(trainer_id)})
+    auth = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/trainers/me', headers=auth).json()['name'] == 'Cached Coach'
+    hits = principal_cache.stats()['hits']
+    assert client.get('/trainers/dashboard', headers=auth).status_code == 200
+    assert principal_cache.stats()['hits'] == hits + 1
+    principal = principal_cache.get(principal_cache.token_key(token))
+    assert isinstance(principal, Principal) and principal.client_ids == frozenset()
+
+    # Gaining a client and renaming the trainer both invalidate the cached principal
+    db = SessionLocal()
+    try:
+        member = ClientModel(name='Owned', email='owned@example.com', trainer_id=trainer_id)
+        db.add(member)
+        db.commit()
+        client_id = member.id
+    finally:
+        db.close()
+    assert principal_cache.get(principal_cache.token_key(token)) is None
+    assert client.put('/trainers/me', json={'name': 'Renamed Coach'}, headers=auth).json()['name'] == 'Renamed Coach'
+    client.get('/trainers/dashboard', headers=auth)
+    principal = principal_cache.get(principal_cache.token_key(token))
+    assert principal.name == 'Renamed Coach' and principal.owns(client_id)
+
+    assert client.get('/trainers/me', headers={'Authorization': 'Bearer not-a-token'}).status_code == 401
+
+
+def _trainer_client_auth(prefix, exercises=(), members=1, **exercise_fields):
+    """
+    Trainer '<prefix> Coach' with `members` clients and the named exercises
+
+    Returns (client ids, exercise ids, auth headers for the trainer).
+    """
+    from backend.app.database import SessionLocal
+    from backend.app.models import Trainer, Client as ClientModel, Exercise
+    from backend.app.utils.auth import create_access_token
+
+    def email(name):
+        return f"{name.lower().replace(' ', '')}@example.com"
+
+    db = SessionLocal()
+    try:
+        trainer = Trainer(name=f'{prefix} Coach', email=email(f'{prefix} Coach'), password_hash='x')
+        db.add(trainer)
+        db.commit()
+        names = [f'{prefix} Member {i}' if i else f'{prefix} Member' for i in range(members)]
+        clients = [ClientModel(name=name, email=email(name), trainer_id=trainer.id) for name in names]
+        rows = [Exercise(name=name, **exercise_fields) for name in exercises]
+        db.add_all([*clients, *rows])
+        db.commit()
+        trainer_id = trainer.id
+        client_ids, exercise_ids = [c.id for c in clients], [e.id for e in rows]
+    finally:
+        db.close()
+    return client_ids, exercise_ids, {'Authorization': f'Bearer {create_access_token({"sub": str(trainer_id)})}'}
+
+
+def test_client_ownership_dependency_without_queries():
+    from sqlalchemy import event
+    from backend.app.database import engine
+
+    [client_id], _, owner_auth = _trainer_client_auth('Owner')
+    _, _, other_auth = _trainer_client_auth('Other', members=0)
+
+    assert client.get(f'/messages/client/{client_id}', headers=owner_auth).status_code == 200
+
+    # With the principal cached, the ownership check itself issues no query
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert client.get(f'/messages/client/{client_id}', headers=owner_auth).status_code == 200
+        assert not any('FROM clients' in s or 'FROM trainers' in s for s in statements)
+        statements.clear()
+        assert client.get(f'/messages/client/{client_id}', headers=other_auth).status_code == 404
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert client.post('/messages/', json={'client_id': client_id, 'content': 'hi'}, headers=other_auth).status_code == 404
+
+
+def test_client_routes_return_404_when_the_client_row_is_gone():
+    from sqlalchemy import delete
+    from backend.app.database import engine
+    from backend.app.models import Client as ClientModel
+
+    [client_id], _, auth = _trainer_client_auth('Vanished')
+    client.get('/trainers/me', headers=auth)  # the cached principal still lists the client
+    with engine.begin() as connection:
+        connection.execute(delete(ClientModel.__table__).where(ClientModel.id == client_id))
+
+    resp = client.post(f'/clients/{client_id}/share', json={'client_email': 'vanished@example.com'}, headers=auth)
+    assert resp.status_code == 404 and resp.json()['detail'] == 'Client not found'
+    for path in ('send-meal-plan', 'send-progress-report', 'send-health-stats'):
+        resp = client.post(f'/email/{path}', json={'client_id': client_id}, headers=auth)
+        assert resp.status_code == 404 and resp.json()['detail'] == 'Client not found'
+
+
+def test_login_hashes_off_loop_and_rehashes_on_parameter_change(monkeypatch):
+    from backend.app.database import SessionLocal
+    from backend.app.models import Trainer
+    from backend.app.utils import passwords
+
+    # pbkdf2 keeps the test fast and independent of the bcrypt backend
+    monkeypatch.setattr(passwords, 'pwd_context', passwords.build_context('pbkdf2_sha256', pbkdf2_rounds=1000))
+    resp = client.post('/trainers/', json={'name': 'Login Coach', 'email': 'logincoach@example.com', 'password': 's3cret'})
+    assert resp.status_code == 200
+    trainer_id = resp.json()['id']
+
+    def stored_hash():
+        db = SessionLocal()
+        try:
+            return db.get(Trainer, trainer_id).password_hash
+        finally:
+            db.close()
+
+    original = stored_hash()
+    assert original.startswith('$pbkdf2-sha256$1000$')
+
+    assert client.post('/trainers/token', data={'username': 'logincoach@example.com', 'password': 'wrong'}).status_code == 401
+    assert client.post('/trainers/token', data={'username': 'nobody@example.com', 'password': 's3cret'}).status_code == 401
+    resp = client.post('/trainers/token', data={'username': 'logincoach@example.com', 'password': 's3cret'})
+    assert resp.status_code == 200
+    token = resp.json()['access_token']
+    assert client.get('/trainers/me', headers={'Authorization': f'Bearer {token}'}).json()['id'] == trainer_id
+    assert stored_hash() == original  # settings unchanged: no rehash
+
+    # Raising the cost upgrades the stored hash on the next successful login only
+    monkeypatch.setattr(passwords, 'pwd_context', passwords.build_context('pbkdf2_sha256', pbkdf2_rounds=2000))
+    assert client.post('/trainers/token', data={'username': 'logincoach@example.com', 'password': 'wrong'}).status_code == 401
+    assert stored_hash() == original
+    assert client.post('/trainers/token', data={'username': 'logincoach@example.com', 'password': 's3cret'}).status_code == 200
+    upgraded = stored_hash()
+    assert upgraded.startswith('$pbkdf2-sha256$2000$')
+    assert passwords.verify_password('s3cret', upgraded)
+    assert not passwords.verify_password('s3cret', 'x')  # unknown hash formats never match
+
+
+def test_workout_create_single_flush_and_bulk_import():
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from backend.app.database import engine
+
+    [client_id], exercise_ids, auth = _trainer_client_auth('Bulk', [f'Bulk Lift {i}' for i in range(10)])
+
+    def workout(title, **extra):
+        return {
+            'client_id': client_id, 'title': title, **extra,
+            'setgroups': [
+                {'exercise_id': eid, 'order_index': i, 'sets': [{'set_number': n, 'reps': 5, 'weight': 100.0} for n in range(1, 5)]}
+                for i, eid in enumerate(exercise_ids)
+            ],
+        }
+
+    client.get('/trainers/me', headers=auth)  # warm the principal cache
+    statements, flushes = [], []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    def flushed(session, context):
+        flushes.append(len(session.new))
+    event.listen(engine, 'before_cursor_execute', record)
+    event.listen(Session, 'after_flush', flushed)
+    try:
+        resp = client.post('/workouts/', json=workout('Ten lifts'), headers=auth)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+        event.remove(Session, 'after_flush', flushed)
+    assert resp.status_code == 201
+    body = resp.json()
+    assert len(body['setgroups']) == 10 and sum(len(sg['sets']) for sg in body['setgroups']) == 40
+    assert body['total_volume'] == 40 * 500
+
+    # One exercise lookup, no client lookup, and the whole graph in one flush
+    first_write = next(i for i, s in enumerate(statements) if s.lstrip().upper().startswith('INSERT'))
+    reads = statements[:first_write]
+    assert len(reads) == 1 and 'FROM exercises' in reads[0] and ' IN ' in reads[0]
+    assert flushes == [51]
+
+    resp = client.post('/workouts/', json={'client_id': client_id, 'title': 'Bad', 'setgroups': [{'exercise_id': 999999}]}, headers=auth)
+    assert resp.status_code == 404
+
+    # Bulk import: all-or-nothing, original dates kept
+    done = '2024-03-01T10:00:00'
+    resp = client.post('/workouts/bulk', json={'workouts': [workout(f'Imported {i}', completed_at=done, timestamp=done) for i in range(5)]}, headers=auth)
+    assert resp.status_code == 201
+    result = resp.json()
+    assert result['created'] == 5 and result['setgroups'] == 50 and result['sets'] == 200
+    imported = client.get(f'/workouts/{result["workout_ids"][0]}').json()
+    assert imported['completed'] and imported['completed_at'].startswith('2024-03-01')
+
+    resp = client.post('/workouts/bulk', json={'workouts': [workout('Ok'), {**workout('Missing'), 'setgroups': [{'exercise_id': 999999}]}]}, headers=auth)
+    assert resp.status_code == 404
+    resp = client.post('/workouts/bulk', json={'workouts': [{**workout('Not mine'), 'client_id': 999999}]}, headers=auth)
+    assert resp.status_code == 404
+    listed = client.get(f'/workouts/?client_id={client_id}').json()
+    assert len(listed) == 6
+
+
+def test_workout_history_ndjson_export_import_roundtrip():
+    import json
+
+    [source_id, target_id], [squat_id], auth = _trainer_client_auth('Transfer', ['Transfer Squat'], members=2)
+
+    workouts = [
+        {'client_id': source_id, 'title': f'Leg day {i}', 'completed_at': f'2024-01-0{i + 1}T09:00:00',
+         'setgroups': [{'exercise_id': squat_id, 'rest_seconds': 120,
+                        'sets': [{'set_number': n, 'reps': 5, 'weight': 100.0 + i, 'rpe': 8, 'completed': True} for n in range(1, 4)]}]}
+        for i in range(3)
+    ] + [{'client_id': source_id, 'title': 'Planned, empty'}]
+    assert client.post('/workouts/bulk', json={'workouts': workouts}, headers=auth).status_code == 201
+
+    resp = client.get(f'/workouts/clients/{source_id}/export', headers=auth)
+    assert resp.status_code == 200 and resp.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    header, records = lines[0], lines[1:]
+    assert header['format'] == 'fittrack-workouts' and header['set_columns'][:3] == ['set_number', 'reps', 'weight']
+    assert [r['title'] for r in records] == ['Leg day 0', 'Leg day 1', 'Leg day 2', 'Planned, empty']
+    assert records[2]['setgroups'][0]['exercise'] == 'Transfer Squat'
+    assert records[2]['setgroups'][0]['sets'][0][:3] == [1, 5, 102.0]
+    assert records[3]['setgroups'] == []
+
+    # Unknown exercises are created by name
+    extra = json.dumps({'title': 'Imported elsewhere', 'setgroups': [{'exercise': 'Transfer Sled Push', 'sets': [[1, None, 60.0, 30, 20.0, None, True, None]]}]})
+    resp = client.post(f'/workouts/clients/{target_id}/import', files={'file': ('h.ndjson', resp.content + extra.encode() + b'\n')}, headers=auth)
+    assert resp.status_code == 201, resp.text
+    assert resp.json() == {'workouts': 5, 'setgroups': 4, 'sets': 10, 'exercises_created': 1}
+
+    again = [json.loads(line) for line in client.get(f'/workouts/clients/{target_id}/export', headers=auth).text.splitlines()[1:]]
+    for original, copied in zip(records, again):
+        assert original == copied
+    assert again[-1]['setgroups'][0]['sets'][0][3:5] == [30, 20.0]
+
+    # A bad line rolls back the whole import
+    bad = json.dumps(header).encode() + b'\n' + json.dumps(records[0]).encode() + b'\n{"setgroups": []}\n'
+    resp = client.post(f'/workouts/clients/{target_id}/import', files={'file': ('bad.ndjson', bad)}, headers=auth)
+    assert resp.status_code == 400 and 'line 3' in resp.json()['detail']
+    for malformed in (
+        {'title': 'x', 'setgroups': 'xx'},
+        {'title': 'x', 'setgroups': [{'exercise': 'Row', 'sets': [5]}]},
+        {'title': 'x', 'setgroups': [{'exercise': 'Row', 'sets': [[1, 5, 'heavy']]}]},
+        {'title': 'x', 'setgroups': [{'exercise': 'Row', 'sets': [[1, 5, 80.0, None, None, 99]]}]},
+        {'title': 'x', 'setgroups': [{'exercise': 'Row', 'sets': [[2 ** 70, 5, 80.0]]}]},
+    ):
+        body = json.dumps(header).encode() + b'\n' + json.dumps(malformed).encode() + b'\n'
+        resp = client.post(f'/workouts/clients/{target_id}/import', files={'file': ('bad.ndjson', body)}, headers=auth)
+        assert resp.status_code == 400 and 'line 2' in resp.json()['detail'], (malformed, resp.text)
+    assert len(client.get(f'/workouts/?client_id={target_id}').json()) == 5
+
+    assert client.get('/workouts/clients/999999/export', headers=auth).status_code == 404
+
+
+def _count_queries(fn):
+    """Run fn() and return (its result, the SELECTs it issued)"""
+    from sqlalchemy import event
+    from backend.app.database import engine
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        return fn(), statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_workout_endpoints_use_fixed_query_counts():
+
+    [client_id], exercise_ids, auth = _trainer_client_auth('Eager', [f'Eager Lift {i}' for i in range(4)], category='legs')
+    client.get('/trainers/me', headers=auth)  # warm the principal cache
+
+    def add_workouts(count, offset):
+        workouts = [
+            {'client_id': client_id, 'title': f'Eager {offset + i}', 'completed_at': f'2024-02-{offset + i + 1:02d}T08:00:00',
+             'setgroups': [{'exercise_id': eid, 'order_index': g, 'sets': [{'set_number': n, 'reps': 5, 'weight': 50.0 + offset + i} for n in range(1, 4)]}
+                           for g, eid in enumerate(exercise_ids)]}
+            for i in range(count)
+        ]
+        return client.post('/workouts/bulk', json={'workouts': workouts}, headers=auth).json()['workout_ids']
+
+    def profile():
+        workout_id = ids[-1]
+        calls = {
+            'list': lambda: client.get(f'/workouts/?client_id={client_id}'),
+            'detail': lambda: client.get(f'/workouts/{workout_id}'),
+            'pdf': lambda: client.get(f'/pdf/workout/{workout_id}', headers=auth),
+            'progress': lambda: client.get(f'/workouts/clients/{client_id}/exercise-progress/{exercise_ids[0]}'),
+            'stats': lambda: client.get(f'/workouts/clients/{client_id}/stats'),
+        }
+        counts = {}
+        for name, call in calls.items():
+            resp, statements = _count_queries(call)
+            assert resp.status_code == 200, (name, resp.text)
+            counts[name] = len(statements)
+        return counts
+
+    ids = add_workouts(2, 0)
+    small = profile()
+    ids += add_workouts(6, 2)
+    large = profile()
+
+    # One query per relationship level, independent of how much data is returned
+    assert small == large
+    assert large['list'] == 2       # workouts, setgroups (totals are stored columns)
+    assert large['detail'] == 4     # + exercises
+    assert large['progress'] == 4   # setgroups joined to workouts, sets, exercise, personal record
+    assert large['pdf'] == 5        # detail + client
+    assert large['stats'] == 4      # summary + favourite exercise + personal records
+
+    progress = client.get(f'/workouts/clients/{client_id}/exercise-progress/{exercise_ids[0]}').json()
+    assert progress['total_workouts'] == 8 and progress['weight_improvement'] == 7.0
+    assert client.get(f'/workouts/?client_id={client_id}').json()[0]['exercise_count'] == 4
+
+
+def test_stored_workout_totals_follow_set_mutations():
+    from sqlalchemy import text
+    from backend.app.database import SessionLocal
+    from backend.app.workout_totals import backfill_totals, check_totals
+
+    [client_id], [bench_id, row_id], auth = _trainer_client_auth('Totals', ['Totals Bench', 'Totals Row'])
+
+    workout = client.post('/workouts/', json={'client_id': client_id, 'title': 'Totals', 'setgroups': [
+        {'exercise_id': bench_id, 'sets': [{'set_number': 1, 'reps': 10, 'weight': 50.0}, {'set_number': 2, 'reps': 8, 'weight': 60.0}]},
+    ]}, headers=auth).json()
+    workout_id, setgroup_id = workout['id'], workout['setgroups'][0]['id']
+
+    def totals():
+        w = client.get(f'/workouts/{workout_id}').json()
+        return (w['total_volume'], w['set_count'], w['total_reps']), {sg['id']: (sg['total_volume'], sg['set_count'], sg['total_reps']) for sg in w['setgroups']}
+
+    assert (workout['total_volume'], workout['set_count'], workout['total_reps']) == (980.0, 2, 18)
+
+    new_set = client.post(f'/workouts/setgroups/{setgroup_id}/sets', json={'set_number': 3, 'reps': 5, 'weight': 70.0}, headers=auth).json()
+    assert totals()[0] == (1330.0, 3, 23)
+    client.put(f'/workouts/sets/{new_set["id"]}', json={'reps': 6}, headers=auth)
+    assert totals()[0] == (1400.0, 3, 24)
+    client.put(f'/workouts/sets/{new_set["id"]}', json={'weight': None}, headers=auth)
+    assert totals()[0] == (980.0, 3, 24)  # a set without weight adds reps but no volume
+    client.delete(f'/workouts/sets/{new_set["id"]}', headers=auth)
+    assert totals()[0] == (980.0, 2, 18)
+
+    added = client.post(f'/workouts/{workout_id}/setgroups', json={'exercise_id': row_id, 'sets': [{'set_number': 1, 'reps': 12, 'weight': 40.0}]}, headers=auth).json()
+    workout_totals, setgroup_totals = totals()
+    assert workout_totals == (1460.0, 3, 30)
+    assert setgroup_totals[added['id']] == (480.0, 1, 12)
+    client.delete(f'/workouts/setgroups/{setgroup_id}', headers=auth)
+    assert totals()[0] == (480.0, 1, 12)
+
+    # The list reads stored totals without touching workout_sets
+    resp, statements = _count_queries(lambda: client.get(f'/workouts/?client_id={client_id}'))
+    assert resp.json()[0]['total_volume'] == 480.0 and resp.json()[0]['set_count'] == 1
+    assert not any('workout_sets' in s for s in statements)
+
+    # Every write path so far (ORM, bulk, NDJSON import) kept the totals consistent
+    db = SessionLocal()
+    try:
+        report = check_totals(db)
+        assert report['setgroups_mismatched'] == 0 and report['workouts_mismatched'] == 0, report
+
+        db.execute(text('UPDATE workouts SET total_volume = 1, set_count = 99 WHERE id = :id'), {'id': workout_id})
+        db.commit()
+        report = check_totals(db)
+        assert report['workouts_mismatched'] == 1
+        assert report['workouts'][0]['id'] == workout_id and report['workouts'][0]['set_count'] == {'stored': 99, 'expected': 1}
+
+        result = backfill_totals(db)
+        assert result['columns_added'] == [] and result['workouts'] >= 1
+        report = check_totals(db)
+        assert report['setgroups_mismatched'] == 0 and report['workouts_mismatched'] == 0
+    finally:
+        db.close()
+    assert totals()[0] == (480.0, 1, 12)
+
+
+def test_schema_upgrade_adds_new_columns_to_an_older_database(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    from backend.app.models import Base
+    from backend.app.schema_upgrade import upgrade_schema
+
+    # A database from before the totals, photo variants and S-Health normaliser columns
+    old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=old)
+    with old.begin() as connection:
+        connection.execute(text('DROP INDEX ix_shealth_data_processed_at'))
+        for table, column in [('workouts', 'total_volume'), ('workouts', 'set_count'), ('workouts', 'total_reps'),
+                              ('setgroups', 'total_volume'), ('setgroups', 'set_count'), ('setgroups', 'total_reps'),
+                              ('measurements', 'photo_variants'),
+                              ('shealth_data', 'processed_at'), ('shealth_data', 'samples'), ('shealth_data', 'error')]:
+            connection.execute(text(f'ALTER TABLE {table} DROP COLUMN {column}'))
+        connection.execute(text("INSERT INTO trainers (id, name, email, password_hash) VALUES (1, 'Old Coach', 'oldcoach@example.com', 'x')"))
+        connection.execute(text("INSERT INTO clients (id, trainer_id, name, email) VALUES (1, 1, 'Old Member', 'oldmember@example.com')"))
+        connection.execute(text("INSERT INTO exercises (id, name) VALUES (1, 'Old Squat')"))
+        connection.execute(text("INSERT INTO workouts (id, client_id, title) VALUES (1, 1, 'Before totals')"))
+        connection.execute(text('INSERT INTO setgroups (id, workout_id, exercise_id) VALUES (1, 1, 1)'))
+        connection.execute(text('INSERT INTO workout_sets (setgroup_id, set_number, reps, weight) VALUES (1, 1, 5, 100), (1, 2, 5, 110)'))
+
+    added = upgrade_schema(old)
+    assert 'workouts.total_volume' in added and 'measurements.photo_variants' in added and 'shealth_data.processed_at' in added
+    with old.connect() as connection:
+        assert connection.execute(text('SELECT total_volume, set_count, total_reps FROM workouts')).one() == (1050.0, 2, 10)
+        assert connection.execute(text('SELECT total_volume FROM setgroups')).scalar() == 1050.0
+    assert 'ix_shealth_data_processed_at' in {i['name'] for i in inspect(old).get_indexes('shealth_data')}
+    assert upgrade_schema(old) == []  # idempotent
+    old.dispose()
+
+
+def test_schema_upgrade_marks_existing_videos_ready(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    from backend.app.models import Base
+    from backend.app.schema_upgrade import upgrade_schema
+
+    video_columns = ['status', 'processing_error', 'width', 'height', 'video_codec', 'audio_codec',
+                     'bitrate', 'preview_url', 'hls_url', 'processed_at']
+    old = create_engine(f"sqlite:///{tmp_path / 'old_videos.db'}")
+    Base.metadata.create_all(bind=old)
+    with old.begin() as connection:
+        connection.execute(text('DROP INDEX ix_workout_videos_status'))
+        for column in video_columns:
+            connection.execute(text(f'ALTER TABLE workout_videos DROP COLUMN {column}'))
+        connection.execute(text("INSERT INTO trainers (id, name, email, password_hash) VALUES (1, 'Old Coach', 'oldcoach@example.com', 'x')"))
+        connection.execute(text("INSERT INTO workout_categories (id, name) VALUES (1, 'Old')"))
+        connection.execute(text("INSERT INTO workout_videos (trainer_id, category_id, title, video_url) VALUES (1, 1, 'Old upload', '/uploads/workout_videos/old.mp4')"))
+
+    assert set(upgrade_schema(old)) == {f'workout_videos.{c}' for c in video_columns}
+    with old.connect() as connection:
+        # served as uploaded, so the startup resume hook does not re-encode the whole library
+        assert connection.execute(text('SELECT status FROM workout_videos')).scalar() == 'ready'
+    assert 'ix_workout_videos_status' in {i['name'] for i in inspect(old).get_indexes('workout_videos')}
+    old.dispose()
+
+
+def test_personal_records_follow_completed_sets():
+    from backend.app.database import SessionLocal
+    from backend.app.personal_records import estimate_1rm, rebuild_records
+
+    [client_id], [bench_id], auth = _trainer_client_auth('Record', ['Record Bench'])
+    client.get('/trainers/me', headers=auth)  # warm the principal cache
+
+    assert estimate_1rm(100, 1) == 100.0
+    assert estimate_1rm(100, 5) == 116.67
+    assert estimate_1rm(100, 5, 'brzycki') == 112.5
+    assert estimate_1rm(100, 15) is None
+
+    def record():
+        return client.get(f'/workouts/clients/{client_id}/personal-records/{bench_id}', headers=auth).json()
+
+    client.post('/workouts/bulk', json={'workouts': [{'client_id': client_id, 'title': 'Day one', 'completed_at': '2024-03-01T08:00:00', 'setgroups': [
+        {'exercise_id': bench_id, 'sets': [{'set_number': 1, 'reps': 5, 'weight': 100.0}, {'set_number': 2, 'reps': 8, 'weight': 90.0}]},
+    ]}]}, headers=auth)
+    first = record()
+    assert (first['best_weight'], first['best_weight_reps'], first['best_e1rm'], first['first_e1rm']) == (100.0, 5, 116.67, 116.67)
+    assert [(r['reps'], r['weight']) for r in first['rep_maxes']] == [(5, 100.0), (8, 90.0)]
+
+    # Sets only count once their workout is completed
+    workout = client.post('/workouts/', json={'client_id': client_id, 'title': 'Heavy', 'setgroups': [
+        {'exercise_id': bench_id, 'sets': [{'set_number': 1, 'reps': 3, 'weight': 110.0}]},
+    ]}, headers=auth).json()
+    heavy_set = workout['setgroups'][0]['sets'][0]['id']
+    assert record()['best_weight'] == 100.0
+    client.post(f'/workouts/{workout["id"]}/complete', headers=auth)
+    current = record()
+    assert (current['best_weight'], current['best_weight_reps'], current['best_e1rm']) == (110.0, 3, 121.0)
+    assert current['e1rm_improvement_percent'] == 3.7
+    stats = client.get(f'/workouts/clients/{client_id}/stats').json()
+    assert stats['strongest_exercise'] == 'Record Bench' and stats['most_improved_exercise'] == 'Record Bench'
+    progress = client.get(f'/workouts/clients/{client_id}/exercise-progress/{bench_id}').json()
+    assert [h['best_e1rm'] for h in progress['history']] == [116.67, 121.0]
+    assert progress['personal_record']['best_e1rm'] == 121.0
+
+    # Lowering or removing the record set recomputes from what is left
+    client.put(f'/workouts/sets/{heavy_set}', json={'reps': 2}, headers=auth)
+    assert (record()['best_weight_reps'], record()['best_e1rm']) == (2, 117.33)
+    client.delete(f'/workouts/sets/{heavy_set}', headers=auth)
+    current = record()
+    assert (current['best_weight'], current['best_e1rm'], current['e1rm_improvement_percent']) == (100.0, 116.67, None)
+    assert [r['reps'] for r in current['rep_maxes']] == [5, 8]
+    assert client.get(f'/workouts/clients/{client_id}/stats').json()['most_improved_exercise'] is None
+
+    # The incremental records match a full rebuild
+    listed = client.get(f'/workouts/clients/{client_id}/personal-records', headers=auth).json()
+    db = SessionLocal()
+    try:
+        assert rebuild_records(db, client_id) == {'records': 1}
+    finally:
+        db.close()
+    assert client.get(f'/workouts/clients/{client_id}/personal-records', headers=auth).json() == listed
+
+
+def test_exercise_progress_series_buckets_downsamples_and_caches():
+    from datetime import datetime, timedelta
+    from backend.app.exercise_series import get_series_cache, lttb
+
+    spike = [{'x': i, 'y': 10 if i == 3 else 0} for i in range(8)]
+    assert [p['x'] for p in lttb(spike, 4, x=lambda p: p['x'], y=lambda p: p['y'])] == [0, 3, 4, 7]
+    assert lttb(spike, 20, x=lambda p: p['x'], y=lambda p: p['y']) == spike
+
+    [client_id], [squat_id], auth = _trainer_client_auth('Progress', ['Progress Squat'])
+    client.get('/trainers/me', headers=auth)  # warm the principal cache
+
+    # Mondays and Thursdays for 12 weeks from Monday 2024-01-01, one kilo heavier each session
+    days = [datetime(2024, 1, 1) + timedelta(weeks=i // 2, days=3 * (i % 2), hours=8) for i in range(24)]
+    workouts = [
+        {'client_id': client_id, 'title': f'Squat {i}', 'completed_at': day.isoformat(), 'setgroups': [
+            {'exercise_id': squat_id, 'sets': [{'set_number': 1, 'reps': 5, 'weight': 60.0 + i}, {'set_number': 2, 'reps': 8, 'weight': 50.0 + i}]}]}
+        for i, day in enumerate(days)
+    ]
+    ids = client.post('/workouts/bulk', json={'workouts': workouts}, headers=auth).json()['workout_ids']
+    url = f'/workouts/clients/{client_id}/exercise-progress/{squat_id}/series'
+
+    weekly = client.get(url, headers=auth).json()
+    assert weekly['bucket'] == 'week' and weekly['total_points'] == 12 and not weekly['downsampled']
+    assert weekly['points'][0] == {
+        't': '2024-01-01T00:00:00', 'sessions': 2, 'sets': 4, 'total_reps': 26,
+        'max_weight': 61.0, 'mean_weight': 55.5, 'volume': 1413.0, 'best_e1rm': 71.17,
+    }
+    monthly = client.get(url, params={'bucket': 'month'}, headers=auth).json()
+    assert [(p['t'][:10], p['sessions']) for p in monthly['points']] == [('2024-01-01', 9), ('2024-02-01', 9), ('2024-03-01', 6)]
+
+    window = client.get(url, params={'bucket': 'session', 'start': '2024-01-08T00:00:00', 'end': '2024-01-15T00:00:00'}, headers=auth).json()
+    assert [p['max_weight'] for p in window['points']] == [62.0, 63.0]
+
+    sampled = client.get(url, params={'bucket': 'session', 'points': 6, 'metric': 'best_e1rm'}, headers=auth).json()
+    assert sampled['total_points'] == 24 and sampled['downsampled'] and len(sampled['points']) == 6
+    assert sampled['points'][0]['t'] == days[0].isoformat() and sampled['points'][-1]['t'] == days[-1].isoformat()
+    assert client.get(url, params={'metric': 'heart_rate'}, headers=auth).status_code == 422
+
+    # Repeats come from the cache without touching the sets
+    hits = get_series_cache().stats()['hits']
+    resp, statements = _count_queries(lambda: client.get(url, headers=auth))
+    assert resp.json() == weekly and get_series_cache().stats()['hits'] == hits + 1
+    assert not any('workout_sets' in s for s in statements)
+
+    # A committed set change invalidates the client's series
+    setgroup_id = client.get(f'/workouts/{ids[-1]}').json()['setgroups'][0]['id']
+    client.post(f'/workouts/setgroups/{setgroup_id}/sets', json={'set_number': 3, 'reps': 1, 'weight': 120.0}, headers=auth)
+    latest = client.get(url, headers=auth).json()['points'][-1]
+    assert (latest['max_weight'], latest['best_e1rm'], latest['sets']) == (120.0, 120.0, 5)
+
+
+def _dialect_binds():
+    """Stand-in binds for compiling statements on the production databases (no driver needed)"""
+    from types import SimpleNamespace
+    from sqlalchemy.dialects import mysql, postgresql
+    return [SimpleNamespace(dialect=postgresql.dialect()), SimpleNamespace(dialect=mysql.dialect())]
+
+
+def test_upserts_compile_on_postgresql_and_mysql():
+    from backend.app.models import MediaBlob, StepSample
+    from backend.app.utils.dialects import insert_ignore, upsert
+    from backend.app.personal_records import record_upsert, rep_max_upsert
+    from backend.app.wearable_series import rollup_upsert
+
+    for bind in _dialect_binds():
+        stmt = upsert(bind, MediaBlob.__table__, ['sha256'], lambda excluded: [('refcount', MediaBlob.refcount + 1)])
+        sql = str(stmt.values(sha256='a', ext='', refcount=1).compile(dialect=bind.dialect))
+        assert ('ON CONFLICT (sha256) DO UPDATE' if bind.dialect.name == 'postgresql' else 'ON DUPLICATE KEY UPDATE') in sql
+
+        stmt = insert_ignore(bind, StepSample.__table__, ['client_id', 'sample_key'])
+        sql = str(stmt.values(client_id=1, sample_key='k', count=1).compile(dialect=bind.dialect))
+        assert ('ON CONFLICT (client_id, sample_key) DO NOTHING' if bind.dialect.name == 'postgresql' else 'INSERT IGNORE') in sql
+
+        sql = str(rollup_upsert(bind).values(client_id=1, metric='steps', resolution='day', samples=1, total=1.0, minimum=1.0, maximum=1.0).compile(dialect=bind.dialect))
+        assert 'least(wearable_rollups.minimum' in sql and 'greatest(wearable_rollups.maximum' in sql
+
+        sql = str(record_upsert(bind).values(client_id=1, exercise_id=1, best_weight=1.0, best_weight_reps=1).compile(dialect=bind.dialect))
+        assert 'best_weight = CASE' in sql and 'first_e1rm_at = CASE' in sql
+        if bind.dialect.name == 'mysql':  # assignments see earlier ones: the compared column goes last
+            assert sql.index('best_weight_reps = CASE') < sql.index('best_weight = CASE')
+            assert sql.index('first_e1rm = CASE') < sql.index('first_e1rm_at = CASE')
+        sql = str(rep_max_upsert(bind).values(client_id=1, exercise_id=1, reps=5, weight=1.0).compile(dialect=bind.dialect))
+        assert 'achieved_at = CASE' in sql
+        if bind.dialect.name == 'mysql':
+            assert sql.index('achieved_at = CASE') < sql.index(' weight = CASE')
+
+
+def test_progress_buckets_compile_on_postgresql_and_mysql():
+    from backend.app.exercise_series import points_query
+
+    expected = {
+        ('postgresql', 'week'): "date_trunc('week', workouts.completed_at)",
+        ('postgresql', 'month'): "date_trunc('month', workouts.completed_at)",
+        ('mysql', 'week'): 'subdate(date(workouts.completed_at), weekday(workouts.completed_at))',
+        ('mysql', 'month'): 'subdate(date(workouts.completed_at), dayofmonth(workouts.completed_at) - 1)',
+    }
+    for bind in _dialect_binds():
+        for bucket in ('week', 'month'):
+            sql = str(points_query(bind, 1, 2, bucket).compile(dialect=bind.dialect))
+            start = expected[(bind.dialect.name, bucket)]
+            assert f'{start} AS bucket_start' in sql and f'GROUP BY {start}' in sql
+
+
+def test_personal_record_upsert_never_lowers_a_record():
+    from datetime import datetime
+    from sqlalchemy import select
+    from backend.app.database import engine
+    from backend.app.models import PersonalRecord, RepMaxRecord
+    from backend.app.personal_records import record_upsert, rep_max_upsert
+
+    [client_id], [squat_id], _ = _trainer_client_auth('Stale Fold', ['Stale Fold Squat'])
+    key = {'client_id': client_id, 'exercise_id': squat_id}
+
+    def row(best_weight, reps, e1rm, day):
+        at = datetime(2024, 5, day, 9)
+        return key | {
+            'best_weight': best_weight, 'best_weight_reps': reps, 'best_weight_at': at,
+            'best_e1rm': e1rm, 'best_e1rm_weight': best_weight, 'best_e1rm_reps': reps, 'best_e1rm_at': at,
+            'first_e1rm': e1rm, 'first_e1rm_at': at, 'updated_at': at,
+        }
+
+    with engine.begin() as connection:
+        connection.execute(record_upsert(connection), [row(140.0, 3, 154.0, 10)])
+        connection.execute(rep_max_upsert(connection), [key | {'reps': 3, 'weight': 140.0, 'achieved_at': datetime(2024, 5, 10)}])
+        # A writer folding from a read taken before the first write must not lower anything
+        connection.execute(record_upsert(connection), [row(120.0, 5, 140.0, 12)])
+        connection.execute(rep_max_upsert(connection), [key | {'reps': 3, 'weight': 130.0, 'achieved_at': datetime(2024, 5, 12)}])
+        # ...but still raises the groups it does beat: a better e1RM and an earlier first day
+        connection.execute(record_upsert(connection), [row(135.0, 8, 171.0, 1)])
+
+    with engine.connect() as connection:
+        record = connection.execute(select(PersonalRecord.__table__).filter_by(**key)).one()
+        rep_max = connection.execute(select(RepMaxRecord.__table__).filter_by(**key)).one()
+    assert (record.best_weight, record.best_weight_reps, record.best_weight_at.day) == (140.0, 3, 10)
+    assert (record.best_e1rm, record.best_e1rm_weight, record.best_e1rm_reps, record.best_e1rm_at.day) == (171.0, 135.0, 8, 1)
+    assert (record.first_e1rm, record.first_e1rm_at.day) == (171.0, 1)
+    assert (rep_max.weight, rep_max.achieved_at.day) == (140.0, 10)